@@ -8,7 +8,6 @@ from flask import Flask, jsonify, send_from_directory, redirect
 from flask.globals import request
 from flask_sqlalchemy import SQLAlchemy
 from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from flask_cors import CORS
 from flask_babel import Babel, _
 from flask_socketio import SocketIO, emit
@@ -69,14 +68,22 @@ Swagger(
 
 app.config.from_object("config")
 
+# Encoding the JSON responses with a fast native encoder, if it's installed
+from app.modules.json_encoding import FastJSONEncoder
+
+app.json_encoder = FastJSONEncoder
+
 # Database object imported by modules and controllers
 db = SQLAlchemy(app)
 
 # We must wait for the app to be fully initialized to import middlewares, to avoid circular imports
-from app.middleware import ensure_authorized
+from app.middleware import ensure_authorized, get_rate_limit_key, rate_limit_cost
+
+# Registering the rate limit storages shared by the workers (selected by the 'RATELIMIT_STORAGE_URL' setting)
+from app.services.ratelimit import MMapStorage, SQLiteStorage
 
 # Setting up limiter to avoid DOS attacks (https://flask-limiter.readthedocs.io/en/stable/)
-limiter = Limiter(app, key_func=get_remote_address, default_limits=["10/second"])
+limiter = Limiter(app, key_func=get_rate_limit_key, default_limits=["10/second"])
 
 # Allowing access through sites (such as when using ReactJS)
 CORS(app)
@@ -187,10 +194,14 @@ def send_socketio_message():
 # Import services
 from app.services.storage import store_file
 from app.services.push_notification import send_message, send_multicast_message
+from app.services.cache import caches
+from app.services.tasks import task_queues
+from app.services.singleflight import single_flights
 
 
 @app.route("/files/upload", methods=["POST"])
 @ensure_authorized
+@rate_limit_cost(10)
 def upload_file():
     """Files upload route."""
 
@@ -343,6 +354,45 @@ def routes():
     return jsonify(routes)
 
 
+@app.route("/cache-stats", methods=["GET"])
+@ensure_authorized
+def cache_stats():
+    """Returns the usage statistics (size, hits, misses) of the in-process caches."""
+
+    return jsonify(
+        {
+            "data": {name: cache.stats() for name, cache in caches.items()},
+            "meta": {"success": True},
+        }
+    )
+
+
+@app.route("/task-stats", methods=["GET"])
+@ensure_authorized
+def task_stats():
+    """Returns the usage statistics (pending, done, failed and dropped tasks) of the background task queues."""
+
+    return jsonify(
+        {
+            "data": {name: queue.stats() for name, queue in task_queues.items()},
+            "meta": {"success": True},
+        }
+    )
+
+
+@app.route("/coalescing-stats", methods=["GET"])
+@ensure_authorized
+def coalescing_stats():
+    """Returns the usage statistics (run, shared and in-flight calls) of the coalesced GET routes."""
+
+    return jsonify(
+        {
+            "data": {name: flight.stats() for name, flight in single_flights.items()},
+            "meta": {"success": True},
+        }
+    )
+
+
 @app.errorhandler(404)
 def not_found(error):
     """Sample HTTP resource error handling."""
@@ -431,3 +481,18 @@ app.register_blueprint(mod_log)
 # However, since we're using Alembic for database migrations, we'll only call this when testing
 if app.config["TESTING"]:
     db.create_all()
+
+# Building the models metadata registry, now that all models were imported
+from app.modules.utils import model_registry
+
+model_registry.build()
+
+# Compiling the role API routes permission matrix, so authorization checks won't query the database
+from app.modules.users.utils import permission_matrix
+
+with app.app_context():
+    try:
+        permission_matrix.build()
+    # If the tables are not available yet (e.g. before migrations), it'll be built on the first request
+    except Exception as e:
+        print("It was not possible to build the permission matrix at startup", e)
@@ -1,16 +1,30 @@
 """
 Application middlewares.
 
-Pretty much, we'll have middlewares to ensure authenticated and authorized requests.
+Pretty much, we'll have middlewares to ensure authenticated and authorized requests, to rate limit them and to
+coalesce identical concurrent ones.
 """
 
 from functools import wraps
+from threading import BoundedSemaphore
 
-from flask import request, g, jsonify
+from flask import request, g, jsonify, current_app, make_response
 from flask_babel import _
-from sqlalchemy import or_
+from flask_limiter.util import get_remote_address
+from limits.strategies import STRATEGIES, FixedWindowRateLimiter
 
+from config import REQUEST_COALESCING_TIMEOUT
+from app.services.singleflight import SingleFlight
 from app.modules.users.models import *
+from app.modules.users.utils import (
+    decode_auth_token_claims,
+    get_route_template,
+    get_principal,
+    get_stateless_principal,
+    permission_matrix,
+    principal_cache,
+    token_generations,
+)
 
 
 def ensure_authenticated(func):
@@ -19,12 +33,12 @@ def ensure_authenticated(func):
     @wraps(func)
     def auth_function(*args, **kwargs):
         try:
-            # Getting user ID by token from auth header
+            # Getting the token claims from auth header
             token = request.headers["Authorization"].split("Bearer ")[1]
-            res = User.decode_auth_token(token)
+            claims = decode_auth_token_claims(token)
 
             # If token is not valid
-            if type(res) is not int:
+            if type(claims) is not dict or type(claims.get("sub")) is not int:
                 return (
                     jsonify(
                         {
@@ -39,12 +53,62 @@ def ensure_authenticated(func):
                     ),
                     401,
                 )
+            res = claims["sub"]
 
-            # Searching user by ID
-            user = User.query.get(res)
+            principal = None
+            # Stateless tokens carry the user's role and status, and are valid while their generation is current
+            if "gen" in claims:
+                token_generation = token_generations.get(res)
+                # If the user is not known yet, we'll check it on the database
+                if token_generation is not None:
+                    if token_generation != claims["gen"] or not claims["is_active"]:
+                        return (
+                            jsonify(
+                                {
+                                    "data": {},
+                                    "meta": {
+                                        "success": False,
+                                        "errors": _(
+                                            "Authentication failed. Please login to access the resource."
+                                        ),
+                                    },
+                                }
+                            ),
+                            401,
+                        )
+                    principal = get_stateless_principal(claims)
+
+            # Users unknown to the token generations table might have been deleted by other workers, so
+            # stateless tokens are checked on the database
+            if principal is None and "gen" not in claims:
+                # Getting the user from the authenticated principals cache
+                principal = principal_cache.get(res)
+            if principal is None:
+                # Searching user by ID
+                user = User.query.get(res)
+
+                # No user is found
+                if user is None:
+                    return (
+                        jsonify(
+                            {
+                                "data": {},
+                                "meta": {
+                                    "success": False,
+                                    "errors": _(
+                                        "Authentication failed. Please login to access the resource."
+                                    ),
+                                },
+                            }
+                        ),
+                        401,
+                    )
+
+                principal = get_principal(user)
+                principal_cache.set(res, principal)
 
-            # No user is found
-            if user is None:
+            # Stateless tokens from previous generations were revoked
+            if "gen" in claims and principal.token_generation != claims["gen"]:
                 return (
                     jsonify(
                         {
@@ -60,8 +124,8 @@ def ensure_authenticated(func):
                     401,
                 )
 
-            g.user = user
-            g.role = user.role if user.role else None
+            g.user = principal
+            g.role = principal.role
 
         except Exception as e:
             return (
@@ -97,22 +161,16 @@ def ensure_authorized(func):
     def auth_function(*args, **kwargs):
         try:
             authorized_flag = False
-            # Looking for path parameters and replacing in the requested route
-            route_path = request.path
-            path_params = request.view_args
-            if bool(path_params):
-                for p in path_params:
-                    route_path = route_path.replace(str(path_params[p]), ":" + str(p))
-
-            # Ensure the user has access rights for the method on the resource
-            authorizations = RoleAPIRoute.query.filter(
-                or_(RoleAPIRoute.route == route_path, RoleAPIRoute.route == "*"),
-                RoleAPIRoute.method == request.method,
-                RoleAPIRoute.role_id == g.user.role_id,
-            ).all()
+            # Getting the route template (like '/users/:id') from the matched URL rule
+            if request.url_rule is not None:
+                route_path = get_route_template(request.url_rule.rule)
+            else:
+                route_path = request.path
 
             # If user role has access to all routes or to the specified one in the request
-            if len(authorizations) >= 1:
+            if permission_matrix.is_authorized(
+                g.user.role_id, request.method, route_path
+            ):
                 authorized_flag = True
             else:
                 return (
@@ -154,3 +212,120 @@ def ensure_authorized(func):
             return func(*args, **kwargs)
 
     return auth_function
+
+
+def get_rate_limit_key():
+    """Gets the rate limits key for a request: the authenticated user, or the client address for anonymous requests."""
+
+    # Users behind the same address (like a corporate NAT) must have their own limits
+    authorization = request.headers.get("Authorization", "")
+    if authorization.startswith("Bearer "):
+        claims = decode_auth_token_claims(authorization.split("Bearer ")[1])
+        if type(claims) is dict and type(claims.get("sub")) is int:
+            return f"user:{claims['sub']}"
+    return get_remote_address()
+
+
+def rate_limit_cost(cost):
+    """Sets how many units a request to the route costs against the rate limits (1 by default)."""
+
+    def decorator(func):
+        func.rate_limit_cost = cost
+        return func
+
+    return decorator
+
+
+def get_rate_limit_cost():
+    """Gets how many units the current request costs against the rate limits."""
+
+    view_func = current_app.view_functions.get(request.endpoint)
+    return getattr(view_func, "rate_limit_cost", 1)
+
+
+class WeightedFixedWindowRateLimiter(FixedWindowRateLimiter):
+    """Fixed window rate limiting strategy, where each hit costs what was set for the requested route."""
+
+    def hit(self, item, *identifiers, cost=None):
+        return super().hit(
+            item, *identifiers, cost=get_rate_limit_cost() if cost is None else cost
+        )
+
+    def test(self, item, *identifiers, cost=None):
+        return super().test(
+            item, *identifiers, cost=get_rate_limit_cost() if cost is None else cost
+        )
+
+
+# Registering the strategy, so it can be selected with the 'RATELIMIT_STRATEGY' setting
+STRATEGIES["weighted-fixed-window"] = WeightedFixedWindowRateLimiter
+
+
+def limit_concurrency(max_requests):
+    """Middleware to limit how many requests to a route are handled at the same time by each worker."""
+
+    def decorator(func):
+        semaphore = BoundedSemaphore(max_requests)
+
+        @wraps(func)
+        def limited_function(*args, **kwargs):
+            # If all slots are taken, we won't wait for them
+            if not semaphore.acquire(blocking=False):
+                return (
+                    jsonify(
+                        {
+                            "data": {},
+                            "meta": {
+                                "success": False,
+                                "errors": _(
+                                    "Too many requests being processed. Please try again later."
+                                ),
+                            },
+                        }
+                    ),
+                    429,
+                    {"Retry-After": "1"},
+                )
+            try:
+                return func(*args, **kwargs)
+            finally:
+                semaphore.release()
+
+        return limited_function
+
+    return decorator
+
+
+def coalesce_requests(func):
+    """
+    Middleware to share a single execution (and its serialized response) among identical concurrent GET requests
+    of a user, like the ones of many clients reacting to the same notification at once.
+
+    It must run after the authentication, since the requests of different users are never coalesced.
+    """
+
+    flight = SingleFlight(func.__name__, timeout=REQUEST_COALESCING_TIMEOUT)
+
+    @wraps(func)
+    def coalesced_function(*args, **kwargs):
+        if request.method != "GET":
+            return func(*args, **kwargs)
+
+        # Besides the path and query string, the conditional and language headers change the responses
+        key = (
+            getattr(g.get("user"), "id", None),
+            request.full_path,
+            request.headers.get("If-None-Match"),
+            request.headers.get("If-Modified-Since"),
+            request.headers.get("Accept-Language"),
+        )
+
+        def get_response():
+            response = make_response(func(*args, **kwargs))
+            return response.get_data(), response.status_code, list(response.headers)
+
+        # Each request gets its own response object, built from the shared one
+        data, status, headers = flight.do(key, get_response)[0]
+        return current_app.response_class(data, status, headers)
+
+    return coalesced_function
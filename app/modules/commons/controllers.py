@@ -1,18 +1,16 @@
 """Controllers and blueprins/endpoints for the commons module."""
 
-import os
-import pytz
-
 from flask import Blueprint, request, jsonify
 from flask_babel import _
-from sqlalchemy.orm import selectinload  # This function is called within 'eval'
 from flasgger import swag_from
 
 from app import AppSession
 from app.middleware import ensure_authorized
 from app.modules.commons.forms import *
 from app.modules.commons.models import *
-from app.modules.utils import get_sort_attrs, get_join_attrs, get_filter_attrs
+from app.modules.listing import list_items, get_query_fieldset, serialize_item
+from app.modules.conditional import conditional_item
+from app.modules.reference_data import list_reference_items, bump_reference_version
 
 # Blueprints for the models
 mod_uf = Blueprint("ufs", __name__, url_prefix="/ufs")
@@ -25,50 +23,7 @@ mod_city = Blueprint("cities", __name__, url_prefix="/cities")
 def index_uf():
     """Lists the existing UFs."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = UF
-
-    # Trying to obtain data from models
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_reference_items(UF)
 
 
 @mod_uf.route("", methods=["POST"])
@@ -105,6 +60,7 @@ def create_uf():
             item = UF(**request.json)
             session.add(item)
             session.flush()
+            bump_reference_version(session, UF)
             session.commit()
             return jsonify({"data": item.as_dict(), "meta": {"success": True}})
         except Exception as e:
@@ -118,16 +74,21 @@ def create_uf():
 @mod_uf.route("/<int:id>", methods=["GET"])
 @ensure_authorized
 @swag_from("swagger/uf/get_item_by_id.yml")
+@conditional_item(UF)
 def get_uf_by_id(id):
     """Gets an existing UF by its id."""
 
     with AppSession() as session:
+        fieldset = get_query_fieldset(UF, options=())
+
         # Searching item by ID
-        item = session.query(UF).get(id)
+        item = session.query(UF).options(*fieldset.options).get(id)
 
         # If item is found
         if item:
-            return jsonify({"data": item.as_dict(), "meta": {"success": True}})
+            return jsonify(
+                {"data": serialize_item(item, fieldset), "meta": {"success": True}}
+            )
 
         return (
             jsonify(
@@ -189,6 +150,7 @@ def update_uf(id):
             item.name = form.name.data
 
         try:
+            bump_reference_version(session, UF)
             session.commit()
             return jsonify({"data": item.as_dict(), "meta": {"success": True}})
 
@@ -241,6 +203,7 @@ def delete_uf(id):
             )
         try:
             session.delete(item)
+            bump_reference_version(session, UF)
             session.commit()
             return jsonify({"data": "", "meta": {"success": True}}), 204
         except Exception as e:
@@ -257,55 +220,7 @@ def delete_uf(id):
 def index_city():
     """Lists the existing cities."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = City
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    # Trying to obtain data from models
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_reference_items(City)
 
 
 @mod_city.route("", methods=["POST"])
@@ -339,6 +254,7 @@ def create_city():
             item = City(**request.json)
             session.add(item)
             session.flush()
+            bump_reference_version(session, City)
             session.commit()
             return jsonify({"data": item.as_dict(), "meta": {"success": True}})
         except Exception as e:
@@ -352,23 +268,22 @@ def create_city():
 @mod_city.route("/<int:id>", methods=["GET"])
 @ensure_authorized
 @swag_from("swagger/city/get_item_by_id.yml")
+@conditional_item(City)
 def get_city_by_id(id):
     """Gets an existing city by its id."""
 
     with AppSession() as session:
         model = City
-        selectinloads = eval(
-            "".join(
-                f"selectinload({r}), " for r in list(model.__mapper__.relationships)
-            )
-        )
+        fieldset = get_query_fieldset(model)
 
         # Searching item by ID
-        item = session.query(model).options(selectinloads).get(id)
+        item = session.query(model).options(*fieldset.options).get(id)
 
         # If item is found
         if item:
-            return jsonify({"data": item.as_dict(), "meta": {"success": True}})
+            return jsonify(
+                {"data": serialize_item(item, fieldset), "meta": {"success": True}}
+            )
 
         return (
             jsonify(
@@ -428,6 +343,7 @@ def update_city(id):
             item.name = form.name.data
 
         try:
+            bump_reference_version(session, City)
             session.commit()
             return jsonify({"data": item.as_dict(), "meta": {"success": True}})
 
@@ -465,6 +381,7 @@ def delete_city(id):
         # TODO: check for newly created relationships
         try:
             session.delete(item)
+            bump_reference_version(session, City)
             session.commit()
             return jsonify({"data": "", "meta": {"success": True}}), 204
         except Exception as e:
@@ -2,24 +2,10 @@
 
 from config import tz
 from app import db
+from app.modules.serialization import SerializerMixin
 
 
-def default_object_string(object, timezone=tz):
-    """Function to format an object (like datetime/date) to a string."""
-
-    if str(type(object)) == "<class 'datetime.datetime'>":
-        try:
-            return (
-                tz.localize(object).astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
-            )
-        except:
-            return object.astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
-    elif str(type(object)) == "<class 'datetime.date'>":
-        return object.strftime("%Y-%m-%d")
-    return object
-
-
-class Base(db.Model):
+class Base(SerializerMixin, db.Model):
     """Base application model for other database tables to inherit."""
 
     __abstract__ = True
@@ -52,18 +38,6 @@ class UF(Base):
     def __repr__(self):
         return "<UF %r>" % (self.code)
 
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-        }
-        # Add the related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-        return data
-
 
 class City(Base):
     __tablename__ = "city"
@@ -84,14 +58,17 @@ class City(Base):
     def __repr__(self):
         return "<City %r>" % (self.name)
 
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-        }
-        # Add the related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-        return data
+
+class CacheVersion(Base):
+    __tablename__ = "cache_version"
+
+    # Version of a cached table, bumped on every change, so the workers know when to reload their copies
+    name = db.Column(db.String(128), nullable=False, unique=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+    def __init__(self, name, version=0):
+        self.name = name
+        self.version = version
+
+    def __repr__(self):
+        return "<CacheVersion %r>" % (self.name)
@@ -0,0 +1,244 @@
+"""Conditional requests (ETag / Last-Modified validators and 304 responses) for the listings and items."""
+
+import hashlib
+from collections import namedtuple
+from datetime import timedelta
+from functools import wraps
+
+import pytz
+from flask import request, g, make_response
+from sqlalchemy import func
+
+from config import tz
+from app import db
+from app.modules.utils import model_registry
+from app.modules.timezones import get_timezone
+from app.modules.serialization import get_serializer
+
+# Validators of a response: a weak ETag and its last modification (an aware datetime, or None)
+Validator = namedtuple("Validator", ["etag", "last_modified"])
+
+# The 'updated_at' columns have a resolution of one second, so rows changed within the last second might still
+# change without a newer 'updated_at': responses with such rows get no validators
+FRESHNESS_WINDOW = timedelta(seconds=1)
+
+# Timezones of the databases clocks, by engine
+_database_timezones = {}
+
+
+def get_database_timezone():
+    """
+    Gets the timezone of the database clock, on which the 'updated_at' columns are set (by CURRENT_TIMESTAMP): UTC
+    on SQLite, the session timezone on PostgreSQL and the application timezone on the other databases.
+    """
+
+    engine = db.engine
+    timezone = _database_timezones.get(engine)
+    if timezone is None:
+        if engine.dialect.name == "sqlite":
+            timezone = pytz.utc
+        elif engine.dialect.name == "postgresql":
+            with engine.connect() as conn:
+                timezone = get_timezone(conn.exec_driver_sql("SHOW TIME ZONE").scalar())
+        timezone = _database_timezones[engine] = timezone or tz
+    return timezone
+
+
+def get_request_fingerprint():
+    """Gets a fingerprint for the request path, parameters and user, since they define the response contents."""
+
+    user = g.get("user")
+    parts = [
+        request.path,
+        str(getattr(user, "id", None)),
+        *sorted(f"{k}={v}" for k, v in request.args.items(multi=True)),
+    ]
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+
+def get_validator(fingerprint, last_modified, count, now, timezone):
+    """
+    Gets the validators for a response, given the state of its rows.
+
+    Args:
+        fingerprint (str): The fingerprint of the request.
+        last_modified (datetime): The greatest 'updated_at' of the rows (naive, on the database clock).
+        count (int): The number of rows (so removals are noticed).
+        now (datetime): The current time on the database clock (aware, like on PostgreSQL, or naive).
+        timezone: The timezone of the database clock.
+
+    Returns:
+        Validator: The validators, or None if the rows were changed too recently.
+    """
+
+    # Naive datetimes are compared, on the database clock
+    if now.tzinfo is not None:
+        now = now.astimezone(timezone).replace(tzinfo=None)
+    if last_modified is not None and last_modified > now - FRESHNESS_WINDOW:
+        return None
+    etag = hashlib.sha1(f"{fingerprint}:{last_modified}:{count}".encode()).hexdigest()
+    if last_modified is not None:
+        last_modified = timezone.localize(last_modified).astimezone(pytz.utc)
+    return Validator(etag=etag[:32], last_modified=last_modified)
+
+
+def get_query_validator(query, model):
+    """
+    Gets the validators for the rows of a query, with a single aggregate query (which also counts them).
+
+    Args:
+        query: The query (without loader options) whose rows will be returned.
+        model: The queried model.
+
+    Returns:
+        tuple: The number of rows and the validators (None if the rows were changed too recently).
+    """
+
+    count, last_modified, now = (
+        query.order_by(None)
+        .with_entities(
+            func.count(), func.max(model.updated_at), func.current_timestamp()
+        )
+        .one()
+    )
+    validator = get_validator(
+        get_request_fingerprint(), last_modified, count, now, get_database_timezone()
+    )
+    return count, validator
+
+
+def is_not_modified(validator):
+    """Checks if the request validators ('If-None-Match' or 'If-Modified-Since' headers) are still valid."""
+
+    if validator is None:
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(validator.etag)
+    if request.if_modified_since is not None and validator.last_modified is not None:
+        return (
+            validator.last_modified.replace(microsecond=0) <= request.if_modified_since
+        )
+    return False
+
+
+def add_validator(response, validator):
+    """Sets the validators headers of a response (for successful responses only)."""
+
+    if validator is not None and response.status_code in (200, 304):
+        response.set_etag(validator.etag, weak=True)
+        if validator.last_modified is not None:
+            response.last_modified = validator.last_modified
+    return response
+
+
+def not_modified(validator):
+    """Gets the 304 (Not Modified) response for the validators."""
+
+    return add_validator(make_response("", 304), validator)
+
+
+def get_item_relationships(model):
+    """
+    Gets the names of the relationships serialized along with an item, given the request's 'fields' and 'include'
+    parameters (by default, the to-one relationships and, if the model sends their IDs, the to-many ones), or None
+    if nested relationships are included.
+    """
+
+    relationships = model_registry.get(model).relationships
+    fields = request.args.get("fields", default=None, type=str)
+    include = request.args.get("include", default=None, type=str)
+    if fields is None and include is None:
+        collection_ids = get_serializer(model).collection_ids
+        return [
+            name
+            for name, r in relationships.items()
+            if r.kind == "one" or collection_ids
+        ]
+
+    names = {n.strip() for n in f"{fields or ''},{include or ''}".split(",")}
+    if any("." in n for n in names):
+        return None
+    return sorted(names.intersection(relationships))
+
+
+def get_item_validator(model, id, references=None):
+    """
+    Gets the validators for an item and its serialized relationships, with a query for each one of them.
+
+    Args:
+        model: The model of the item.
+        id (int): The item ID.
+        references: Function getting the rows of other tables serialized along with the item (as tuples with
+            their names, models and IDs), given the item ID.
+
+    Returns:
+        Validator: The validators, or None if the item (or a related one) was changed too recently, the item
+            wasn't found or nested relationships are included.
+    """
+
+    relationships = get_item_relationships(model)
+    row = (
+        db.session.query(model.updated_at, func.current_timestamp())
+        .filter(model.id == id)
+        .first()
+    )
+    if row is None or relationships is None:
+        return None
+
+    last_modified, now = row
+    states = [str(last_modified)]
+    for name in relationships:
+        related_model = model_registry.get(model).relationships[name].model
+        related_last_modified, count = (
+            db.session.query(func.max(related_model.updated_at), func.count())
+            .select_from(model)
+            .join(getattr(model, name))
+            .filter(model.id == id)
+            .one()
+        )
+        states.append(f"{name}:{related_last_modified}:{count}")
+        if related_last_modified is not None and (
+            last_modified is None or related_last_modified > last_modified
+        ):
+            last_modified = related_last_modified
+
+    for name, related_model, related_id in references(id) if references else ():
+        related_last_modified = (
+            db.session.query(related_model.updated_at)
+            .filter(related_model.id == related_id)
+            .scalar()
+        )
+        states.append(
+            f"{name}:{related_model.__name__}:{related_id}:{related_last_modified}"
+        )
+        if related_last_modified is not None and (
+            last_modified is None or related_last_modified > last_modified
+        ):
+            last_modified = related_last_modified
+
+    fingerprint = f"{get_request_fingerprint()}:{','.join(states)}"
+    return get_validator(fingerprint, last_modified, 1, now, get_database_timezone())
+
+
+def conditional_item(model, references=None):
+    """
+    Decorator to answer conditional requests for an item (given by the 'id' route parameter) with a 304 response,
+    before the item is loaded and serialized.
+
+    Args:
+        model: The model of the item.
+        references: Function getting the rows of other tables serialized along with the item (see
+            'get_item_validator').
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def conditional_function(*args, **kwargs):
+            validator = get_item_validator(model, kwargs["id"], references)
+            if is_not_modified(validator):
+                return not_modified(validator)
+            return add_validator(make_response(view(*args, **kwargs)), validator)
+
+        return conditional_function
+
+    return decorator
@@ -1,25 +1,48 @@
 """Controllers and blueprins/endpoints for the documents module."""
 
-from os import path, stat
+from os import path, remove, stat
 import time
-import pytz
 
 from flask import Blueprint, request, jsonify, g
 from flask_babel import _
-from sqlalchemy.orm import selectinload  # This function is called within 'eval'
 from werkzeug.utils import secure_filename
 
 from app import AppSession
 from app.services.storage import store_file, remove_file
 from app.services.thumbnail import get_file_thumbnail
-from config import UPLOAD_TEMP_FOLDER, ALLOWED_FILE_EXTENSIONS, tz
-from app.middleware import ensure_authenticated, ensure_authorized
+from config import (
+    UPLOAD_TEMP_FOLDER,
+    ALLOWED_FILE_EXTENSIONS,
+    THUMBNAIL_CONCURRENCY,
+    tz,
+)
+from app.middleware import (
+    ensure_authenticated,
+    ensure_authorized,
+    rate_limit_cost,
+    limit_concurrency,
+    coalesce_requests,
+)
 from app.modules.document.forms import *
 from app.modules.document.models import *
 from app.modules.users.models import *
 from app.modules.commons.models import *
-from app.modules.utils import get_sort_attrs, get_join_attrs, get_filter_attrs
-from app.modules.document.utils import notify_document_expiration
+from app.modules.listing import list_items, get_query_fieldset, serialize_item
+from app.modules.conditional import conditional_item
+from app.modules.result_cache import cached_listing
+from app.modules.reference_data import list_reference_items, bump_reference_version
+from app.modules.document.utils import (
+    notify_document_expiration,
+    shared_with,
+    accessible_by,
+    copy_content_file,
+    queue_content_extraction,
+)
+from app.modules.document.search import (
+    search_documents,
+    search_document_contents,
+    get_search_terms,
+)
 
 # Blueprints for the model
 mod_document_category = Blueprint(
@@ -33,60 +56,19 @@ mod_document_sharing = Blueprint(
     "document_sharings", __name__, url_prefix="/document-sharings"
 )
 
+# Models the document models can refer to (sent along with them), by their names
+# TODO: must be updated if other models should be allowed
+DOCUMENT_MODEL_NAMES = {
+    "User": User,
+}
+
 
 @mod_document_category.route("", methods=["GET"])
 @ensure_authenticated
 def index_document_category():
     """Lists the document categories."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = DocumentCategory
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_reference_items(DocumentCategory)
 
 
 @mod_document_category.route("", methods=["POST"])
@@ -124,6 +106,7 @@ def create_document_category():
             item = model(**request.json)
             session.add(item)
             session.flush()
+            bump_reference_version(session, DocumentCategory)
             session.commit()
             return jsonify({"data": item.as_dict(), "meta": {"success": True}})
         except Exception as e:
@@ -136,23 +119,22 @@ def create_document_category():
 
 @mod_document_category.route("/<int:id>", methods=["GET"])
 @ensure_authenticated
+@conditional_item(DocumentCategory)
 def get_document_category_by_id(id):
     """Returns a document category, given its id."""
 
     with AppSession() as session:
         model = DocumentCategory
-        selectinloads = eval(
-            "".join(
-                f"selectinload({r}), " for r in list(model.__mapper__.relationships)
-            )
-        )
+        fieldset = get_query_fieldset(model)
 
         # Searching item by ID
-        item = session.query(model).options(selectinloads).get(id)
+        item = session.query(model).options(*fieldset.options).get(id)
 
         # If item is found
         if item:
-            return jsonify({"data": item.as_dict(), "meta": {"success": True}})
+            return jsonify(
+                {"data": serialize_item(item, fieldset), "meta": {"success": True}}
+            )
 
         # If no item is found
         return (
@@ -215,6 +197,7 @@ def update_document_category(id):
             item.name = form.name.data
 
         try:
+            bump_reference_version(session, DocumentCategory)
             session.commit()
             return jsonify({"data": item.as_dict(), "meta": {"success": True}})
 
@@ -268,6 +251,7 @@ def delete_document_category(id):
             )
         try:
             session.delete(item)
+            bump_reference_version(session, DocumentCategory)
             session.commit()
             return jsonify({"data": "", "meta": {"success": True}}), 204
 
@@ -281,184 +265,75 @@ def delete_document_category(id):
 
 @mod_document.route("", methods=["GET"])
 @ensure_authorized
+@cached_listing(Document)
 def index_document():
     """Lists the documents."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = Document
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_items(Document)
 
 
 @mod_document.route("/my", methods=["GET"])
 @ensure_authenticated
+@coalesce_requests
+@cached_listing(Document, scope="user")
 def index_my_document():
     """Lists an user documents."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = Document
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .filter_by(user_id=g.user.id)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .filter_by(user_id=g.user.id)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_items(Document, Document.query.filter_by(user_id=g.user.id))
 
 
 @mod_document.route("/shared", methods=["GET"])
 @ensure_authenticated
+@coalesce_requests
+@cached_listing(Document, scope="user")
 def index_shared_document():
     """Lists the documents shared with an user."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
+    return list_items(Document, Document.query.filter(shared_with(g.user.id)))
 
-    model = Document
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
 
-    # First, we'll get a list of shared documents IDs
-    res_ids = (
-        DocumentSharing.query.filter(DocumentSharing.shared_user_id == g.user.id)
-        .with_entities(DocumentSharing.document_id)
-        .order_by(DocumentSharing.id.desc())
-        .all()
-    )
-    shared_document_ids = [res_id[0] for res_id in res_ids]
+@mod_document.route("/accessible", methods=["GET"])
+@ensure_authenticated
+@coalesce_requests
+@cached_listing(Document, scope="user")
+def index_accessible_document():
+    """Lists the documents owned by or shared with an user."""
 
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .filter(model.id.in_(shared_document_ids))
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .filter(model.id.in_(shared_document_ids))
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
+    return list_items(Document, Document.query.filter(accessible_by(g.user.id)))
+
+
+@mod_document.route("/search", methods=["GET"])
+@ensure_authenticated
+def search_document():
+    """Searches the documents owned by or shared with an user (by their metadata and content), sorted by relevance."""
 
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
+    q = request.args.get("q", default="", type=str)
+    content = request.args.get("content", default="", type=str)
+    if len(get_search_terms(q)) == 0 and len(get_search_terms(content)) == 0:
+        return (
+            jsonify(
+                {
+                    "data": [],
+                    "meta": {"success": False, "errors": _("No search terms provided")},
+                }
+            ),
+            400,
+        )
 
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    # Both searches might be combined, sorting first by the metadata relevance
+    query, order_by = Document.query.filter(accessible_by(g.user.id)), ()
+    for text, search in ((q, search_documents), (content, search_document_contents)):
+        if len(get_search_terms(text)) > 0:
+            query, relevance = search(query, text)
+            if relevance is not None:
+                order_by += (relevance,)
+    return list_items(Document, query, order_by=order_by)
 
 
 @mod_document.route("", methods=["POST"])
 @ensure_authorized
+@rate_limit_cost(10)
+@limit_concurrency(THUMBNAIL_CONCURRENCY)
 def create_document():
     """Creates a document."""
 
@@ -560,8 +435,10 @@ def create_document():
 
         # If an alert should be sent and no email address was provided, we'll try to use the user email
         if int(form.alert.data) == 1 and form.alert_email.data is None:
+            # The authenticated user might not carry the email (e.g. for stateless tokens)
+            user_email = session.query(User).get(g.user.id).email
             # If user email is not available, we inform about the error
-            if g.user.email is None:
+            if user_email is None:
                 return (
                     jsonify(
                         {
@@ -577,7 +454,7 @@ def create_document():
                     400,
                 )
             # Otherwise, we'll use the user's email
-            form.alert_email.data = g.user.email
+            form.alert_email.data = user_email
 
         # If an alert should be sent and number of days to alert was provided, we'll inform about the error
         if int(form.alert.data) == 1 and form.days_to_alert.data is None:
@@ -594,6 +471,7 @@ def create_document():
                 400,
             )
 
+        content_file = None
         try:
             # Loading the file to the temp folder
             file.save(path.join(UPLOAD_TEMP_FOLDER, filename))
@@ -613,6 +491,9 @@ def create_document():
                 filename_thumb = None
                 file_size_thumb = None
 
+            # Keeping a copy of the file to have its content extracted (after the document is created)
+            content_file = copy_content_file(path.join(UPLOAD_TEMP_FOLDER, filename))
+
             # Calling the function to upload file to selected directory/container
             upload_response = store_file(
                 path.join(UPLOAD_TEMP_FOLDER, filename), filename
@@ -651,6 +532,11 @@ def create_document():
             session.add(item)
             session.flush()
             session.commit()
+
+            # Extracting the file content in the background
+            if content_file is not None:
+                queue_content_extraction(item.id, content_file)
+                content_file = None
             return jsonify({"data": item.as_dict(), "meta": {"success": True}})
 
         except Exception as e:
@@ -659,26 +545,29 @@ def create_document():
                 jsonify({"data": [], "meta": {"success": False, "errors": str(e)}}),
                 500,
             )
+        finally:
+            # Removing the copy of the file, if the document wasn't created
+            if content_file is not None:
+                remove(content_file)
 
 
 @mod_document.route("/<int:id>", methods=["GET"])
 @ensure_authenticated
+@conditional_item(Document)
 def get_document_by_id(id):
     """Gets a document by its id."""
 
     with AppSession() as session:
         model = Document
-        selectinloads = eval(
-            "".join(
-                f"selectinload({r}), " for r in list(model.__mapper__.relationships)
-            )
-        )
+        fieldset = get_query_fieldset(model)
 
         # Searching item by ID
-        item = session.query(model).options(selectinloads).get(id)
+        item = session.query(model).options(*fieldset.options).get(id)
 
         if item:
-            return jsonify({"data": item.as_dict(), "meta": {"success": True}})
+            return jsonify(
+                {"data": serialize_item(item, fieldset), "meta": {"success": True}}
+            )
 
         # If no item is found
         return (
@@ -757,8 +646,10 @@ def update_document(id):
         # If the alert was set, there must be an alert email and days to alert
         if form.alert.data and int(form.alert.data) == 1:
             if form.alert_email.data is None and item.alert_email is None:
+                # The authenticated user might not carry the email (e.g. for stateless tokens)
+                user_email = session.query(User).get(g.user.id).email
                 # If user email is not available, we inform about the error
-                if g.user.email is None:
+                if user_email is None:
                     return (
                         jsonify(
                             {
@@ -774,7 +665,7 @@ def update_document(id):
                         400,
                     )
                 # Otherwise, we'll use the user's email
-                form.alert_email.data = g.user.email
+                form.alert_email.data = user_email
             if form.days_to_alert.data is None and item.days_to_alert is None:
                 return (
                     jsonify(
@@ -866,7 +757,8 @@ def delete_document(id):
             # So we first retrieve the file URL
             file_url = item.file_url
             file_thumbnail_url = item.file_thumbnail_url
-            # Removing the item
+            # Removing the item (and its extracted content)
+            session.query(DocumentContent).filter_by(document_id=id).delete()
             session.delete(item)
             session.commit()
             # Removing the files
@@ -884,57 +776,11 @@ def delete_document(id):
 
 @mod_document_model.route("", methods=["GET"])
 @ensure_authenticated
+@cached_listing(DocumentModel)
 def index_document_model():
     """Lists the document models."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = DocumentModel
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_items(DocumentModel)
 
 
 @mod_document_model.route("", methods=["POST"])
@@ -1029,27 +875,33 @@ def create_document_model():
             )
 
 
+def get_document_model_references(id):
+    """Gets the row a document model refers to (sent along with it), for its validators."""
+
+    row = (
+        DocumentModel.query.with_entities(
+            DocumentModel.model_name, DocumentModel.model_id
+        )
+        .filter_by(id=id)
+        .first()
+    )
+    if row is None or row.model_name not in DOCUMENT_MODEL_NAMES:
+        return []
+    return [("model", DOCUMENT_MODEL_NAMES[row.model_name], row.model_id)]
+
+
 @mod_document_model.route("/<int:id>", methods=["GET"])
 @ensure_authenticated
+@conditional_item(DocumentModel, references=get_document_model_references)
 def get_document_model_by_id(id):
     """Gets a document model by id."""
 
-    # Creating a dict with the possible model names
-    # TODO: must be updated if other models should be allowed
-    model_names = {
-        "User": User,
-    }
-
     with AppSession() as session:
         model = DocumentModel
-        selectinloads = eval(
-            "".join(
-                f"selectinload({r}), " for r in list(model.__mapper__.relationships)
-            )
-        )
+        fieldset = get_query_fieldset(model)
 
         # Searching item by ID
-        item = session.query(model).options(selectinloads).get(id)
+        item = session.query(model).options(*fieldset.options).get(id)
 
         # If no item is found
         if item is None:
@@ -1064,12 +916,12 @@ def get_document_model_by_id(id):
             )
 
         # Otherwise, we get the item data as dict
-        data = item.as_dict()
+        data = serialize_item(item, fieldset)
 
         # Appending the model data, if a valid model name is set
-        if data["model_name"] in model_names.keys():
+        if fieldset.names is None and data["model_name"] in DOCUMENT_MODEL_NAMES:
             data["model"] = (
-                session.query(model_names[data["model_name"]])
+                session.query(DOCUMENT_MODEL_NAMES[data["model_name"]])
                 .get(data["model_id"])
                 .as_dict()
             )
@@ -1111,57 +963,11 @@ def delete_document_model(id):
 
 @mod_document_sharing.route("", methods=["GET"])
 @ensure_authenticated
+@cached_listing(DocumentSharing)
 def index_document_sharing():
     """Lists the document sharings."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = DocumentSharing
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_items(DocumentSharing)
 
 
 @mod_document.route("/<int:id>/share", methods=["POST"])
@@ -1275,23 +1081,22 @@ def create_document_sharing(id):
 
 @mod_document_sharing.route("/<int:id>", methods=["GET"])
 @ensure_authenticated
+@conditional_item(DocumentSharing)
 def get_document_sharing_by_id(id):
     """Gets a document saring by id."""
 
     with AppSession() as session:
         model = DocumentSharing
-        selectinloads = eval(
-            "".join(
-                f"selectinload({r}), " for r in list(model.__mapper__.relationships)
-            )
-        )
+        fieldset = get_query_fieldset(model)
 
         # Searching item by ID
-        item = session.query(model).options(selectinloads).get(id)
+        item = session.query(model).options(*fieldset.options).get(id)
 
         # If item is found
         if item:
-            return jsonify({"data": item.as_dict(), "meta": {"success": True}})
+            return jsonify(
+                {"data": serialize_item(item, fieldset), "meta": {"success": True}}
+            )
 
         return (
             jsonify(
@@ -1354,6 +1159,7 @@ def delete_document_sharing(id):
 
 @mod_document.route("/<int:id>/notify_expiration", methods=["POST"])
 @ensure_authorized
+@rate_limit_cost(5)
 def notify_expiring_document(id):
     """Notifis stakeholders about a document expiration."""
 
@@ -2,27 +2,15 @@
 
 import os
 
+from sqlalchemy import DDL, event
+
 from config import STORAGE_DRIVER, tz
 from app import db
+from app.modules.serialization import SerializerMixin
 from app.modules.users.models import *
 
 
-def default_object_string(object, timezone=tz):
-    """Function to format an object (like datetime/date) to a string."""
-
-    if str(type(object)) == "<class 'datetime.datetime'>":
-        try:
-            return (
-                tz.localize(object).astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
-            )
-        except:
-            return object.astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
-    elif str(type(object)) == "<class 'datetime.date'>":
-        return object.strftime("%Y-%m-%d")
-    return object
-
-
-class Base(db.Model):
+class Base(SerializerMixin, db.Model):
     """Base application model for other database tables to inherit."""
 
     __abstract__ = True
@@ -55,21 +43,11 @@ class DocumentCategory(Base):
     def __repr__(self):
         return "<DocumentCategory %r>" % (self.code)
 
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-        }
-        # Add related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-        return data
-
 
 class Document(Base):
     __tablename__ = "document"
+    # The expiration alerts are searched by their flag and dates
+    __table_args__ = (db.Index("ix_document_alert_expires_at", "alert", "expires_at"),)
 
     # Basic data
     code = db.Column(db.String(128), nullable=False, unique=True)
@@ -81,7 +59,9 @@ class Document(Base):
     days_to_alert = db.Column(db.Integer, nullable=True)
 
     # Relationships and status
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id"), nullable=False, index=True
+    )
     document_category_id = db.Column(
         db.Integer, db.ForeignKey("document_category.id"), nullable=True
     )
@@ -106,6 +86,14 @@ class Document(Base):
     )
     # model_name = db.relationship('ModelName', lazy='select', backref='document')
 
+    # The files are sent with their full URLs
+    __serializer_args__ = {
+        "computed": {
+            "file_url": "full_file_url",
+            "file_thumbnail_url": "full_file_thumbnail_url",
+        }
+    }
+
     def __init__(
         self,
         code,
@@ -181,19 +169,55 @@ class Document(Base):
         else:
             return None
 
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-        }
-        data["file_url"] = self.full_file_url()
-        data["file_thumbnail_url"] = self.full_file_thumbnail_url()
-        # Add the related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-        return data
+
+# Full-text search over the documents metadata, kept in sync by the database itself: an external content FTS5 table
+# (updated by triggers) on SQLite, a FULLTEXT index on MySQL and a GIN index over a 'tsvector' on PostgreSQL
+DOCUMENT_SEARCH_COLUMNS = ("code", "description", "observations", "file_name")
+
+
+def get_document_search_vector(prefix=""):
+    """Gets the PostgreSQL 'tsvector' expression of the documents search (the same one must be queried and indexed)."""
+
+    columns = " || ' ' || ".join(
+        f"coalesce({prefix}{c}, '')" for c in DOCUMENT_SEARCH_COLUMNS
+    )
+    return f"to_tsvector('simple', {columns})"
+
+
+_columns = ", ".join(DOCUMENT_SEARCH_COLUMNS)
+_new_values = ", ".join(f"new.{c}" for c in DOCUMENT_SEARCH_COLUMNS)
+_old_values = ", ".join(f"old.{c}" for c in DOCUMENT_SEARCH_COLUMNS)
+DOCUMENT_SEARCH_DDL = {
+    "sqlite": [
+        f"CREATE VIRTUAL TABLE document_fts USING fts5({_columns}, content='document', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2')",
+        f"CREATE TRIGGER document_fts_insert AFTER INSERT ON document BEGIN "
+        f"INSERT INTO document_fts (rowid, {_columns}) VALUES (new.id, {_new_values}); END",
+        f"CREATE TRIGGER document_fts_delete AFTER DELETE ON document BEGIN "
+        f"INSERT INTO document_fts (document_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values}); END",
+        f"CREATE TRIGGER document_fts_update AFTER UPDATE OF {_columns} ON document BEGIN "
+        f"INSERT INTO document_fts (document_fts, rowid, {_columns}) VALUES ('delete', old.id, {_old_values}); "
+        f"INSERT INTO document_fts (rowid, {_columns}) VALUES (new.id, {_new_values}); END",
+    ],
+    "mysql": [f"CREATE FULLTEXT INDEX ix_document_search ON document ({_columns})"],
+    "postgresql": [
+        f"CREATE INDEX ix_document_search ON document USING GIN ({get_document_search_vector()})"
+    ],
+}
+
+for dialect, statements in DOCUMENT_SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(
+            Document.__table__,
+            "after_create",
+            DDL(statement).execute_if(dialect=dialect),
+        )
+# The FTS5 table isn't mapped, so it must be dropped along with the documents table
+event.listen(
+    Document.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS document_fts").execute_if(dialect="sqlite"),
+)
 
 
 class DocumentModel(Base):
@@ -217,25 +241,22 @@ class DocumentModel(Base):
     def __repr__(self):
         return "<DocumentModel %r>" % (self.id)
 
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-        }
-        # Adding the related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-        return data
-
 
 class DocumentSharing(Base):
     __tablename__ = "document_sharing"
+    __table_args__ = (
+        db.Index(
+            "ix_document_sharing_shared_user_id_document_id",
+            "shared_user_id",
+            "document_id",
+        ),
+    )
 
     # Relationships and status
     shared_user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
-    document_id = db.Column(db.Integer, db.ForeignKey("document.id"), nullable=False)
+    document_id = db.Column(
+        db.Integer, db.ForeignKey("document.id"), nullable=False, index=True
+    )
 
     # Relationships
     # model_name = db.relationship('ModelName', lazy='select', backref='document_sharing')
@@ -247,14 +268,56 @@ class DocumentSharing(Base):
     def __repr__(self):
         return "<DocumentSharing %r>" % (self.id)
 
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-        }
-        # Adding the related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-        return data
+
+class DocumentContent(Base):
+    __tablename__ = "document_content"
+
+    # Text extracted from the document file (in the background, after the upload), to be searched
+    document_id = db.Column(
+        db.Integer, db.ForeignKey("document.id"), nullable=False, unique=True
+    )
+    content = db.Column(db.Text, nullable=False)
+
+    def __init__(self, document_id, content):
+        self.document_id = document_id
+        self.content = content
+
+    def __repr__(self):
+        return "<DocumentContent %r>" % (self.document_id)
+
+
+# Full-text search over the documents content, kept in sync the same way as the metadata search
+DOCUMENT_CONTENT_SEARCH_DDL = {
+    "sqlite": [
+        "CREATE VIRTUAL TABLE document_content_fts USING fts5(content, content='document_content', "
+        "content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+        "CREATE TRIGGER document_content_fts_insert AFTER INSERT ON document_content BEGIN "
+        "INSERT INTO document_content_fts (rowid, content) VALUES (new.id, new.content); END",
+        "CREATE TRIGGER document_content_fts_delete AFTER DELETE ON document_content BEGIN "
+        "INSERT INTO document_content_fts (document_content_fts, rowid, content) "
+        "VALUES ('delete', old.id, old.content); END",
+        "CREATE TRIGGER document_content_fts_update AFTER UPDATE OF content ON document_content BEGIN "
+        "INSERT INTO document_content_fts (document_content_fts, rowid, content) "
+        "VALUES ('delete', old.id, old.content); "
+        "INSERT INTO document_content_fts (rowid, content) VALUES (new.id, new.content); END",
+    ],
+    "mysql": [
+        "CREATE FULLTEXT INDEX ix_document_content_search ON document_content (content)"
+    ],
+    "postgresql": [
+        "CREATE INDEX ix_document_content_search ON document_content USING GIN (to_tsvector('simple', content))"
+    ],
+}
+
+for dialect, statements in DOCUMENT_CONTENT_SEARCH_DDL.items():
+    for statement in statements:
+        event.listen(
+            DocumentContent.__table__,
+            "after_create",
+            DDL(statement).execute_if(dialect=dialect),
+        )
+event.listen(
+    DocumentContent.__table__,
+    "before_drop",
+    DDL("DROP TABLE IF EXISTS document_content_fts").execute_if(dialect="sqlite"),
+)
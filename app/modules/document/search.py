@@ -0,0 +1,160 @@
+"""Full-text search over the documents."""
+
+import re
+
+from sqlalchemy import and_, or_, func, select, table, column, literal_column
+from sqlalchemy.dialects.mysql import match
+
+from app import db
+from app.modules.document.models import (
+    Document,
+    DocumentContent,
+    DOCUMENT_SEARCH_COLUMNS,
+    get_document_search_vector,
+)
+
+# Maximum number of terms of a search, so a long text doesn't become a huge query
+MAX_SEARCH_TERMS = 16
+
+
+def get_search_terms(q):
+    """Gets the terms (words) of a search text, without any of the full-text search operators."""
+
+    return re.findall(r"\w+", q.lower())[:MAX_SEARCH_TERMS]
+
+
+def search_documents(query, q):
+    """
+    Filters a documents query by a full-text search over the documents metadata.
+
+    Every term must be found (as a word or a word prefix, since searches are run as the user types) on the
+    code, description, observations or file name of the document.
+
+    Args:
+        query: The documents query to be filtered.
+        q (str): The search text.
+
+    Returns:
+        tuple: The filtered query and the expression to sort it by relevance (None if the database has no
+            full-text search support).
+    """
+
+    terms = get_search_terms(q)
+    dialect = db.engine.dialect.name
+
+    if dialect == "sqlite":
+        # Matching documents are joined with their rank (lower is better) from the FTS5 table
+        fts = table("document_fts", column("rowid"))
+        matches = (
+            select(
+                fts.c.rowid.label("id"),
+                func.bm25(literal_column("document_fts")).label("rank"),
+            )
+            .where(
+                literal_column("document_fts").op("MATCH")(
+                    " ".join(f'"{t}"*' for t in terms)
+                )
+            )
+            .subquery()
+        )
+        return query.join(matches, Document.id == matches.c.id), matches.c.rank.asc()
+
+    if dialect == "mysql":
+        relevance = match(
+            *[getattr(Document, c) for c in DOCUMENT_SEARCH_COLUMNS],
+            against=" ".join(f"+{t}*" for t in terms),
+        ).in_boolean_mode()
+        return query.filter(relevance), relevance.desc()
+
+    if dialect == "postgresql":
+        # The vector expression must be the indexed one
+        vector = literal_column(get_document_search_vector("document."))
+        tsquery = func.to_tsquery(
+            literal_column("'simple'"), " & ".join(f"{t}:*" for t in terms)
+        )
+        return (
+            query.filter(vector.op("@@")(tsquery)),
+            func.ts_rank(vector, tsquery).desc(),
+        )
+
+    # Otherwise, the terms are searched on each column, without ranking
+    return (
+        query.filter(
+            and_(
+                *[
+                    or_(
+                        *[
+                            getattr(Document, c).ilike(f"%{t}%")
+                            for c in DOCUMENT_SEARCH_COLUMNS
+                        ]
+                    )
+                    for t in terms
+                ]
+            )
+        ),
+        None,
+    )
+
+
+def search_document_contents(query, content):
+    """
+    Filters a documents query by a full-text search over the text extracted from the documents files.
+
+    Every term must be found (as a word or a word prefix) on the document content. Documents whose content
+    wasn't extracted (yet, or because of their file format) are never found.
+
+    Args:
+        query: The documents query to be filtered.
+        content (str): The search text.
+
+    Returns:
+        tuple: The filtered query and the expression to sort it by relevance (None if the database has no
+            full-text search support).
+    """
+
+    terms = get_search_terms(content)
+    dialect = db.engine.dialect.name
+
+    if dialect == "sqlite":
+        # Matching contents are joined (by their documents) with their rank from the FTS5 table
+        fts = table("document_content_fts", column("rowid"))
+        matches = (
+            select(
+                DocumentContent.document_id.label("id"),
+                func.bm25(literal_column("document_content_fts")).label("rank"),
+            )
+            .select_from(fts)
+            .join(DocumentContent, DocumentContent.id == fts.c.rowid)
+            .where(
+                literal_column("document_content_fts").op("MATCH")(
+                    " ".join(f'"{t}"*' for t in terms)
+                )
+            )
+            .subquery()
+        )
+        return query.join(matches, Document.id == matches.c.id), matches.c.rank.asc()
+
+    query = query.join(DocumentContent, DocumentContent.document_id == Document.id)
+
+    if dialect == "mysql":
+        relevance = match(
+            DocumentContent.content, against=" ".join(f"+{t}*" for t in terms)
+        ).in_boolean_mode()
+        return query.filter(relevance), relevance.desc()
+
+    if dialect == "postgresql":
+        # The vector expression must be the indexed one
+        vector = func.to_tsvector(literal_column("'simple'"), DocumentContent.content)
+        tsquery = func.to_tsquery(
+            literal_column("'simple'"), " & ".join(f"{t}:*" for t in terms)
+        )
+        return (
+            query.filter(vector.op("@@")(tsquery)),
+            func.ts_rank(vector, tsquery).desc(),
+        )
+
+    # Otherwise, the terms are searched on the content, without ranking
+    return (
+        query.filter(and_(*[DocumentContent.content.ilike(f"%{t}%") for t in terms])),
+        None,
+    )
@@ -1,15 +1,52 @@
 """Utilities for the documents module."""
 
+import os
+import shutil
 from datetime import datetime
 
 from humanize import naturalsize
 from flask import render_template
 from flask_babel import _
+from sqlalchemy import or_, select
 
+from app import AppSession
 from app.services.mail import send_mail
+from app.services.extraction import get_file_text
+from app.services.tasks import TaskQueue
+from app.services.green import run_blocking
+from config import (
+    CONTENT_EXTRACTION_EXTENSIONS,
+    CONTENT_EXTRACTION_MAX_BYTES,
+    CONTENT_EXTRACTION_MAX_PAGES,
+    CONTENT_EXTRACTION_QUEUE_SIZE,
+)
 from app.modules.document.models import *
 from app.modules.notification.utils import *
 
+# The documents content is extracted by a background worker, so uploads don't wait for it
+content_extraction = TaskQueue("content_extraction", CONTENT_EXTRACTION_QUEUE_SIZE)
+
+
+def shared_with(user_id):
+    """
+    Gets the condition for the documents shared with an user.
+
+    It's a semi-join against the documents sharings (instead of a list of IDs), so the database can use the
+    sharings index and no document is repeated.
+    """
+
+    return Document.id.in_(
+        select(DocumentSharing.document_id).where(
+            DocumentSharing.shared_user_id == user_id
+        )
+    )
+
+
+def accessible_by(user_id):
+    """Gets the condition for the documents an user owns or which are shared with the user."""
+
+    return or_(Document.user_id == user_id, shared_with(user_id))
+
 
 def notify_document_expiration(document_id, session):
     """Function to send a notification for an expiring document."""
@@ -81,3 +118,78 @@ def notify_document_expiration(document_id, session):
     # Flushing and committing the changes on the database session
     session.flush()
     session.commit()
+
+
+def copy_content_file(file):
+    """
+    Links (or copies) an uploaded file to have its content extracted, so it can still be moved to the storage.
+
+    Args:
+        file (str): The path to the uploaded (temporary) file.
+
+    Returns:
+        str: The path to the linked file, or None if the file format isn't supported.
+    """
+
+    filename, file_extension = os.path.splitext(file)
+    if file_extension[1:].lower() not in CONTENT_EXTRACTION_EXTENSIONS:
+        return None
+
+    content_file = f"{filename}-content{file_extension}"
+    try:
+        os.link(file, content_file)
+    except OSError:
+        shutil.copyfile(file, content_file)
+    return content_file
+
+
+def queue_content_extraction(document_id, content_file):
+    """
+    Queues the extraction of a document file content, to be searched.
+
+    Args:
+        document_id (int): The document ID.
+        content_file (str): The path to the file linked by 'copy_content_file'.
+
+    Returns:
+        bool: Whether the extraction was queued (False if the queue is full, and the file is removed).
+    """
+
+    if not content_extraction.submit(
+        extract_document_content, document_id, content_file
+    ):
+        os.remove(content_file)
+        return False
+    return True
+
+
+def extract_document_content(document_id, file):
+    """Extracts and saves the text content of a document file (removing the file afterwards)."""
+
+    try:
+        # The extraction is CPU-bound, so it's run on a native thread (the database calls can't be)
+        content = run_blocking(
+            get_file_text,
+            file,
+            CONTENT_EXTRACTION_MAX_PAGES,
+            CONTENT_EXTRACTION_MAX_BYTES,
+        )
+        if content is None or not content.strip():
+            return
+
+        with AppSession() as session:
+            # The document might have been removed meanwhile
+            if session.query(Document.id).filter_by(id=document_id).first() is None:
+                return
+            item = (
+                session.query(DocumentContent)
+                .filter_by(document_id=document_id)
+                .first()
+            )
+            if item is None:
+                session.add(DocumentContent(document_id, content))
+            else:
+                item.content = content
+            session.commit()
+    finally:
+        os.remove(file)
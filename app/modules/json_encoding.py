@@ -0,0 +1,51 @@
+"""JSON encoding of the responses, with a fast native encoder (orjson) when it's installed."""
+
+from datetime import date, datetime
+
+from flask.json import JSONEncoder
+
+from config import JSON_NATIVE_ENCODER
+from app.modules.serialization import format_datetime, format_date
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover (optional dependency)
+    orjson = None
+
+
+class FastJSONEncoder(JSONEncoder):
+    """
+    JSON encoder for the responses, using orjson when it's installed and enabled (through 'JSON_NATIVE_ENCODER'),
+    and the standard library encoder otherwise.
+
+    Datetimes (naive ones are on the application timezone) and dates are encoded as the serializers format them,
+    so they can be sent as they are.
+    """
+
+    # Whether the native encoder is used
+    native = orjson is not None and JSON_NATIVE_ENCODER
+
+    def default(self, o):
+        # Datetimes are dates as well, so the exact types are compared
+        if type(o) is datetime:
+            return format_datetime(o)
+        if type(o) is date:
+            return format_date(o)
+        return super().default(o)
+
+    def encode(self, o):
+        # Other indentations aren't supported by orjson
+        if not self.native or self.indent not in (None, 2):
+            return super().encode(o)
+
+        # Datetimes are passed to the 'default' method, so they are encoded in the same format on both encoders
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.indent == 2:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(o, default=self.default, option=option).decode()
+        except TypeError:
+            # Values not supported by orjson (like integers over 64 bits) are left to the standard library
+            return super().encode(o)
@@ -0,0 +1,656 @@
+"""Generic listing engine, used by the modules routes that list items."""
+
+import json
+import base64
+import hashlib
+from collections import namedtuple
+from datetime import date, datetime
+from functools import lru_cache
+
+from flask import request, jsonify, abort, make_response, g
+from flask_babel import _
+from sqlalchemy import and_, or_, false
+from sqlalchemy.orm import load_only, selectinload
+
+from config import (
+    tz,
+    LISTING_PLAN_CACHE_SIZE,
+    LISTING_PLAN_CACHE_TTL,
+    LISTING_COUNT_CACHE_SIZE,
+    LISTING_COUNT_CACHE_TTL,
+)
+from app import db
+from app.services.cache import TTLCache
+from app.modules.utils import (
+    get_sort_columns,
+    get_join_attrs,
+    get_filter_attrs,
+    model_registry,
+    FilterError,
+)
+from app.modules.serialization import get_serializer
+from app.modules.timezones import get_timezone
+from app.modules.conditional import (
+    get_query_validator,
+    is_not_modified,
+    not_modified,
+    add_validator,
+)
+from app.modules.query_guard import (
+    get_listing_cost,
+    get_base_query_cost,
+    guard_listing,
+    statement_timeout,
+    QueryTimeout,
+)
+
+# Compiled filtering and sorting of a listing: the required joins, filtering and sorting expressions, plus the
+# sorting columns and directions (ending with the 'id' as a tie-breaker) for the keyset (cursor) pagination, and
+# the listing cost (for the query cost guard)
+ListingPlan = namedtuple(
+    "ListingPlan",
+    [
+        "joins",
+        "filters",
+        "order_by",
+        "sort_keys",
+        "keyset_order_by",
+        "fingerprint",
+        "cost",
+    ],
+)
+
+# Fields selected for a response: their names (None for all of them), the tree of relationships to be included
+# and the options to load only them
+FieldSet = namedtuple("FieldSet", ["names", "includes", "options"])
+
+# Listing plans by model, filter, sort and timezone; the same listings (like dashboards) are requested often
+listing_plans = TTLCache(
+    "listing_plans", max_size=LISTING_PLAN_CACHE_SIZE, ttl=LISTING_PLAN_CACHE_TTL
+)
+
+# Total counts of the listings by their compiled query, used when an estimated count is enough
+listing_counts = TTLCache(
+    "listing_counts", max_size=LISTING_COUNT_CACHE_SIZE, ttl=LISTING_COUNT_CACHE_TTL
+)
+
+# Strategies for the listings total count: a COUNT(*) query, the planner estimate (or a cached count) or none
+COUNT_STRATEGIES = ("exact", "estimate", "none")
+
+
+def parse_filter(filter):
+    """Parses the filter query string, which must be a list of filtering objects (with their properties)."""
+
+    try:
+        parsed_filter = json.loads(filter)
+    except ValueError:
+        raise FilterError("Invalid filter.")
+    if not isinstance(parsed_filter, list) or not all(
+        isinstance(f, dict) and isinstance(f.get("property"), str)
+        for f in parsed_filter
+    ):
+        raise FilterError("Invalid filter.")
+    return parsed_filter
+
+
+def parse_sort(sort):
+    """Parses the sort query string, which must be a list of sorting objects (with their properties and directions)."""
+
+    try:
+        parsed_sort = json.loads(sort)
+    except ValueError:
+        raise FilterError("Invalid sort.")
+    if not isinstance(parsed_sort, list) or not all(
+        isinstance(s, dict)
+        and isinstance(s.get("property"), str)
+        and isinstance(s.get("direction"), str)
+        for s in parsed_sort
+    ):
+        raise FilterError("Invalid sort.")
+    return parsed_sort
+
+
+def get_listing_plan(model, filter, sort, timezone):
+    """
+    Gets the listing plan for a model, given the filter and sort query strings.
+
+    The query strings are parsed once and the resulting expressions (whose values are bound parameters) are
+    cached, so repeated listings skip the parsing and the expressions building.
+    """
+
+    key = (model, filter, sort, timezone.zone)
+    plan = listing_plans.get(key)
+    if plan is None:
+        parsed_filter = parse_filter(filter)
+        parsed_sort = parse_sort(sort)
+        sort_keys = get_sort_columns(model, parsed_sort)
+        order_by = tuple(getattr(c, direction)() for c, direction in sort_keys)
+        joins = tuple(get_join_attrs(model, parsed_filter, parsed_sort))
+        filters = tuple(get_filter_attrs(model, parsed_filter, timezone))
+        # Sorting keys must be unique for the keyset pagination, so we add the 'id' if it's not the last key
+        if sort_keys[-1][0] is not model.id:
+            sort_keys.append((model.id, "asc"))
+        plan = ListingPlan(
+            joins=joins,
+            filters=filters,
+            order_by=order_by,
+            sort_keys=tuple(sort_keys),
+            keyset_order_by=tuple(
+                getattr(c, direction)() for c, direction in sort_keys
+            ),
+            # Cursors are only valid for the same model and sorting
+            fingerprint=get_listing_fingerprint(model, sort),
+            cost=get_listing_cost(model, parsed_filter, sort_keys, joins),
+        )
+        listing_plans.set(key, plan)
+    return plan
+
+
+def get_includes(model, include):
+    """
+    Gets the tree of relationships to be included, given their comma separated (dot separated, if nested) paths.
+
+    Raises:
+        ValueError: If a path is not made of the models relationships.
+    """
+
+    includes = {}
+    for path in include.split(","):
+        if path.strip() == "":
+            continue
+        path_model = model
+        node = includes
+        for name in path.strip().split("."):
+            relationship = model_registry.get(path_model).relationships.get(name)
+            if relationship is None:
+                raise ValueError(
+                    _("Invalid include: %(include)s", include=path.strip())
+                )
+            node = node.setdefault(name, {})
+            path_model = relationship.model
+    return includes
+
+
+def get_include_options(model, includes):
+    """Gets the options to eager load a tree of relationships, with one chain of loaders for each path."""
+
+    options = []
+    for path in _get_include_paths(model, includes):
+        loader = selectinload(path[0])
+        for attr in path[1:]:
+            loader = loader.selectinload(attr)
+        options.append(loader)
+    return options
+
+
+def _get_include_paths(model, includes, prefix=()):
+    for name, nested in includes.items():
+        path = prefix + (getattr(model, name),)
+        if len(nested) == 0:
+            yield path
+        else:
+            related_model = model_registry.get(model).relationships[name].model
+            yield from _get_include_paths(related_model, nested, path)
+
+
+@lru_cache(maxsize=1024)
+def get_fieldset(model, fields=None, include=None):
+    """
+    Gets the fieldset for a model, given the comma separated fields names and relationships paths to include.
+
+    Only the selected columns (plus the ones required to load the included relationships) are loaded, and
+    only the included relationships (and the ones selected as fields) are eager loaded.
+
+    Args:
+        model: The model whose fields were selected.
+        fields (str): The comma separated names of the columns and relationships to be selected; if None, all
+            of the columns are selected.
+        include (str): The comma separated paths of the relationships to be included (like 'user.role').
+
+    Returns:
+        FieldSet: The fieldset.
+
+    Raises:
+        ValueError: If a field is not a column or relationship of the model, or an include path is not valid.
+    """
+
+    metadata = model_registry.get(model)
+    includes = get_includes(model, include or "")
+    options = []
+
+    names = None
+    if fields is not None:
+        names = frozenset(f.strip() for f in fields.split(",") if f.strip())
+        unknown = names.difference(metadata.columns, metadata.relationships)
+        if len(unknown) > 0:
+            raise ValueError(
+                _("Invalid fields: %(fields)s", fields=", ".join(sorted(unknown)))
+            )
+        # Relationships selected as fields are included as well
+        for name in names.intersection(metadata.relationships):
+            includes.setdefault(name, {})
+
+        columns = {"id"}.union(names.intersection(metadata.columns))
+        for name in includes:
+            columns.update(metadata.relationships[name].local_columns)
+        options.append(load_only(*[getattr(model, c) for c in sorted(columns)]))
+
+    options += get_include_options(model, includes)
+    return FieldSet(names=names, includes=includes, options=tuple(options))
+
+
+def get_query_fieldset(model, options=None):
+    """
+    Gets the fieldset requested for the query (through the 'fields' and 'include' parameters), aborting with
+    a 400 response if any of them is not valid.
+
+    Args:
+        model: The model whose fields were selected.
+        options: The loader options when no fields or includes are requested; if None, all of the relationships
+            are eager loaded.
+
+    Returns:
+        FieldSet: The fieldset.
+    """
+
+    fields = request.args.get("fields", default=None, type=str)
+    include = request.args.get("include", default=None, type=str)
+    if fields is None and include is None:
+        if options is None:
+            options = model_registry.get(model).loader_options
+        return FieldSet(names=None, includes={}, options=tuple(options))
+
+    try:
+        return get_fieldset(model, fields, include)
+    except ValueError as e:
+        abort(
+            make_response(
+                jsonify({"data": [], "meta": {"success": False, "errors": str(e)}}),
+                400,
+            )
+        )
+
+
+def serialize_item(item, fieldset, timezone=tz):
+    """Gets the data of an item as dict, with the fieldset's fields and included relationships."""
+
+    data = item.as_dict(timezone, fieldset.names)
+    return _add_includes(item, data, fieldset.includes, timezone)
+
+
+def serialize_items(items, fieldset, timezone=tz):
+    """Gets the data of the items of a page as dicts, as 'serialize_item' does, serializing them at once."""
+
+    if len(items) == 0:
+        return []
+    model = type(items[0])
+    if any(type(item) is not model for item in items):
+        return [serialize_item(item, fieldset, timezone) for item in items]
+
+    page = get_serializer(model).serialize_page(items, timezone, fieldset.names)
+    return [
+        _add_includes(item, data, fieldset.includes, timezone)
+        for item, data in zip(items, page)
+    ]
+
+
+def _add_includes(item, data, includes, timezone):
+    for name, nested in includes.items():
+        related = getattr(item, name)
+        if related is None:
+            data[name] = None
+        elif isinstance(related, list):
+            data[name] = [
+                _add_includes(r, r.as_dict(timezone), nested, timezone) for r in related
+            ]
+        else:
+            data[name] = _add_includes(
+                related, related.as_dict(timezone), nested, timezone
+            )
+    return data
+
+
+def get_listing_fingerprint(model, sort):
+    """Gets a short fingerprint for a model and sort query string, so cursors aren't reused on other listings."""
+
+    return hashlib.sha1(f"{model.__name__}:{sort}".encode()).hexdigest()[:8]
+
+
+def _encode_cursor_value(value):
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _decode_cursor_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        return date.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(plan, values):
+    """Encodes the sorting keys values of the last listed row as an opaque cursor."""
+
+    data = [plan.fingerprint, [_encode_cursor_value(v) for v in values]]
+    return base64.urlsafe_b64encode(
+        json.dumps(data, separators=(",", ":")).encode()
+    ).decode()
+
+
+def decode_cursor(plan, cursor):
+    """Decodes the sorting keys values from a cursor, or returns None if it's not valid for the listing plan."""
+
+    try:
+        fingerprint, values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if fingerprint != plan.fingerprint or len(values) != len(plan.sort_keys):
+            return None
+        return [_decode_cursor_value(v) for v in values]
+    except Exception:
+        return None
+
+
+def get_keyset_condition(sort_keys, values, nulls_first=True):
+    """
+    Gets the condition for the rows after the given sorting keys values (the keyset pagination).
+
+    Args:
+        sort_keys: The sorting columns and directions.
+        values: The sorting keys values of the last listed row.
+        nulls_first (bool): If the database sorts NULL values before the other ones (for ascending sorting).
+
+    Returns:
+        The filtering expression.
+    """
+
+    conditions = []
+    equal_conditions = []
+    for (column, direction), value in zip(sort_keys, values):
+        nulls_last = (direction == "asc") != nulls_first
+        if value is None:
+            after = column.isnot(None) if not nulls_last else false()
+            equal = column.is_(None)
+        else:
+            after = column > value if direction == "asc" else column < value
+            if nulls_last:
+                after = or_(after, column.is_(None))
+            equal = column == value
+        conditions.append(and_(*equal_conditions, after))
+        equal_conditions.append(equal)
+    return or_(*conditions)
+
+
+def get_estimated_count(query):
+    """
+    Gets an estimate of the number of rows of a query.
+
+    On PostgreSQL and MySQL, the row estimate of the query plan is used; on other databases (or if the plan
+    can't be obtained), the exact count is cached for a while.
+
+    Args:
+        query: The query whose rows will be counted.
+
+    Returns:
+        int: The estimated number of rows.
+    """
+
+    query = query.order_by(None)
+    dialect = db.engine.dialect
+    compiled = query.statement.compile(
+        dialect=dialect, compile_kwargs={"render_postcompile": True}
+    )
+
+    if dialect.name in ("postgresql", "mysql"):
+        params = compiled.params
+        if compiled.positional:
+            params = tuple(params[name] for name in compiled.positiontup)
+        try:
+            if dialect.name == "postgresql":
+                plan = (
+                    db.session.connection()
+                    .exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", params)
+                    .scalar()
+                )
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                return int(plan[0]["Plan"]["Plan Rows"])
+            # The first table of the plan drives the query, so its estimate (after filtering) is used
+            row = (
+                db.session.connection()
+                .exec_driver_sql(f"EXPLAIN {compiled}", params)
+                .mappings()
+                .first()
+            )
+            return int(row["rows"] * float(row["filtered"] or 100) / 100)
+        except Exception:
+            pass
+
+    key = (str(compiled), repr(compiled.params))
+    count = listing_counts.get(key)
+    if count is None:
+        count = query.count()
+        listing_counts.set(key, count)
+    return count
+
+
+def get_query_timezone():
+    """Gets the timezone requested for the query (through the 'timezone' parameter)."""
+
+    # Unknown timezones fall back to the application one
+    timezone = request.args.get("timezone", type=str)
+    return (timezone and get_timezone(timezone)) or tz
+
+
+def list_items(model, query=None, options=(), order_by=(), max_per_page=250):
+    """
+    Lists the items of a model, according to the request's pagination, filtering, sorting, fields, includes and
+    timezone parameters.
+
+    Args:
+        model: The model whose items will be listed.
+        query: The base query for the items (e.g. filtered by the user); if None, all items are listed.
+        options: The loader options for the query, when no fields or includes are requested; by default, no
+            relationships are loaded.
+        order_by: Sorting expressions applied before the requested sorting (like a search relevance); the
+            keyset pagination is not available with them.
+        max_per_page (int): The maximum number of items per page.
+
+    Returns:
+        The response with the items data, or the error, if any.
+    """
+
+    # Pagination
+    page = request.args.get("page", default=1, type=int)
+    limit = request.args.get("limit", default=25, type=int)
+    # Keyset pagination is used when a cursor is provided (empty for the first page)
+    cursor = request.args.get("cursor", default=None, type=str)
+    # Total count strategy
+    count = request.args.get("count", default="exact", type=str)
+    # Filtering and sorting
+    filter = request.args.get("filter", default="[]", type=str)
+    sort = request.args.get("sort", default="[]", type=str)
+    # Query timezone
+    q_tz = get_query_timezone()
+
+    if cursor is not None and len(order_by) > 0:
+        return (
+            jsonify(
+                {
+                    "data": [],
+                    "meta": {
+                        "success": False,
+                        "errors": _("Cursor pagination is not available"),
+                    },
+                }
+            ),
+            400,
+        )
+    if count not in COUNT_STRATEGIES:
+        return (
+            jsonify(
+                {
+                    "data": [],
+                    "meta": {
+                        "success": False,
+                        "errors": _("Invalid count strategy"),
+                    },
+                }
+            ),
+            400,
+        )
+
+    fieldset = get_query_fieldset(model, options)
+    if query is None:
+        query = model.query
+
+    # Trying to obtain data from models
+    try:
+        plan = get_listing_plan(model, filter, sort, q_tz)
+
+        # Applying the query cost guard, with the budget of the user's role
+        guard = guard_listing(
+            model,
+            get_base_query_cost(plan.cost, query),
+            getattr(g.get("user"), "role_id", None),
+            limit,
+        )
+        if guard.action == "reject":
+            return (
+                jsonify(
+                    {
+                        "data": [],
+                        "meta": {
+                            "success": False,
+                            "errors": _(
+                                "This listing is too expensive, try filtering by other properties"
+                            ),
+                        },
+                    }
+                ),
+                400,
+            )
+        if guard.action == "cap":
+            max_per_page = min(max_per_page, guard.limit)
+
+        with statement_timeout(guard.timeout):
+            # Searching itens by filters and sorting
+            if len(plan.joins) > 0:
+                # If joins are required
+                query = query.join(*plan.joins)
+            query = query.filter(*plan.filters)
+            # The validators of the listing are obtained from the filtered query (without loader options)
+            filtered_query = query
+            query = query.options(*fieldset.options)
+
+            if cursor is not None:
+                # The rows after the cursor are fetched along with their sorting keys values
+                if cursor != "":
+                    values = decode_cursor(plan, cursor)
+                    if values is None:
+                        return (
+                            jsonify(
+                                {
+                                    "data": [],
+                                    "meta": {
+                                        "success": False,
+                                        "errors": _("Invalid cursor"),
+                                    },
+                                }
+                            ),
+                            400,
+                        )
+                    query = query.filter(
+                        get_keyset_condition(
+                            plan.sort_keys,
+                            values,
+                            nulls_first=db.engine.dialect.name != "postgresql",
+                        )
+                    )
+                limit = max(1, min(limit, max_per_page))
+                rows = (
+                    query.add_columns(*[key[0] for key in plan.sort_keys])
+                    .order_by(*plan.keyset_order_by)
+                    .limit(limit + 1)
+                    .all()
+                )
+                # The extra row only tells if there's a next page
+                next_cursor = (
+                    encode_cursor(plan, rows[limit - 1][1:])
+                    if len(rows) > limit
+                    else None
+                )
+                data = serialize_items([r[0] for r in rows[:limit]], fieldset, q_tz)
+
+                return jsonify(
+                    {
+                        "data": data,
+                        "meta": {"success": True, "next_cursor": next_cursor},
+                    }
+                )
+
+            if count == "exact":
+                # The count query also gets the listing validators, so unchanged listings are answered (with
+                # a 304) before the page is fetched
+                total, validator = get_query_validator(filtered_query, model)
+                # Changes on the included relationships aren't tracked by the validators
+                if len(fieldset.includes) > 0:
+                    validator = None
+                if is_not_modified(validator):
+                    return not_modified(validator)
+
+                # Paginating as Flask-SQLAlchemy does, but without counting again
+                page = max(1, page)
+                limit = min(limit, max_per_page) if limit >= 0 else 20
+                items = (
+                    query.order_by(*order_by, *plan.order_by)
+                    .limit(limit)
+                    .offset((page - 1) * limit)
+                    .all()
+                )
+                data = serialize_items(items, fieldset, q_tz)
+
+                return add_validator(
+                    jsonify({"data": data, "meta": {"success": True, "count": total}}),
+                    validator,
+                )
+
+            # Without the exact count, the page is fetched with an extra row, which tells if there's a next page
+            page = max(1, page)
+            limit = max(1, min(limit, max_per_page))
+            items = (
+                query.order_by(*order_by, *plan.order_by)
+                .limit(limit + 1)
+                .offset((page - 1) * limit)
+                .all()
+            )
+            meta = {"success": True, "has_more": len(items) > limit}
+            if count == "estimate":
+                meta["count"] = get_estimated_count(query)
+            data = serialize_items(items[:limit], fieldset, q_tz)
+
+            return jsonify({"data": data, "meta": meta})
+
+    except QueryTimeout:
+        return (
+            jsonify(
+                {
+                    "data": [],
+                    "meta": {
+                        "success": False,
+                        "errors": _(
+                            "This listing took too long, try filtering by other properties"
+                        ),
+                    },
+                }
+            ),
+            400,
+        )
+
+    except FilterError as e:
+        return jsonify({"data": [], "meta": {"success": False, "errors": str(e)}}), 400
+
+    except Exception as e:
+        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
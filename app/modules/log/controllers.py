@@ -1,10 +1,7 @@
 """Controllers and blueprins/endpoints for the logs module."""
 
-import pytz
-
 from flask import Blueprint, request, jsonify, g
 from flask_babel import _
-from sqlalchemy.orm import selectinload  # This function is called within 'eval'
 
 from app import AppSession
 from app.middleware import ensure_authenticated, ensure_authorized
@@ -13,7 +10,8 @@ from app.modules.log.models import *
 from app.modules.document.models import *
 from app.modules.users.models import *
 from app.modules.commons.models import *
-from app.modules.utils import get_sort_attrs, get_join_attrs, get_filter_attrs
+from app.modules.listing import list_items, get_query_fieldset, serialize_item
+from app.modules.conditional import conditional_item
 
 # Blueprints for the model
 mod_log = Blueprint("logs", __name__, url_prefix="/logs")
@@ -24,55 +22,7 @@ mod_log = Blueprint("logs", __name__, url_prefix="/logs")
 def index_log():
     """Lists the exsiting logs."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = Log
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    # Trying to obtain data from models
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_items(Log)
 
 
 @mod_log.route("", methods=["POST"])
@@ -138,6 +88,7 @@ def create_log():
 
 @mod_log.route("/<int:id>", methods=["GET"])
 @ensure_authenticated
+@conditional_item(Log)
 def get_log_by_id(id):
     """Gets an existing log by its id."""
 
@@ -149,14 +100,10 @@ def get_log_by_id(id):
 
     with AppSession() as session:
         model = Log
-        selectinloads = eval(
-            "".join(
-                f"selectinload({r}), " for r in list(model.__mapper__.relationships)
-            )
-        )
+        fieldset = get_query_fieldset(model)
 
         # Searching item by ID
-        item = session.query(model).options(selectinloads).get(id)
+        item = session.query(model).options(*fieldset.options).get(id)
 
         # If no item is found
         if item is None:
@@ -170,10 +117,10 @@ def get_log_by_id(id):
                 404,
             )
 
-        data = item.as_dict()
+        data = serialize_item(item, fieldset)
 
         # Appending the model data, if a valid model name is set
-        if data["model_name"] in model_names.keys():
+        if fieldset.names is None and data["model_name"] in model_names.keys():
             data["model"] = (
                 session.query(model_names[data["model_name"]])
                 .get(data["model_id"])
@@ -2,25 +2,11 @@
 
 from config import tz
 from app import db
+from app.modules.serialization import SerializerMixin
 from app.modules.users.models import *
 
 
-def default_object_string(object, timezone=tz):
-    """Function to format an object (like datetime/date) to a string."""
-
-    if str(type(object)) == "<class 'datetime.datetime'>":
-        try:
-            return (
-                tz.localize(object).astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
-            )
-        except:
-            return object.astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
-    elif str(type(object)) == "<class 'datetime.date'>":
-        return object.strftime("%Y-%m-%d")
-    return object
-
-
-class Base(db.Model):
+class Base(SerializerMixin, db.Model):
     """Base application model for other database tables to inherit."""
 
     __abstract__ = True
@@ -37,6 +23,7 @@ class Base(db.Model):
 
 class Log(Base):
     __tablename__ = "log"
+    __table_args__ = (db.Index("ix_log_model_name_model_id", "model_name", "model_id"),)
 
     # Basic data
     model_name = db.Column(db.String(256), nullable=False)
@@ -45,7 +32,9 @@ class Log(Base):
 
     # Relationships and status
     model_id = db.Column(db.Integer, nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey("user.id"), nullable=False, index=True
+    )
 
     # Relationships
     # model_name = db.relationship('ModelName', lazy='select', backref='log')
@@ -59,15 +48,3 @@ class Log(Base):
 
     def __repr__(self):
         return "<Log %r>" % (self.id)
-
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-        }
-        # Add the related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-        return data
@@ -1,21 +1,24 @@
 """Controllers and blueprins/endpoints for the notifications module."""
 
 from datetime import datetime
-import pytz
 
 from flask import Blueprint, request, jsonify, g
 from flask_babel import _
 from flasgger import swag_from
-from sqlalchemy.orm import selectinload  # This function is called within 'eval'
 
 from app import AppSession
 from config import tz
-from app.middleware import ensure_authenticated, ensure_authorized
+from app.middleware import (
+    ensure_authenticated,
+    ensure_authorized,
+    coalesce_requests,
+)
 from app.modules.notification.forms import *
 from app.modules.notification.models import *
 from app.modules.users.models import *
 from app.modules.commons.models import *
-from app.modules.utils import get_sort_attrs, get_join_attrs, get_filter_attrs
+from app.modules.listing import list_items, get_query_fieldset, serialize_item
+from app.modules.conditional import conditional_item
 from app.modules.notification.utils import *
 
 # Blueprints for the model
@@ -28,114 +31,17 @@ mod_notification = Blueprint("notifications", __name__, url_prefix="/notificatio
 def index_notification():
     """Lists the existing notifications."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = Notification
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    # Trying to obtain data from models
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_items(Notification)
 
 
 @mod_notification.route("/my", methods=["GET"])
 @ensure_authenticated
+@coalesce_requests
 @swag_from("swagger/index_my_item.yml")
 def index_my_notification():
     """Lists the notifications for a specific user."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = Notification
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    # Trying to obtain data from models
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .filter_by(user_id=g.user.id)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .filter_by(user_id=g.user.id)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_items(Notification, Notification.query.filter_by(user_id=g.user.id))
 
 
 @mod_notification.route("", methods=["POST"])
@@ -196,23 +102,22 @@ def create_notification():
 @mod_notification.route("/<int:id>", methods=["GET"])
 @ensure_authenticated
 @swag_from("swagger/get_item_by_id.yml")
+@conditional_item(Notification)
 def get_notification_by_id(id):
     """Gets an existing notification by its id."""
 
     with AppSession() as session:
         model = Notification
-        selectinloads = eval(
-            "".join(
-                f"selectinload({r}), " for r in list(model.__mapper__.relationships)
-            )
-        )
+        fieldset = get_query_fieldset(model)
 
         # Searching item by ID
-        item = session.query(model).options(selectinloads).get(id)
+        item = session.query(model).options(*fieldset.options).get(id)
 
         # If item is found
         if item:
-            return jsonify({"data": item.as_dict(), "meta": {"success": True}})
+            return jsonify(
+                {"data": serialize_item(item, fieldset), "meta": {"success": True}}
+            )
 
         return (
             jsonify(
@@ -2,26 +2,12 @@
 
 from config import tz
 from app import db
+from app.modules.serialization import SerializerMixin
 from app.modules.users.models import *
 from app.modules.commons.models import *
 
 
-def default_object_string(object, timezone=tz):
-    """Function to format an object (like datetime/date) to a string."""
-
-    if str(type(object)) == "<class 'datetime.datetime'>":
-        try:
-            return (
-                tz.localize(object).astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
-            )
-        except:
-            return object.astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
-    elif str(type(object)) == "<class 'datetime.date'>":
-        return object.strftime("%Y-%m-%d")
-    return object
-
-
-class Base(db.Model):
+class Base(SerializerMixin, db.Model):
     """Base application model for other database tables to inherit."""
 
     __abstract__ = True
@@ -38,6 +24,10 @@ class Base(db.Model):
 
 class Notification(Base):
     __tablename__ = "notification"
+    # The unread notifications of an user are counted often
+    __table_args__ = (
+        db.Index("ix_notification_user_id_is_read", "user_id", "is_read"),
+    )
 
     # Basic data
     title = db.Column(db.String(128), nullable=False)
@@ -64,15 +54,3 @@ class Notification(Base):
 
     def __repr__(self):
         return "<Notification %r>" % (self.id)
-
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-        }
-        # Add the related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-        return data
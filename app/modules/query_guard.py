@@ -0,0 +1,264 @@
+"""Query cost guard for the listings, applying per role budgets to the user supplied filtering and sorting."""
+
+import time
+import logging
+from collections import namedtuple
+from contextlib import contextmanager
+
+from sqlalchemy import UniqueConstraint, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import (
+    BinaryExpression,
+    BooleanClauseList,
+    ColumnClause,
+    Grouping,
+)
+
+from config import QUERY_BUDGETS
+from app import db
+from app.modules.utils import get_filter_column, LIKE_OPERATORS
+
+# Every guard decision is logged (with the listing cost), so the budgets can be tuned
+logger = logging.getLogger(__name__)
+
+# Cost classes of the listings: 'cheap' when the filters (or the sorting, if there are no filters) can use an
+# index, 'scan' when they can't, and 'heavy' when a scan also joins other tables
+COST_CLASSES = ("cheap", "scan", "heavy")
+# Actions for each cost class: run the listing as requested, cap its page size at the budget's 'limit', run it
+# with the budget's statement 'timeout' (in milliseconds), or reject it
+GUARD_ACTIONS = ("allow", "cap", "timeout", "reject")
+
+# Operators that can use an index (patterns only when they don't start with a wildcard)
+INDEXABLE_OPERATORS = ("==", "<", "<=", ">", ">=", "in", "between", "like", "ilike")
+# The same operators on the SQL expressions of the listings base queries
+INDEXABLE_SQL_OPERATORS = (
+    operators.eq,
+    operators.lt,
+    operators.le,
+    operators.gt,
+    operators.ge,
+    operators.in_op,
+    operators.between_op,
+)
+
+# Cost of a listing plan: its class, the number of filters not using an index, of patterns starting with a
+# wildcard and of joined tables
+ListingCost = namedtuple(
+    "ListingCost", ["cost_class", "unindexed", "leading_wildcards", "joins"]
+)
+
+# Decision of the guard for a listing: the action and the page size limit or statement timeout to apply
+GuardDecision = namedtuple("GuardDecision", ["action", "limit", "timeout", "cost"])
+
+
+class QueryTimeout(Exception):
+    """Raised when a query is interrupted by its statement timeout."""
+
+
+def is_indexed(column):
+    """Checks if a column is the first one of its table primary key, or of any of its indexes or unique constraints."""
+
+    column = column.expression
+    table, name = column.table, column.name
+    indexes = list(table.indexes) + [
+        c for c in table.constraints if isinstance(c, UniqueConstraint)
+    ]
+    leading_columns = {list(i.columns)[0].name for i in indexes if len(i.columns) > 0}
+    return (
+        list(table.primary_key.columns)[0].name == name
+        or table.c[name].unique is True
+        or name in leading_columns
+    )
+
+
+def _has_leading_wildcard(f):
+    value = "" if f.get("value") is None else str(f.get("value"))
+    return f.get("anyMatch", True) or value.startswith(("%", "_"))
+
+
+def get_listing_cost(model, filter, sort_keys, joins):
+    """
+    Classifies a listing by its user supplied filtering and sorting.
+
+    The base query of the listing (like the filtering by the user) isn't taken into account here, so the cost is
+    an upper bound; it's lowered by 'get_base_query_cost' for each query.
+
+    Args:
+        model: The model being listed.
+        filter: The parsed filtering objects.
+        sort_keys: The sorting columns and directions.
+        joins: The tables joined by the filtering and sorting.
+
+    Returns:
+        ListingCost: The listing cost.
+    """
+
+    unindexed = 0
+    leading_wildcards = 0
+    indexed_and_filters = 0
+    or_filters = []
+    for f in filter:
+        operator = str(f.get("operator", "")).lower()
+        wildcard = operator in LIKE_OPERATORS and _has_leading_wildcard(f)
+        indexed = (
+            operator in INDEXABLE_OPERATORS
+            and not wildcard
+            and is_indexed(get_filter_column(model, f["property"]))
+        )
+        unindexed += 0 if indexed else 1
+        leading_wildcards += 1 if wildcard else 0
+        if str(f.get("joinOn", "and")).lower() == "or":
+            or_filters.append(indexed)
+        elif indexed:
+            indexed_and_filters += 1
+
+    if len(filter) == 0:
+        # Without filters, the rows are read in the order of the first sorting column
+        uses_index = is_indexed(sort_keys[0][0])
+    else:
+        # A single indexed filter narrows the rows, unless it's one of 'or' filters which can't all use an index
+        uses_index = indexed_and_filters > 0 or (
+            len(or_filters) > 0 and all(or_filters)
+        )
+
+    if uses_index:
+        cost_class = "cheap"
+    elif len(joins) > 0:
+        cost_class = "heavy"
+    else:
+        cost_class = "scan"
+    return ListingCost(cost_class, unindexed, leading_wildcards, len(joins))
+
+
+def _is_indexed_predicate(clause):
+    # Parenthesized expressions are checked by their contents
+    while isinstance(clause, Grouping):
+        clause = clause.element
+    if isinstance(clause, BooleanClauseList):
+        # An 'and' narrows the rows if any of its predicates does, an 'or' only if all of them do
+        check = all if clause.operator is operators.or_ else any
+        return check(_is_indexed_predicate(c) for c in clause.clauses)
+    return (
+        isinstance(clause, BinaryExpression)
+        and clause.operator in INDEXABLE_SQL_OPERATORS
+        and isinstance(clause.left, ColumnClause)
+        and clause.left.table is not None
+        and is_indexed(clause.left)
+    )
+
+
+def get_base_query_cost(cost, query):
+    """
+    Gets the cost of a listing given its base query: listings whose base query narrows the rows through an index
+    (like the filtering of the documents by their owner) are cheap, whatever their filtering and sorting are.
+
+    Args:
+        cost (ListingCost): The cost of the listing filtering and sorting.
+        query: The base query of the listing.
+
+    Returns:
+        ListingCost: The listing cost.
+    """
+
+    if cost.cost_class == "cheap" or query.whereclause is None:
+        return cost
+    if _is_indexed_predicate(query.whereclause):
+        return cost._replace(cost_class="cheap")
+    return cost
+
+
+def get_budget(role_id):
+    """Gets the budget of a role (or the default budget, if the role has none)."""
+
+    return QUERY_BUDGETS.get(str(role_id), QUERY_BUDGETS["default"])
+
+
+def guard_listing(model, cost, role_id, limit):
+    """
+    Decides how a listing is run, given its cost and the budget of the user's role, logging the decision.
+
+    Args:
+        model: The model being listed.
+        cost (ListingCost): The listing cost.
+        role_id: The user's role ID (None for anonymous requests).
+        limit (int): The requested page size.
+
+    Returns:
+        GuardDecision: The guard decision.
+    """
+
+    budget = get_budget(role_id)
+    action = budget.get(cost.cost_class, "allow")
+    decision = GuardDecision(
+        action=action,
+        limit=min(limit, budget.get("limit", limit)) if action == "cap" else limit,
+        timeout=budget.get("timeout") if action == "timeout" else None,
+        cost=cost,
+    )
+    logger.log(
+        logging.INFO if action == "allow" else logging.WARNING,
+        "Query guard: %s %s listing (%s unindexed filters, %s leading wildcards, %s joins) for role %s: "
+        "%s (limit %s, timeout %s)",
+        cost.cost_class,
+        model.__name__,
+        cost.unindexed,
+        cost.leading_wildcards,
+        cost.joins,
+        role_id,
+        action,
+        decision.limit,
+        decision.timeout,
+    )
+    return decision
+
+
+@contextmanager
+def statement_timeout(timeout):
+    """
+    Interrupts the queries run by the session (within the context) that take longer than a timeout.
+
+    Args:
+        timeout (int): The timeout in milliseconds; if None, the queries aren't interrupted.
+
+    Raises:
+        QueryTimeout: If a query was interrupted.
+    """
+
+    if timeout is None:
+        yield
+        return
+
+    dialect = db.engine.dialect.name
+    connection = db.session.connection()
+    started_at = time.monotonic()
+
+    if dialect == "postgresql":
+        connection.execute(text(f"SET LOCAL statement_timeout = {int(timeout)}"))
+    elif dialect == "mysql":
+        connection.execute(text(f"SET SESSION max_execution_time = {int(timeout)}"))
+    elif dialect == "sqlite":
+        # SQLite calls the handler every some virtual machine instructions, and a true value interrupts the query
+        deadline = started_at + timeout / 1000
+        connection.connection.set_progress_handler(
+            lambda: time.monotonic() > deadline, 1000
+        )
+
+    failed = False
+    try:
+        yield
+    except DBAPIError as e:
+        failed = True
+        if time.monotonic() - started_at >= timeout / 1000:
+            raise QueryTimeout(str(e.orig))
+        raise
+    finally:
+        if dialect == "postgresql" and not failed:
+            connection.execute(text("SET LOCAL statement_timeout = DEFAULT"))
+        elif dialect == "mysql":
+            connection.execute(text("SET SESSION max_execution_time = DEFAULT"))
+        elif dialect == "sqlite":
+            connection.connection.set_progress_handler(None, 0)
+        # The transaction of a failed query can't be used anymore (the PostgreSQL timeout ends with it)
+        if failed:
+            db.session.rollback()
@@ -0,0 +1,440 @@
+"""In-process cache of the reference data tables (UFs, cities and document categories), listed from memory."""
+
+import re
+import time
+import hashlib
+import operator
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+from threading import Lock
+
+import pytz
+from flask import request, jsonify
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from config import REFERENCE_DATA_CHECK_INTERVAL
+from app import AppSession, db
+from app.services.cache import caches
+from app.modules.commons.models import UF, City, CacheVersion
+from app.modules.document.models import DocumentCategory
+from app.modules.utils import (
+    get_filter_column,
+    get_filter_value,
+    FilterError,
+    LIKE_OPERATORS,
+)
+from app.modules.listing import (
+    list_items,
+    get_listing_plan,
+    get_query_fieldset,
+    get_query_timezone,
+    parse_filter,
+    parse_sort,
+    serialize_items,
+    COUNT_STRATEGIES,
+)
+from app.modules.conditional import (
+    Validator,
+    get_database_timezone,
+    get_request_fingerprint,
+    is_not_modified,
+    not_modified,
+    add_validator,
+)
+
+
+class ReferenceTable(object):
+    """
+    Per-process copy of all the rows of a reference data table, stamped with the table version.
+
+    The version is bumped on the database along with every change made by the controllers, so the workers only
+    have to check it (a single row query, at most once per interval) to know when their copies must be reloaded.
+    """
+
+    def __init__(self, model, check_interval=5):
+        self.model = model
+        self.name = model.__tablename__
+        self.check_interval = check_interval
+        self.hits = 0
+        self.reloads = 0
+        # The version, the rows (sorted by their IDs) and their last update, replaced at once
+        self._state = None
+        self._checked_at = 0
+        self._lock = Lock()
+        caches[f"reference_{self.name}"] = self
+
+    def get_state(self):
+        """Gets the table version, rows and last update, reloading the rows if the version changed."""
+
+        if (
+            self._state is None
+            or time.monotonic() - self._checked_at > self.check_interval
+        ):
+            with self._lock:
+                # Another thread might have checked it while we were waiting
+                if (
+                    self._state is None
+                    or time.monotonic() - self._checked_at > self.check_interval
+                ):
+                    self._check()
+        self.hits += 1
+        return self._state
+
+    def _check(self):
+        with AppSession() as session:
+            version = (
+                session.query(CacheVersion.version).filter_by(name=self.name).scalar()
+            ) or 0
+            if self._state is None or self._state[0] != version:
+                rows = session.query(self.model).order_by(self.model.id).all()
+                last_modified = max(
+                    (r.updated_at for r in rows if r.updated_at is not None),
+                    default=None,
+                )
+                self._state = (version, rows, last_modified)
+                self.reloads += 1
+        self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        """Makes the next access check the table version right away (e.g. after this worker changed it)."""
+
+        self._checked_at = 0
+
+    def clear(self):
+        """Discards the cached rows, so they'll be loaded on the next access."""
+
+        with self._lock:
+            self._state = None
+
+    def stats(self):
+        """Gets the cache usage statistics."""
+
+        state = self._state
+        return {
+            "size": len(state[1]) if state is not None else 0,
+            "version": state[0] if state is not None else None,
+            "check_interval": self.check_interval,
+            "hits": self.hits,
+            "reloads": self.reloads,
+        }
+
+
+# Reference data tables, by their models
+reference_tables = {
+    model: ReferenceTable(model, check_interval=REFERENCE_DATA_CHECK_INTERVAL)
+    for model in (UF, City, DocumentCategory)
+}
+
+
+def bump_reference_version(session, model):
+    """
+    Bumps the version of a reference data table, within the transaction changing it.
+
+    Once the transaction is committed, this worker checks the new version right away; the other ones, on their
+    next check. The version rows are created along with their table (see the 'cache_version' migration), so
+    concurrent changes only update them.
+    """
+
+    session.query(CacheVersion).filter_by(name=model.__tablename__).update(
+        {CacheVersion.version: CacheVersion.version + 1}, synchronize_session=False
+    )
+    session.info.setdefault("reference_models", set()).add(model)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_reference_tables(session):
+    for model in session.info.pop("reference_models", ()):
+        reference_tables[model].invalidate()
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_reference_models(session, transaction):
+    # Versions bumped by transactions which were rolled back (or closed) don't invalidate anything
+    if transaction.parent is None:
+        session.info.pop("reference_models", None)
+
+
+@lru_cache(maxsize=256)
+def get_like_matcher(pattern, case_sensitive, ascii_only=False):
+    """Gets the function matching strings against a SQL 'LIKE' pattern (ignoring the case only of ASCII letters, if set)."""
+
+    regex = "".join(
+        ".*" if c == "%" else "." if c == "_" else re.escape(c) for c in pattern
+    )
+    flags = re.DOTALL
+    if not case_sensitive:
+        flags |= re.I | re.ASCII if ascii_only else re.I
+    return re.compile(regex, flags).fullmatch
+
+
+@lru_cache(maxsize=65536)
+def fold_string(value):
+    """Gets the case and accent insensitive key of a string (like 'Goiás' and 'GOIAS')."""
+
+    decomposed = unicodedata.normalize("NFKD", value.casefold())
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+# How a database compares the strings (with its default collation): the key they are compared and sorted by (or
+# None, if they are compared as they are), and if their 'LIKE' is case sensitive or only ignores the case of ASCII
+# letters (on the keys)
+StringCollation = namedtuple(
+    "StringCollation", ["key", "like_case_sensitive", "like_ascii_only"]
+)
+STRING_COLLATIONS = {
+    # Binary comparisons, and 'LIKE' (and 'lower', for 'ILIKE') only changing the case of ASCII letters
+    "sqlite": StringCollation(
+        key=None, like_case_sensitive=False, like_ascii_only=True
+    ),
+    # Case and accent insensitive comparisons (utf8mb4_0900_ai_ci), for 'LIKE' as well
+    "mysql": StringCollation(
+        key=fold_string, like_case_sensitive=True, like_ascii_only=False
+    ),
+}
+
+
+def get_string_collation():
+    """
+    Gets how the database compares the strings, or None if it can't be reproduced on the cached rows (like the
+    locale dependent collations of PostgreSQL), so the listings filtering or sorting strings are run on it.
+    """
+
+    return STRING_COLLATIONS.get(db.engine.dialect.name)
+
+
+def is_string_column(column):
+    """Checks if the values of a column are strings."""
+
+    try:
+        return column.type.python_type is str
+    except NotImplementedError:
+        return False
+
+
+def _compare(compare):
+    def test(value, operand):
+        # Comparisons with NULL values are never true
+        if value is None or operand is None:
+            return False
+        try:
+            return compare(value, operand)
+        except TypeError:
+            return False
+
+    return test
+
+
+def _like(negate=False):
+    # Patterns are given as their matchers (see 'get_like_matcher')
+    def test(value, matcher):
+        if value is None:
+            return False
+        return (
+            (matcher(str(value)) is None)
+            if negate
+            else (matcher(str(value)) is not None)
+        )
+
+    return test
+
+
+# Filtering operators evaluated on the cached rows (and on the collation keys, for strings), with the same
+# results as the database ones
+ROW_OPERATORS = {
+    "==": lambda v, o: v is None if o is None else v == o,
+    "!=": lambda v, o: v is not None if o is None else v is not None and v != o,
+    "<": _compare(operator.lt),
+    "<=": _compare(operator.le),
+    ">": _compare(operator.gt),
+    ">=": _compare(operator.ge),
+    "like": _like(),
+    "ilike": _like(),
+    "notlike": _like(negate=True),
+    "notilike": _like(negate=True),
+    "in": lambda v, o: v is not None and v in o,
+    "not_in": lambda v, o: v is not None and v not in o,
+    "between": lambda v, o: v is not None and o[0] <= v <= o[1],
+}
+
+
+def _collate(key, value):
+    # Operands of the 'in' and 'between' operators are lists
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return [_collate(key, v) for v in value]
+    return key(value)
+
+
+def get_row_filter(model, filter, timezone, collation=STRING_COLLATIONS["sqlite"]):
+    """
+    Gets the function testing if a cached row matches the parsed filtering objects (which must be valid), with
+    the strings compared as the database collation does.
+
+    Raises:
+        FilterError: If a filter has an invalid value.
+    """
+
+    and_tests = []
+    or_tests = []
+    for f in filter:
+        operator_name = str(f.get("operator", "")).lower()
+        column = get_filter_column(model, f["property"])
+        value = get_filter_value(column, operator_name, f, timezone)
+        key = collation.key if is_string_column(column) else None
+        if operator_name in LIKE_OPERATORS:
+            value = get_like_matcher(
+                value if key is None else key(value),
+                collation.like_case_sensitive,
+                collation.like_ascii_only,
+            )
+        elif key is not None:
+            value = _collate(key, value)
+        test = (column.key, ROW_OPERATORS[operator_name], value, key)
+        if str(f.get("joinOn", "and")).lower() == "or":
+            or_tests.append(test)
+        else:
+            and_tests.append(test)
+
+    def passes(row, name, test, value, key):
+        row_value = getattr(row, name)
+        return test(
+            row_value if key is None or row_value is None else key(row_value), value
+        )
+
+    def matches(row):
+        return all(passes(row, *t) for t in and_tests) and (
+            len(or_tests) == 0 or any(passes(row, *t) for t in or_tests)
+        )
+
+    return matches
+
+
+def sort_rows(rows, sort_keys, nulls_first=True, collation=STRING_COLLATIONS["sqlite"]):
+    """
+    Sorts the cached rows by the sorting columns and directions, as the database does.
+
+    Args:
+        rows: The rows to be sorted.
+        sort_keys: The sorting columns and directions.
+        nulls_first (bool): If the database sorts NULL values before the other ones (for ascending sorting).
+        collation (StringCollation): How the database compares the strings.
+
+    Returns:
+        list: The sorted rows.
+    """
+
+    null_key, value_key = ((0,), 1) if nulls_first else ((1,), 0)
+    # Sorting is stable, so the rows are sorted by each key, from the last one to the first one
+    for column, direction in reversed(sort_keys):
+        key = collation.key if is_string_column(column) else None
+        rows = sorted(
+            rows,
+            key=lambda r: (
+                null_key
+                if getattr(r, column.key) is None
+                else (
+                    value_key,
+                    (
+                        getattr(r, column.key)
+                        if key is None
+                        else key(getattr(r, column.key))
+                    ),
+                )
+            ),
+            reverse=direction == "desc",
+        )
+    return rows
+
+
+def list_reference_items(model, max_per_page=250):
+    """
+    Lists the items of a reference data table from its in-process copy, with the same parameters and responses
+    as 'list_items'.
+
+    Listings the copy can't answer (with relationships, or using the keyset pagination) are run on the database.
+
+    Args:
+        model: The reference data model whose items will be listed.
+        max_per_page (int): The maximum number of items per page.
+
+    Returns:
+        The response with the items data, or the error, if any.
+    """
+
+    # Pagination
+    page = request.args.get("page", default=1, type=int)
+    limit = request.args.get("limit", default=25, type=int)
+    count = request.args.get("count", default="exact", type=str)
+    # Filtering and sorting
+    filter = request.args.get("filter", default="[]", type=str)
+    sort = request.args.get("sort", default="[]", type=str)
+    # Query timezone
+    q_tz = get_query_timezone()
+
+    if request.args.get("cursor") is not None or count not in COUNT_STRATEGIES:
+        return list_items(model, max_per_page=max_per_page)
+    fieldset = get_query_fieldset(model, ())
+    if len(fieldset.includes) > 0:
+        return list_items(model, max_per_page=max_per_page)
+
+    try:
+        # Relationships properties require other tables
+        parsed_filter = parse_filter(filter)
+        if any("." in s["property"] for s in parsed_filter + parse_sort(sort)):
+            return list_items(model, max_per_page=max_per_page)
+        # The plan validates the filtering and sorting
+        plan = get_listing_plan(model, filter, sort, q_tz)
+        # Strings are only filtered and sorted here if the database collation can be reproduced
+        collation = get_string_collation()
+        if collation is None and (
+            any(
+                is_string_column(get_filter_column(model, f["property"]))
+                for f in parsed_filter
+            )
+            or any(is_string_column(c) for c, _ in plan.sort_keys)
+        ):
+            return list_items(model, max_per_page=max_per_page)
+        matches = get_row_filter(model, parsed_filter, q_tz, collation)
+    except FilterError as e:
+        return jsonify({"data": [], "meta": {"success": False, "errors": str(e)}}), 400
+    except Exception:
+        # Other errors are answered as the database listings do
+        return list_items(model, max_per_page=max_per_page)
+
+    version, rows, last_modified = reference_tables[model].get_state()
+    # The version changes along with the rows, so it makes an exact validator
+    validator = Validator(
+        etag=hashlib.sha1(
+            f"{get_request_fingerprint()}:{model.__tablename__}:{version}".encode()
+        ).hexdigest()[:32],
+        last_modified=(
+            get_database_timezone().localize(last_modified).astimezone(pytz.utc)
+            if last_modified is not None
+            else None
+        ),
+    )
+    if is_not_modified(validator):
+        return not_modified(validator)
+
+    rows = sort_rows(
+        [r for r in rows if matches(r)],
+        plan.sort_keys,
+        nulls_first=db.engine.dialect.name != "postgresql",
+        collation=collation,
+    )
+
+    page = max(1, page)
+    if count == "exact":
+        limit = min(limit, max_per_page) if limit >= 0 else 20
+        meta = {"success": True, "count": len(rows)}
+    else:
+        limit = max(1, min(limit, max_per_page))
+        meta = {"success": True, "has_more": len(rows) > page * limit}
+        if count == "estimate":
+            meta["count"] = len(rows)
+    data = serialize_items(rows[(page - 1) * limit : page * limit], fieldset, q_tz)
+
+    return add_validator(jsonify({"data": data, "meta": meta}), validator)
@@ -0,0 +1,178 @@
+"""Cache of the serialized listing pages, tagged by the tables they read and invalidated by the writes on them."""
+
+import json
+from functools import wraps
+
+from flask import request, g, has_request_context, make_response
+from sqlalchemy import Table, event
+from sqlalchemy.orm import Session, object_mapper
+from sqlalchemy.sql import visitors
+
+from config import LISTING_RESULT_CACHE_SIZE, LISTING_RESULT_CACHE_TTL
+from app.services.cache import TaggedCache
+from app.modules.conditional import (
+    Validator,
+    is_not_modified,
+    not_modified,
+    add_validator,
+)
+
+# Listing results caches, by the opted-in models tables (so their hit rates can be compared)
+result_caches = {}
+
+# Scopes of the cached listings: the ones depending on the user (like its own documents) are cached for each
+# user, the other ones for each role (whose budget may cap the page size)
+RESULT_SCOPES = ("user", "role")
+
+
+def get_result_cache(model):
+    """Gets the listing results cache of a model, creating it on the first use."""
+
+    cache = result_caches.get(model.__tablename__)
+    if cache is None:
+        cache = result_caches.setdefault(
+            model.__tablename__,
+            TaggedCache(
+                f"listing_results_{model.__tablename__}",
+                max_size=LISTING_RESULT_CACHE_SIZE,
+                ttl=LISTING_RESULT_CACHE_TTL,
+            ),
+        )
+    return cache
+
+
+def _normalize_json(value):
+    try:
+        return json.dumps(json.loads(value), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        return value
+
+
+def get_result_key(scope):
+    """
+    Gets the key of the request's listing: its endpoint, scope and parameters (with the filtering and sorting
+    normalized, so equivalent listings share their entries).
+    """
+
+    user = g.get("user")
+    principal = getattr(user, "id" if scope == "user" else "role_id", None)
+    args = tuple(
+        sorted(
+            (k, _normalize_json(v) if k in ("filter", "sort") else v)
+            for k, v in request.args.items(multi=True)
+        )
+    )
+    return (request.endpoint, scope, principal, args)
+
+
+def get_statement_tables(statement):
+    """Gets the names of the tables read (or written) by a statement, including its joins and subqueries."""
+
+    return {e.name for e in visitors.iterate(statement) if isinstance(e, Table)}
+
+
+def _get_instance_tables(instance):
+    mapper = object_mapper(instance)
+    tables = {t.name for t in mapper.tables}
+    # Changes on many-to-many collections are written to their association tables
+    tables.update(
+        r.secondary.name
+        for r in mapper.relationships
+        if r.secondary is not None and isinstance(r.secondary, Table)
+    )
+    return tables
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _track_statement_tables(orm_execute_state):
+    statement = orm_execute_state.statement
+    if orm_execute_state.is_select:
+        # Collecting the tables read by a cached listing
+        if has_request_context() and g.get("result_tables") is not None:
+            g.result_tables.update(get_statement_tables(statement))
+    else:
+        # Bulk updates and deletes skip the flush, so their tables are tracked here
+        orm_execute_state.session.info.setdefault("result_tables", set()).update(
+            get_statement_tables(statement)
+        )
+
+
+@event.listens_for(Session, "after_flush")
+def _track_flushed_tables(session, flush_context):
+    tables = session.info.setdefault("result_tables", set())
+    for instance in (*session.new, *session.dirty, *session.deleted):
+        tables.update(_get_instance_tables(instance))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_results(session):
+    tables = session.info.pop("result_tables", None)
+    if tables:
+        for cache in list(result_caches.values()):
+            cache.invalidate(tables)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_tracked_tables(session, transaction):
+    # Tables written by transactions which were rolled back (or closed) don't invalidate anything
+    if transaction.parent is None:
+        session.info.pop("result_tables", None)
+
+
+def _get_cached_response(entry):
+    data, etag, last_modified = entry
+    validator = Validator(etag, last_modified) if etag is not None else None
+    if is_not_modified(validator):
+        return not_modified(validator)
+    response = make_response(data)
+    response.mimetype = "application/json"
+    return add_validator(response, validator)
+
+
+def cached_listing(model, scope="role"):
+    """
+    Decorator to cache the serialized pages of a listing route (opting its model in), by the endpoint, the user
+    or role scope and the listing parameters.
+
+    The entries are tagged with the tables read while listing (the model table, plus the joined, filtered and
+    included ones), and invalidated when a transaction writing on any of them is committed.
+    The reference data listings aren't cached here, as they are served from their own copies (kept up to date
+    with the other workers by their versions, see 'reference_data').
+
+    Args:
+        model: The listed model.
+        scope (str): 'user' if the listing depends on the user (like its own items), or 'role' otherwise.
+    """
+
+    if scope not in RESULT_SCOPES:
+        raise ValueError(f"Invalid listing scope: {scope}")
+    cache = get_result_cache(model)
+
+    def decorator(view):
+        @wraps(view)
+        def cached_function(*args, **kwargs):
+            key = get_result_key(scope)
+            entry = cache.get(key)
+            if entry is not None:
+                return _get_cached_response(entry)
+
+            generation = cache.generation
+            g.result_tables = {model.__tablename__}
+            try:
+                response = make_response(view(*args, **kwargs))
+            finally:
+                tables = g.pop("result_tables")
+
+            # Results read while their tables were changed might be outdated already, so they aren't stored
+            if response.status_code == 200 and response.is_json:
+                entry = (
+                    response.get_data(),
+                    response.get_etag()[0],
+                    response.last_modified,
+                )
+                cache.set(key, entry, tags=tables, since=generation)
+            return response
+
+        return cached_function
+
+    return decorator
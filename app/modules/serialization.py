@@ -0,0 +1,215 @@
+"""Serializers of the models instances (as dicts), compiled once for each model from its mapper."""
+
+from collections import namedtuple
+from datetime import date, datetime
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import configure_mappers
+from sqlalchemy.orm.attributes import instance_dict
+
+from config import tz
+from app.modules.timezones import get_datetime_formatter
+
+# Marks the attributes which aren't loaded on an instance
+_MISSING = object()
+
+# Compiled serialization of a model for a set of fields: the columns sent as they are, the columns with their
+# formatters, the datetime columns, the computed fields (with the methods computing them), the to-one relationships
+# and the to-many relationships whose IDs are sent
+SerializerPlan = namedtuple(
+    "SerializerPlan",
+    ["plain", "formatted", "datetimes", "computed", "to_one", "to_many_ids"],
+)
+
+
+def format_datetime(value, timezone=tz):
+    """Formats a datetime (naive ones are on the application timezone) as an ISO 8601 string, on a timezone."""
+
+    return get_datetime_formatter(timezone)(value)
+
+
+def format_date(value, timezone=tz):
+    """Formats a date as an ISO 8601 string."""
+
+    return value.strftime("%Y-%m-%d")
+
+
+def default_object_string(object, timezone=tz):
+    """Function to format an object (like datetime/date) to a string."""
+
+    # Datetimes are dates as well, so the exact types are compared
+    if type(object) is datetime:
+        return format_datetime(object, timezone)
+    elif type(object) is date:
+        return format_date(object, timezone)
+    return object
+
+
+def get_column_formatter(column):
+    """Gets the function formatting the values of a column, given its type (or None, if they are sent as they are)."""
+
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return default_object_string
+    if python_type is datetime:
+        return format_datetime
+    if python_type is date:
+        return format_date
+    return None
+
+
+class ModelSerializer(object):
+    """
+    Serializer of a model instances, which knows its columns formatters and relationships up front.
+
+    Models can customize their serialization through the '__serializer_args__' attribute, with the columns to
+    'exclude', the 'computed' fields (by the names of the methods computing them, replacing the columns with the
+    same names) and if the IDs of the loaded to-many relationships are sent ('collection_ids').
+    """
+
+    def __init__(self, model):
+        configure_mappers()
+        mapper = inspect(model)
+        args = getattr(model, "__serializer_args__", {})
+        exclude = set(args.get("exclude", ()))
+        self.computed = dict(args.get("computed", {}))
+        self.columns = {
+            c.key: get_column_formatter(c.columns[0])
+            for c in mapper.column_attrs
+            if c.key not in exclude and c.key not in self.computed
+        }
+        self.to_one = tuple(r.key for r in mapper.relationships if not r.uselist)
+        self.to_many = tuple(r.key for r in mapper.relationships if r.uselist)
+        self.collection_ids = args.get("collection_ids", False)
+        self._plans = {}
+
+    def get_plan(self, fields=None):
+        """Gets the serialization plan for a set of fields (None for all of them)."""
+
+        plan = self._plans.get(fields)
+        if plan is None:
+            selected = (lambda name: True) if fields is None else fields.__contains__
+            plan = SerializerPlan(
+                plain=tuple(
+                    k for k, f in self.columns.items() if f is None and selected(k)
+                ),
+                formatted=tuple(
+                    (k, f)
+                    for k, f in self.columns.items()
+                    if f is not None and f is not format_datetime and selected(k)
+                ),
+                datetimes=tuple(
+                    k
+                    for k, f in self.columns.items()
+                    if f is format_datetime and selected(k)
+                ),
+                computed=tuple((k, m) for k, m in self.computed.items() if selected(k)),
+                to_one=tuple(k for k in self.to_one if selected(k)),
+                to_many_ids=(
+                    tuple(k for k in self.to_many if selected(k))
+                    if self.collection_ids
+                    else ()
+                ),
+            )
+            self._plans[fields] = plan
+        return plan
+
+    def serialize(self, instance, timezone=tz, fields=None):
+        """
+        Gets the data of an instance as dict, with its loaded to-one relationships (and the IDs of the to-many
+        ones, if the model sends them).
+
+        Args:
+            instance: The instance to be serialized.
+            timezone: The timezone of the datetimes.
+            fields: The names of the columns and relationships to be serialized; if None, all of them are.
+
+        Returns:
+            dict: The instance data.
+        """
+
+        plan = self.get_plan(None if fields is None else frozenset(fields))
+        return self._serialize(
+            instance, plan, timezone, get_datetime_formatter(timezone)
+        )
+
+    def serialize_page(self, instances, timezone=tz, fields=None):
+        """
+        Gets the data of many instances (like the ones of a page) as dicts, as 'serialize' does, formatting the
+        datetimes of all of them at once.
+
+        Args:
+            instances: The instances to be serialized.
+            timezone: The timezone of the datetimes.
+            fields: The names of the columns and relationships to be serialized; if None, all of them are.
+
+        Returns:
+            list: The instances data.
+        """
+
+        plan = self.get_plan(None if fields is None else frozenset(fields))
+        # Datetimes are collected as they are, and formatted together afterwards
+        page = [self._serialize(i, plan, timezone, None) for i in instances]
+        values = [d[k] for d in page for k in plan.datetimes if d[k] is not None]
+        if values:
+            formatted = iter(get_datetime_formatter(timezone).format_many(values))
+            for data in page:
+                for key in plan.datetimes:
+                    if data[key] is not None:
+                        data[key] = next(formatted)
+        return page
+
+    def _serialize(self, instance, plan, timezone, datetime_formatter):
+        # Loaded attributes are read directly, the other ones (like expired columns) are loaded as usual
+        values = instance_dict(instance)
+
+        data = {}
+        for key in plan.plain:
+            value = values.get(key, _MISSING)
+            data[key] = getattr(instance, key) if value is _MISSING else value
+        for key, formatter in plan.formatted:
+            value = values.get(key, _MISSING)
+            if value is _MISSING:
+                value = getattr(instance, key)
+            data[key] = None if value is None else formatter(value, timezone)
+        for key in plan.datetimes:
+            value = values.get(key, _MISSING)
+            if value is _MISSING:
+                value = getattr(instance, key)
+            if datetime_formatter is not None and value is not None:
+                value = datetime_formatter(value)
+            data[key] = value
+        for key, method in plan.computed:
+            data[key] = getattr(instance, method)()
+        # Relationships are only sent if they were loaded (not loading them here)
+        for key in plan.to_one:
+            related = values.get(key)
+            if related is not None:
+                data[key] = related.as_dict(timezone)
+        for key in plan.to_many_ids:
+            related = values.get(key)
+            if related is not None:
+                data[f"{key}_ids"] = [r.id for r in related]
+        return data
+
+
+# Serializers by model, compiled on their first use (once the mappers can be configured)
+serializers = {}
+
+
+def get_serializer(model):
+    """Gets the serializer of a model, compiling it on the first use."""
+
+    serializer = serializers.get(model)
+    if serializer is None:
+        serializer = serializers[model] = ModelSerializer(model)
+    return serializer
+
+
+class SerializerMixin(object):
+    """Mixin for the models to be serialized by their compiled serializers."""
+
+    # Returning data as dict
+    def as_dict(self, timezone=tz, fields=None):
+        return get_serializer(type(self)).serialize(self, timezone, fields)
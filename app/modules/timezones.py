@@ -0,0 +1,124 @@
+"""Timezones resolution, and fast formatting of the datetimes on them (for the serialization)."""
+
+from bisect import bisect_right
+from datetime import datetime
+from functools import lru_cache
+
+import pytz
+
+from config import tz
+
+
+@lru_cache(maxsize=512)
+def get_timezone(name):
+    """Gets a timezone by its name (like 'America/Sao_Paulo'), or None if there's no such timezone."""
+
+    try:
+        return pytz.timezone(name)
+    except Exception:
+        return None
+
+
+def format_offset(offset):
+    """Formats a UTC offset as the '%z' directive does (like '-0300')."""
+
+    seconds = int(offset.total_seconds())
+    sign = "-" if seconds < 0 else "+"
+    hours, seconds = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{sign}{hours:02d}{minutes:02d}" + (f"{seconds:02d}" if seconds else "")
+
+
+class TransitionWindows(object):
+    """
+    Transition windows of a timezone: the periods between the changes of its UTC offset, with their offsets (and
+    their formatted suffixes) computed once.
+
+    The windows of the pytz timezones are read from their transitions tables; other timezones have a fixed offset.
+    """
+
+    def __init__(self, timezone):
+        transitions = getattr(timezone, "_utc_transition_times", None)
+        if transitions:
+            # The UTC start of each window (the first one starts at the minimum datetime)
+            self.starts = list(transitions)
+            self.offsets = [info[0] for info in timezone._transition_info]
+        else:
+            self.starts = [datetime.min]
+            self.offsets = [timezone.utcoffset(datetime(2000, 1, 1))]
+        self.suffixes = [format_offset(o) for o in self.offsets]
+
+        # The windows on local time, which overlap when the clocks go back and have gaps when they go forward
+        last = len(self.starts) - 1
+        self.local_starts = [datetime.min] + [
+            s + o for s, o in zip(self.starts[1:], self.offsets[1:])
+        ]
+        self.local_ends = [
+            s + o for s, o in zip(self.starts[1:], self.offsets[:last])
+        ] + [datetime.max]
+
+    def find(self, value):
+        """Finds the window of a naive UTC datetime."""
+
+        return max(bisect_right(self.starts, value) - 1, 0)
+
+    def find_local(self, value):
+        """Finds the window of a naive local datetime, or None if it's ambiguous or doesn't exist."""
+
+        i = bisect_right(self.local_starts, value) - 1
+        if value >= self.local_ends[i] or (i > 0 and value < self.local_ends[i - 1]):
+            return None
+        return i
+
+
+@lru_cache(maxsize=512)
+def get_transition_windows(timezone):
+    """Gets the transition windows of a timezone, computing them on the first use."""
+
+    return TransitionWindows(timezone)
+
+
+class DatetimeFormatter(object):
+    """
+    Formats datetimes on a timezone as ISO 8601 strings (like '2021-01-02T00:04:05-0300'), with the UTC offsets of
+    the timezone windows instead of converting each datetime through the timezone.
+
+    Naive datetimes are on the source timezone (the application one, by default); the ones which are ambiguous or
+    don't exist there (when the clocks change) are converted as pytz does.
+    """
+
+    def __init__(self, timezone, source=tz):
+        self.timezone = timezone
+        self.source = source
+        self.windows = get_transition_windows(timezone)
+        self.source_windows = get_transition_windows(source)
+
+    def __call__(self, value):
+        if value.tzinfo is None:
+            i = self.source_windows.find_local(value)
+            if i is None:
+                value = self.source.localize(value)
+            else:
+                value = value - self.source_windows.offsets[i]
+        if value.tzinfo is not None:
+            value = value.astimezone(pytz.utc).replace(tzinfo=None)
+
+        i = self.windows.find(value)
+        local = value + self.windows.offsets[i]
+        return local.isoformat(timespec="seconds") + self.windows.suffixes[i]
+
+    def format_many(self, values):
+        """Formats many datetimes at once (like the ones of a page), formatting the repeated ones only once."""
+
+        formatted = {}
+        return [
+            formatted[v] if v in formatted else formatted.setdefault(v, self(v))
+            for v in values
+        ]
+
+
+@lru_cache(maxsize=512)
+def get_datetime_formatter(timezone):
+    """Gets the formatter of the datetimes on a timezone."""
+
+    return DatetimeFormatter(timezone)
@@ -3,12 +3,10 @@
 from os import path, environ
 import re
 import time
-import pytz
 from datetime import datetime
 
 from flask import Blueprint, request, jsonify, g, render_template
 from flask_babel import _
-from sqlalchemy.orm import selectinload  # This function is called within 'eval'
 from werkzeug.utils import secure_filename
 from werkzeug.security import check_password_hash, generate_password_hash
 from flasgger import swag_from
@@ -21,15 +19,31 @@ from config import (
     UPLOAD_TEMP_FOLDER,
     ALLOWED_IMAGE_EXTENSIONS,
     ALLOWED_EMAIL_DOMAINS,
+    THUMBNAIL_CONCURRENCY,
     tz,
 )
-from app.middleware import ensure_authenticated, ensure_authorized
+from app.middleware import (
+    ensure_authenticated,
+    ensure_authorized,
+    rate_limit_cost,
+    limit_concurrency,
+    coalesce_requests,
+)
 from app.modules.users.forms import *
 from app.modules.users.models import *
+from app.modules.users.utils import (
+    decode_auth_token,
+    permission_matrix,
+    principal_cache,
+    token_generations,
+    revoke_auth_tokens,
+    apply_revoked_auth_tokens,
+)
 from app.modules.notification.models import *
 from app.modules.log.models import *
 from app.modules.document.models import *
-from app.modules.utils import get_sort_attrs, get_join_attrs, get_filter_attrs
+from app.modules.listing import list_items, get_query_fieldset, serialize_item
+from app.modules.conditional import conditional_item
 
 # Blueprints for the model
 mod_auth = Blueprint("auth", __name__, url_prefix="/auth")
@@ -149,6 +163,8 @@ def login():
         session.add(log_item)
         session.flush()
         session.commit()
+        # Making sure the next requests will use the user's current data
+        principal_cache.evict(user.id)
         # Generating the JWT and returning data
         data["token"] = user.encode_auth_token(user.id)
         return jsonify({"data": data, "meta": {"success": True}})
@@ -165,7 +181,7 @@ def set_user_token(data):
         return
 
     # If token is not valid, we'll also ignore and return
-    user_id = User.decode_auth_token(data["user_token"])
+    user_id = decode_auth_token(data["user_token"])
     if type(user_id) is not int:
         return
 
@@ -509,10 +525,12 @@ def reset_password():
                 404,
             )
 
-        # Updating the item
+        # Updating the item, revoking the tokens issued with the previous password
         user.hashpass = generate_password_hash(form.password.data)
+        revoke_auth_tokens(user)
         try:
             session.commit()
+            apply_revoked_auth_tokens(user)
             # Getting model and relationships data
             data = user.as_dict()
             data["role"] = user.role.as_dict() if user.role else None
@@ -566,6 +584,8 @@ def verify_email_address():
 
         try:
             session.commit()
+            # The cached authenticated user data is outdated now
+            principal_cache.evict(user.id)
             # Getting model and relationships data
             data = user.as_dict()
             data["role"] = user.role.as_dict() if user.role else None
@@ -610,9 +630,14 @@ def activate_user(id):
             )
 
         # Updating the item
+        if user.is_active != int(form.is_active.data):
+            # Tokens issued with the previous status must not be accepted anymore
+            revoke_auth_tokens(user)
         user.is_active = int(form.is_active.data)
         try:
             session.commit()
+            # The cached authenticated user data is outdated now
+            apply_revoked_auth_tokens(user)
             # Getting model and relationships data
             data = user.as_dict()
             data["role"] = user.role.as_dict() if user.role else None
@@ -670,9 +695,14 @@ def change_user_role(id):
             )
 
         # Updating the item
+        if user.role_id != form.role_id.data:
+            # Tokens issued with the previous role must not be accepted anymore
+            revoke_auth_tokens(user)
         user.role_id = form.role_id.data
         try:
             session.commit()
+            # The cached authenticated user data is outdated now
+            apply_revoked_auth_tokens(user)
             # Getting model and relationships data
             data = user.as_dict()
             data["role"] = user.role.as_dict() if user.role else None
@@ -692,71 +722,7 @@ def change_user_role(id):
 def index_user():
     """Lists the existing users."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    # Defining the class for the data model, must be updated for different models
-    model = User
-    # Getting the model relationships and evaluating the call string in order to load the relationships
-    # TODO: if there is a better way to do this without 'eval', it should be used
-    # Check: https://realpython.com/python-eval-function/
-    # However, this shouldn't represent a risk, since the string being used can be trusted
-    # We've tried creating 'tuples', 'maps', 'lists', etc. but kept getting the following error:
-    # "mapper option expects string key or list of attributes"
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-    # If we want to eager load the relationships' relationships as well, we can use the 'options' parameter like so:
-    # .options(joinedload('*'))
-    # We can also remove some relationships eager loading on the previous statement, like so:
-    # .options(joinedload('*'), noload(User.children))
-
-    # Trying to obtain data from models
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-
-        # If we need to load specific relatonships's relationships, we can do something like follows
-        # Though it might might lower performance for large sets
-        # for r in res.items:
-        #    r.role.children = Test.query.get(r.role.children_id)
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_items(User)
 
 
 @mod_user.route("", methods=["POST"])
@@ -844,23 +810,22 @@ def create_user():
 @mod_user.route("/<int:id>", methods=["GET"])
 @ensure_authorized
 @swag_from("swagger/user/get_item_by_id.yml")
+@conditional_item(User)
 def get_user_by_id(id):
     """Gets an existing user by its id."""
 
     with AppSession() as session:
         model = User
-        selectinloads = eval(
-            "".join(
-                f"selectinload({r}), " for r in list(model.__mapper__.relationships)
-            )
-        )
+        fieldset = get_query_fieldset(model)
 
         # Searching item by ID
-        item = session.query(model).options(selectinloads).get(id)
+        item = session.query(model).options(*fieldset.options).get(id)
 
         # If item is found
         if item:
-            return jsonify({"data": item.as_dict(), "meta": {"success": True}})
+            return jsonify(
+                {"data": serialize_item(item, fieldset), "meta": {"success": True}}
+            )
 
         return (
             jsonify(
@@ -933,7 +898,9 @@ def update_user(id):
                     ),
                     404,
                 )
-            else:
+            elif user.role_id != form.role_id.data:
+                # Tokens issued with the previous role must not be accepted anymore
+                revoke_auth_tokens(user)
                 user.role_id = form.role_id.data
 
         # If a new passowrd was provided, we also need the confirmation
@@ -952,11 +919,14 @@ def update_user(id):
                     ),
                     400,
                 )
-            # If everything is ok, we update the user's password
+            # If everything is ok, we update the user's password and revoke the previous tokens
             user.hashpass = generate_password_hash(form.password.data)
+            revoke_auth_tokens(user)
 
         try:
             session.commit()
+            # The cached authenticated user data is outdated now
+            apply_revoked_auth_tokens(user)
             # Getting model and relationships data
             data = user.as_dict()
             data["role"] = user.role.as_dict() if user.role else None
@@ -1026,6 +996,8 @@ def delete_user(id):
             # Removing the item
             session.delete(item)
             session.commit()
+            principal_cache.evict(id)
+            token_generations.discard(id)
             # Removing the files
             if avatar_url is not None:
                 remove_file(avatar_url)
@@ -1043,12 +1015,13 @@ def delete_user(id):
 
 @mod_profile.route("", methods=["GET"])
 @ensure_authenticated
+@coalesce_requests
 @swag_from("swagger/profile/get_profile.yml")
 def get_profile():
     """Gets an user's profile."""
 
     # Getting the user object
-    user = g.user
+    user = User.query.get(g.user.id)
     # If no user is found
     if not user:
         return (
@@ -1073,6 +1046,8 @@ def get_profile():
 @mod_profile.route("/avatar", methods=["POST"])
 @ensure_authenticated
 @swag_from("swagger/profile/update_avatar.yml")
+@rate_limit_cost(10)
+@limit_concurrency(THUMBNAIL_CONCURRENCY)
 def update_avatar():
     """Updates an user avatar picture."""
 
@@ -1268,11 +1243,14 @@ def update_profile():
                     ),
                     400,
                 )
-            # If everything is ok, we update the user's password
+            # If everything is ok, we update the user's password and revoke the previous tokens
             user.hashpass = generate_password_hash(form.new_password.data)
+            revoke_auth_tokens(user)
 
         try:
             session.commit()
+            # The cached authenticated user data is outdated now
+            apply_revoked_auth_tokens(user)
             # Getting model and relationships data
             data = user.as_dict()
             data["role"] = user.role.as_dict() if user.role else None
@@ -1291,55 +1269,7 @@ def update_profile():
 def index_role():
     """Lists the existing roles."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = Role
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    # Trying to obtain data from models
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_items(Role)
 
 
 @mod_role.route("", methods=["POST"])
@@ -1373,6 +1303,7 @@ def create_role():
 
 @mod_role.route("/<int:id>", methods=["GET"])
 @ensure_authorized
+@conditional_item(Role)
 def get_role_by_id(id):
     """Gets an existing role by its id."""
 
@@ -1430,6 +1361,8 @@ def update_role(id):
 
         try:
             session.commit()
+            # Cached authenticated users hold a snapshot of their roles
+            principal_cache.clear()
             return jsonify({"data": role.as_dict(), "meta": {"success": True}})
 
         except Exception as e:
@@ -1512,6 +1445,8 @@ def copy_role(id):
                 session.add(mobile_action)
             # Comitting the changes
             session.commit()
+            # The new role API routes must be available for authorization checks
+            permission_matrix.invalidate()
             return jsonify({"data": role.as_dict(), "meta": {"success": True}})
 
         except Exception as e:
@@ -1563,6 +1498,8 @@ def delete_role(id):
         try:
             session.delete(item)
             session.commit()
+            # Role API routes are removed along with the role
+            permission_matrix.invalidate()
             return jsonify({"data": "", "meta": {"success": True}}), 204
         except Exception as e:
             session.rollback()
@@ -1577,55 +1514,7 @@ def delete_role(id):
 def index_role_api_route():
     """Lists the existing associations between roles and API routes."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = RoleAPIRoute
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    # Trying to obtain data from models
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_items(RoleAPIRoute)
 
 
 @mod_role_api_route.route("", methods=["POST"])
@@ -1690,6 +1579,7 @@ def create_role_api_route():
             session.add(item)
             session.flush()
             session.commit()
+            permission_matrix.invalidate()
             return jsonify({"data": item.as_dict(), "meta": {"success": True}})
         except Exception as e:
             session.rollback()
@@ -1723,6 +1613,7 @@ def delete_role_api_route(id):
         try:
             session.delete(item)
             session.commit()
+            permission_matrix.invalidate()
             return jsonify({"data": "", "meta": {"success": True}}), 204
         except Exception as e:
             session.rollback()
@@ -1737,56 +1628,7 @@ def delete_role_api_route(id):
 def index_role_web_action():
     """Lists the existing associations between roles and web actions."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    # Defining the class for the data model, must be updated for different models
-    model = RoleWebAction
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    # Trying to obtain data from models
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_items(RoleWebAction)
 
 
 @mod_role_web_action.route("", methods=["POST"])
@@ -1893,55 +1735,7 @@ def delete_role_web_action(id):
 def index_role_mobile_action():
     """Lists the existing associations between roles and mobile actions."""
 
-    # Pagination
-    page = request.args.get("page", default=1, type=int)
-    limit = request.args.get("limit", default=25, type=int)
-    max_per_page = 250
-    # Filtering and sorting
-    filter = request.args.get("filter", default="[]", type=str)
-    sort = request.args.get("sort", default="[]", type=str)
-    # Query timezone
-    timezone = request.args.get("timezone", default=os.getenv("TZ", "UTC"), type=str)
-    try:
-        q_tz = pytz.timezone(timezone)
-    except:
-        q_tz = pytz.timezone(os.getenv("TZ", "UTC"))
-
-    model = RoleMobileAction
-    selectinloads = eval(
-        "".join(f"selectinload({r}), " for r in list(model.__mapper__.relationships))
-    )
-
-    # Trying to obtain data from models
-    try:
-        sort_attrs = get_sort_attrs(model, sort)
-        join_attrs = get_join_attrs(model, filter, sort)
-        filter_attrs = get_filter_attrs(model, filter, q_tz)
-
-        # Searching itens by filters and sorting
-        if len(join_attrs) > 0:
-            # If joins are required
-            res = (
-                model.query.options(selectinloads)
-                .join(*join_attrs)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        else:
-            # If joins are not required
-            res = (
-                model.query.options(selectinloads)
-                .filter(*filter_attrs)
-                .order_by(*sort_attrs)
-                .paginate(page, limit, False, max_per_page)
-            )
-        data = [r.as_dict(q_tz) for r in res.items] if len(res.items) > 0 else []
-
-        return jsonify({"data": data, "meta": {"success": True, "count": res.total}})
-
-    except Exception as e:
-        return jsonify({"data": {}, "meta": {"success": False, "errors": str(e)}}), 500
+    return list_items(RoleMobileAction)
 
 
 @mod_role_mobile_action.route("", methods=["POST"])
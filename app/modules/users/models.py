@@ -5,26 +5,12 @@ from datetime import datetime, timedelta
 
 import jwt
 
-from config import STORAGE_DRIVER, tz
+from config import STORAGE_DRIVER, STATELESS_AUTH_TOKENS, tz
 from app import db
+from app.modules.serialization import SerializerMixin
 
 
-def default_object_string(object, timezone=tz):
-    """Function to format an object (like datetime/date) to a string."""
-
-    if str(type(object)) == "<class 'datetime.datetime'>":
-        try:
-            return (
-                tz.localize(object).astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
-            )
-        except:
-            return object.astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
-    elif str(type(object)) == "<class 'datetime.date'>":
-        return object.strftime("%Y-%m-%d")
-    return object
-
-
-class Base(db.Model):
+class Base(SerializerMixin, db.Model):
     """Base application model for other database tables to inherit."""
 
     __abstract__ = True
@@ -47,7 +33,7 @@ class User(Base):
 
     # Identification Data: email, password, etc.
     username = db.Column(db.String(128), nullable=False, unique=True)
-    email = db.Column(db.String(128), nullable=True)
+    email = db.Column(db.String(128), nullable=True, index=True)
     hashpass = db.Column(db.String(192), nullable=False)
     avatar_url = db.Column(db.String(1024), nullable=True)
     avatar_thumbnail_url = db.Column(db.String(1024), nullable=True)
@@ -59,6 +45,8 @@ class User(Base):
     role_id = db.Column(db.Integer, db.ForeignKey("role.id"), nullable=False)
     is_active = db.Column(db.Integer, nullable=False)
     is_verified = db.Column(db.Integer, nullable=False)
+    # Must be increased whenever the user's authorization data changes, to revoke its stateless tokens
+    token_generation = db.Column(db.Integer, nullable=False, default=0)
 
     # Relationships
     document = db.relationship("Document", lazy="select", backref="user")
@@ -68,6 +56,17 @@ class User(Base):
     )
     notification = db.relationship("Notification", lazy="select", backref="user")
 
+    # The password hash and the token generation are never serialized, the avatars are sent with their full URLs
+    # and the loaded to-many relationships with their IDs
+    __serializer_args__ = {
+        "exclude": ("hashpass", "token_generation"),
+        "computed": {
+            "avatar_url": "full_avatar_url",
+            "avatar_thumbnail_url": "full_avatar_thumbnail_url",
+        },
+        "collection_ids": True,
+    }
+
     def __init__(
         self,
         name,
@@ -125,26 +124,6 @@ class User(Base):
         else:
             return None
 
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        # We should remove the password hash for privacy
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-            if c.name != "hashpass"
-        }
-        data["avatar_url"] = self.full_avatar_url()
-        data["avatar_thumbnail_url"] = self.full_avatar_thumbnail_url()
-        # Add the related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-            # For many-to-many relationships
-            if "InstrumentedList" in str(type(self.__dict__[c])):
-                # Adding the itens IDs
-                data[c + "_ids"] = [i.id for i in self.__dict__[c]]
-        return data
-
     # Enconding the verification token
     def encode_verif_token(self, id):
         try:
@@ -166,13 +145,18 @@ class User(Base):
             return "Invalid token. Please verify and contact the system admin."
 
     # Enconding the authentication token
-    def encode_auth_token(self, id):
+    def encode_auth_token(self, id, stateless=None):
         try:
             payload = {
                 "exp": datetime.utcnow() + timedelta(hours=2, minutes=30, seconds=0),
                 "iat": datetime.utcnow(),
                 "sub": id,
             }
+            # Stateless tokens carry the authorization data, so requests can be authenticated without the database
+            if STATELESS_AUTH_TOKENS if stateless is None else stateless:
+                payload["role_id"] = self.role_id
+                payload["is_active"] = self.is_active
+                payload["gen"] = self.token_generation or 0
             return jwt.encode(payload, os.environ.get("APP_SECRET"), algorithm="HS256")
         except Exception as e:
             return e
@@ -180,12 +164,15 @@ class User(Base):
     # Decoding the authentication token
     @staticmethod
     def decode_auth_token(token):
+        claims = User.decode_auth_token_claims(token)
+        return claims["sub"] if type(claims) is dict else claims
+
+    # Decoding all claims from the authentication token
+    @staticmethod
+    def decode_auth_token_claims(token):
         try:
             # For newer versions of PyJWT (>= 2.0.0), we must add the 'algorithms' arg. This is essential for security
-            payload = jwt.decode(
-                token, os.environ.get("APP_SECRET"), algorithms=["HS256"]
-            )
-            return payload["sub"]
+            return jwt.decode(token, os.environ.get("APP_SECRET"), algorithms=["HS256"])
         except jwt.ExpiredSignatureError:
             return "Token expired. Please log in again."
         except jwt.InvalidTokenError:
@@ -217,21 +204,14 @@ class Role(Base):
     def __repr__(self):
         return "<Role %r>" % (self.name)
 
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-        }
-        # Add the related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-        return data
-
 
 class RoleAPIRoute(Base):
     __tablename__ = "role_api_route"
+    __table_args__ = (
+        db.Index(
+            "ix_role_api_route_role_id_method_route", "role_id", "method", "route"
+        ),
+    )
 
     # Basic data
     route = db.Column(db.String(512), nullable=False)
@@ -251,18 +231,6 @@ class RoleAPIRoute(Base):
     def __repr__(self):
         return "<RoleAPIRoute %r>" % (self.id)
 
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-        }
-        # Add the related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-        return data
-
 
 class RoleWebAction(Base):
     __tablename__ = "role_web_action"
@@ -283,18 +251,6 @@ class RoleWebAction(Base):
     def __repr__(self):
         return "<RoleWebAction %r>" % (self.id)
 
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-        }
-        # Add the related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-        return data
-
 
 class RoleMobileAction(Base):
     __tablename__ = "role_mobile_action"
@@ -314,15 +270,3 @@ class RoleMobileAction(Base):
 
     def __repr__(self):
         return "<RoleMobileAction %r>" % (self.id)
-
-    # Returning data as dict
-    def as_dict(self, timezone=tz):
-        data = {
-            c.name: default_object_string(getattr(self, c.name), timezone)
-            for c in self.__table__.columns
-        }
-        # Add the related tables
-        for c in self.__dict__:
-            if "app" in str(type(self.__dict__[c])):
-                data[c] = self.__dict__[c].as_dict(timezone)
-        return data
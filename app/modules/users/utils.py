@@ -0,0 +1,279 @@
+"""Utilities for the users module."""
+
+import hashlib
+import re
+import time
+from collections import namedtuple
+from datetime import timedelta
+from threading import Lock
+
+from config import (
+    PERMISSION_MATRIX_TTL,
+    PRINCIPAL_CACHE_TTL,
+    PRINCIPAL_CACHE_SIZE,
+    AUTH_TOKEN_CACHE_SIZE,
+    TOKEN_GENERATION_REFRESH_INTERVAL,
+)
+from app.services.cache import TTLCache
+from app.modules.users.models import *
+
+
+def get_route_template(rule):
+    """
+    Converts a URL rule to the format used on the role API routes.
+
+    For instance, '/users/<int:id>/role' becomes '/users/:id/role'.
+    """
+
+    template = _route_templates.get(rule)
+    if template is None:
+        template = re.sub(r"<(?:[^<>:]+:)?([^<>]+)>", r":\1", rule)
+        _route_templates[rule] = template
+    return template
+
+
+# URL rules are fixed once the app starts, so their templates are only converted once
+_route_templates = {}
+
+
+class PermissionMatrix(object):
+    """
+    Per-process compiled matrix of the API routes allowed for each role.
+
+    The matrix maps role_id -> method -> set of route templates (including the '*' wildcard), so
+    authorization checks don't need to query the database. It must be invalidated whenever the
+    role API routes change; the TTL bounds how long other workers may keep a stale matrix.
+    """
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._matrix = None
+        self._built_at = 0
+        self._lock = Lock()
+
+    def build(self):
+        """Loads all role API routes from the database and compiles the matrix."""
+
+        matrix = {}
+        for role_id, method, route in RoleAPIRoute.query.with_entities(
+            RoleAPIRoute.role_id, RoleAPIRoute.method, RoleAPIRoute.route
+        ):
+            matrix.setdefault(role_id, {}).setdefault(method.upper(), set()).add(route)
+
+        self._matrix = matrix
+        self._built_at = time.monotonic()
+        return matrix
+
+    def invalidate(self):
+        """Discards the compiled matrix, so it'll be rebuilt on the next check."""
+
+        self._matrix = None
+
+    def is_authorized(self, role_id, method, route):
+        """Checks if a role has access to a route template on the given method."""
+
+        matrix = self._matrix
+        if matrix is None or time.monotonic() - self._built_at > self.ttl:
+            with self._lock:
+                # Another thread might have rebuilt it while we were waiting
+                matrix = self._matrix
+                if matrix is None or time.monotonic() - self._built_at > self.ttl:
+                    matrix = self.build()
+
+        routes = matrix.get(role_id, {}).get(method.upper(), ())
+        return "*" in routes or route in routes
+
+
+permission_matrix = PermissionMatrix(ttl=PERMISSION_MATRIX_TTL)
+
+# Claims of verified authentication tokens, by the token digest; entries expire along with the tokens
+verified_token_cache = TTLCache("auth_tokens", max_size=AUTH_TOKEN_CACHE_SIZE)
+
+
+def decode_auth_token_claims(token):
+    """
+    Decodes the claims from an authentication token, reusing the previous verification of the same token.
+
+    Only valid tokens are cached, and only until their expiration time, so the result is the same as the
+    one from 'User.decode_auth_token_claims'. The returned claims are shared, so they must not be changed.
+    """
+
+    key = hashlib.sha256(token.encode()).digest()
+    claims = verified_token_cache.get(key)
+    if claims is None:
+        claims = User.decode_auth_token_claims(token)
+        if type(claims) is dict and "exp" in claims:
+            ttl = claims["exp"] - time.time()
+            if ttl > 0:
+                verified_token_cache.set(key, claims, ttl=ttl)
+    return claims
+
+
+def decode_auth_token(token):
+    """Decodes the user ID from an authentication token, reusing the previous verification of the same token."""
+
+    claims = decode_auth_token_claims(token)
+    return claims["sub"] if type(claims) is dict else claims
+
+
+# Snapshots of authenticated users and their roles, so requests don't have to load them from the database
+Principal = namedtuple(
+    "Principal",
+    [
+        "id",
+        "name",
+        "username",
+        "email",
+        "role_id",
+        "is_active",
+        "role",
+        "token_generation",
+    ],
+)
+RoleSnapshot = namedtuple("RoleSnapshot", ["id", "name"])
+
+# Authenticated principals, by the user ID (JWT 'sub'); entries must be evicted when the user is updated
+principal_cache = TTLCache(
+    "principals", max_size=PRINCIPAL_CACHE_SIZE, ttl=PRINCIPAL_CACHE_TTL
+)
+
+
+def get_principal(user):
+    """Creates an authenticated principal snapshot from an user."""
+
+    role = user.role
+    return Principal(
+        id=user.id,
+        name=user.name,
+        username=user.username,
+        email=user.email,
+        role_id=user.role_id,
+        is_active=user.is_active,
+        role=RoleSnapshot(id=role.id, name=role.name) if role else None,
+        token_generation=user.token_generation or 0,
+    )
+
+
+def get_stateless_principal(claims):
+    """
+    Creates an authenticated principal snapshot from the claims of a stateless token.
+
+    Stateless tokens only carry the authorization data, so the user's name, username and email aren't available.
+    """
+
+    return Principal(
+        id=claims["sub"],
+        name=None,
+        username=None,
+        email=None,
+        role_id=claims["role_id"],
+        is_active=claims["is_active"],
+        role=RoleSnapshot(id=claims["role_id"], name=None),
+        token_generation=claims["gen"],
+    )
+
+
+class TokenGenerationTable(object):
+    """
+    Per-process table with the current token generation of each user.
+
+    Stateless tokens are only accepted while their generation matches the user's current one. After the
+    first full load, the table is refreshed incrementally (only users updated since the last refresh) at
+    most once per interval, and reconciled with the existing users IDs (so users deleted by other workers
+    are dropped), which bounds how long a revoked token might be accepted by other workers.
+    """
+
+    # Users updated slightly before the last seen update might have been committed afterwards
+    REFRESH_OVERLAP = timedelta(minutes=1)
+
+    def __init__(self, refresh_interval=10):
+        self.refresh_interval = refresh_interval
+        self._generations = None
+        self._watermark = None
+        self._refreshed_at = 0
+        self._lock = Lock()
+
+    def refresh(self):
+        """Loads the token generations of the users updated since the last refresh."""
+
+        query = User.query.with_entities(
+            User.id, User.token_generation, User.updated_at
+        )
+        generations = self._generations
+        if generations is None or self._watermark is None:
+            generations = {}
+        else:
+            query = query.filter(
+                User.updated_at >= self._watermark - self.REFRESH_OVERLAP
+            )
+
+        watermark = self._watermark
+        for id, token_generation, updated_at in query:
+            generations[id] = token_generation or 0
+            if updated_at is not None and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+
+        # Deleted users leave no updated rows behind, so they are found by the missing IDs
+        if generations is self._generations:
+            ids = {id for (id,) in User.query.with_entities(User.id)}
+            for id in [id for id in generations if id not in ids]:
+                del generations[id]
+
+        self._generations = generations
+        self._watermark = watermark
+        self._refreshed_at = time.monotonic()
+
+    def get(self, user_id):
+        """Gets the current token generation of an user, or None if the user is not known yet."""
+
+        if (
+            self._generations is None
+            or time.monotonic() - self._refreshed_at > self.refresh_interval
+        ):
+            with self._lock:
+                if (
+                    self._generations is None
+                    or time.monotonic() - self._refreshed_at > self.refresh_interval
+                ):
+                    self.refresh()
+        return self._generations.get(user_id)
+
+    def set(self, user_id, token_generation):
+        """Sets an user's token generation right away (e.g. after it was changed by this worker)."""
+
+        if self._generations is not None:
+            self._generations[user_id] = token_generation
+
+    def discard(self, user_id):
+        """Removes an user from the table (e.g. after it was deleted)."""
+
+        if self._generations is not None:
+            self._generations.pop(user_id, None)
+
+    def clear(self):
+        """Discards the whole table, so it'll be fully loaded on the next check."""
+
+        self._generations = None
+        self._watermark = None
+
+
+token_generations = TokenGenerationTable(
+    refresh_interval=TOKEN_GENERATION_REFRESH_INTERVAL
+)
+
+
+def revoke_auth_tokens(user):
+    """
+    Revokes all stateless authentication tokens issued to an user, by moving to its next token generation.
+
+    The change must be committed, then applied to the in-process tables with 'apply_revoked_auth_tokens'.
+    """
+
+    user.token_generation = (user.token_generation or 0) + 1
+
+
+def apply_revoked_auth_tokens(user):
+    """Applies a committed token generation change to the in-process tables of this worker."""
+
+    token_generations.set(user.id, user.token_generation)
+    principal_cache.evict(user.id)
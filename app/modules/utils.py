@@ -2,15 +2,19 @@
 
 import ast
 import re
-import json
 import logging
-from datetime import datetime
+from collections import namedtuple
+from datetime import date, datetime
+from decimal import Decimal
+from threading import Lock
 
 from wtforms.validators import ValidationError
 from wtforms import widgets, Field
 from sqlalchemy import or_
+from sqlalchemy.orm import configure_mappers, selectinload
 
 from config import tz
+from app import db
 from app.modules.users.models import *
 from app.modules.notification.models import *
 from app.modules.commons.models import *
@@ -18,296 +22,334 @@ from app.modules.document.models import *
 from app.modules.log.models import *
 
 
-def get_model_relationships(model):
-    """Gets the relationships of a SQLALchemy model."""
+# Metadata of a model relationship: its kind ('one' or 'many'), the related model, the association table (for
+# many-to-many relationships), the join target, the object to get the related columns from and the model
+# columns required to load it
+ModelRelationship = namedtuple(
+    "ModelRelationship",
+    ["name", "kind", "model", "secondary", "target", "attrs", "local_columns"],
+)
+# Metadata of a model: its columns and their Python types, its relationships and the options to eager load them
+ModelMetadata = namedtuple(
+    "ModelMetadata",
+    ["model", "columns", "column_types", "relationships", "loader_options"],
+)
 
-    model_relationships = {}
-    for r in list(model.__mapper__.relationships):
-        # Get model attribute name
-        model_attr = str(r).replace(model.__name__ + ".", "")
-        # Get related models, checking if it's a many-to-many relationship or not
-        if not r.__dict__["uselist"]:
-            model_relationships[model_attr] = {
-                "model": eval(r.entity.class_.__name__),
-                "kind": "one",
-            }
-        else:
-            model_relationships[model_attr] = {
-                "model": r.__dict__["secondary"],
-                "kind": "many",
-            }
-    return model_relationships
 
+class ModelRegistry(object):
+    """
+    Registry with the metadata of all models, built once from their SQLAlchemy mappers.
 
-def get_sort_attrs(model, sort):
-    """Gets sorting attributes, given a formatted sorting object."""
+    It must be built after all models are imported; if a model is not registered yet, the registry is rebuilt.
+    """
 
-    # If no sorting attributes were provided, we'll use the 'id' by default
-    if sort == '"[]"':
-        sort = '[{"property": "id", "direction": "ASC"}]'
+    def __init__(self):
+        self._models = {}
+        self._lock = Lock()
+
+    def build(self):
+        """Builds the metadata of all mapped models."""
+
+        configure_mappers()
+        models = {}
+        for mapper in db.Model.registry.mappers:
+            model = mapper.class_
+            columns = {c.key: c.columns[0] for c in mapper.column_attrs}
+
+            column_types = {}
+            for name, column in columns.items():
+                try:
+                    column_types[name] = column.type.python_type
+                except NotImplementedError:
+                    column_types[name] = None
+
+            relationships = {}
+            for r in mapper.relationships:
+                related_model = r.entity.class_
+                relationships[r.key] = ModelRelationship(
+                    name=r.key,
+                    kind="many" if r.uselist else "one",
+                    model=related_model,
+                    secondary=r.secondary,
+                    # Many-to-many relationships are joined (and filtered) through the association table
+                    target=r.secondary if r.secondary is not None else related_model,
+                    attrs=r.secondary.c if r.secondary is not None else related_model,
+                    local_columns=tuple(c.key for c in r.local_columns),
+                )
 
-    model_relationships = get_model_relationships(model)
+            models[model] = ModelMetadata(
+                model=model,
+                columns=columns,
+                column_types=column_types,
+                relationships=relationships,
+                loader_options=tuple(
+                    selectinload(getattr(model, name)) for name in relationships
+                ),
+            )
+        self._models = models
+        return models
 
-    sort_attrs = []
-    for s in json.loads(sort):
-        # Initizaling the sort model as the query model and the property name
-        sort_model = model
-        property = s["property"]
+    def get(self, model):
+        """Gets the metadata of a model."""
 
-        # Here we check if the property is from the model or a relationship
-        if "." in s["property"]:
-            # If it refers to a relationship property, we need to select the model where to get the attrs from
-            input_relationship = s["property"].split(".")[0]
+        metadata = self._models.get(model)
+        if metadata is None:
+            with self._lock:
+                metadata = self._models.get(model) or self.build().get(model)
+        return metadata
 
-            # one-to-many relationship
-            if model_relationships[input_relationship]["kind"] == "one":
-                sort_model = model_relationships[input_relationship]["model"]
 
-            # many-to-many relationship
-            elif model_relationships[input_relationship]["kind"] == "many":
-                sort_model = model_relationships[input_relationship]["model"].c
+model_registry = ModelRegistry()
 
-            # Correcting the property name (removing the 'relationship.' from the beggining)
-            property = s["property"].split(".")[1]
 
-        sort_attrs.append(
-            getattr(getattr(sort_model, property), s["direction"].lower())()
-        )
+def get_sort_columns(model, sort):
+    """
+    Gets the sorting columns and their directions ('asc' or 'desc'), given the parsed sorting objects.
+
+    Raises:
+        FilterError: If a sorting property or direction is not valid.
+    """
 
-    return sort_attrs
+    # If no sorting attributes were provided, we'll use the 'id' by default
+    if len(sort) == 0:
+        sort = [{"property": "id", "direction": "ASC"}]
 
+    sort_columns = []
+    for s in sort:
+        # Related properties ('relationship.property') are validated as the filtered ones
+        column = get_filter_column(model, s["property"])
+
+        direction = s["direction"].lower()
+        # Verifying if the direction is valid
+        if direction not in ("asc", "desc"):
+            raise FilterError(
+                f"Invalid '{direction}' as 'direction' option ('asc', 'desc')."
+            )
+
+        sort_columns.append((column, direction))
+
+    return sort_columns
 
-def get_join_attrs(model, filter, sort):
-    """Gets join attributes, given formatted filter and sort objects."""
 
-    # If no filtering or sorting attributes were provided, we'll use default values
-    if filter == '"[]"':
-        filter = '[{"property":"id","value":"","anyMatch":true,"joinOn":"and","operator":"like"}]'
-    if sort == '"[]"':
-        sort = '[{"property": "id", "direction": "ASC"}]'
+def get_sort_attrs(model, sort):
+    """Gets sorting attributes, given the parsed sorting objects."""
+
+    return [
+        getattr(column, direction)()
+        for column, direction in get_sort_columns(model, sort)
+    ]
+
+
+def get_join_attrs(model, filter, sort):
+    """Gets join attributes, given the parsed filter and sort objects."""
 
-    model_relationships = get_model_relationships(model)
+    model_relationships = model_registry.get(model).relationships
 
     join_attrs = []
     # Joins required by filters
-    for f in json.loads(filter):
+    for f in filter:
         # First of all, we check if the property is from the model or a relationship
         if "." in f["property"]:
             # If it belongs to a relationship property
             input_relationship = f["property"].split(".")[0]
             if input_relationship in model_relationships.keys():
                 # We add it to the join list if not already present
-                if model_relationships[input_relationship]["model"] not in join_attrs:
-                    join_attrs.append(model_relationships[input_relationship]["model"])
+                if model_relationships[input_relationship].target not in join_attrs:
+                    join_attrs.append(model_relationships[input_relationship].target)
     # Joins required by sorting
-    for s in json.loads(sort):
+    for s in sort:
         # First of all, we check if the property is from the model or a relationship
         if "." in s["property"]:
             # If it belongs to a relationship property
             input_relationship = s["property"].split(".")[0]
             if input_relationship in model_relationships.keys():
                 # We add it to the join list if not already present
-                if model_relationships[input_relationship]["model"] not in join_attrs:
-                    join_attrs.append(model_relationships[input_relationship]["model"])
+                if model_relationships[input_relationship].target not in join_attrs:
+                    join_attrs.append(model_relationships[input_relationship].target)
 
     return join_attrs
 
 
-def format_filter_parameter(object, timezone=tz):
-    """Function to check for, extract and format datetime object/strings."""
+class FilterError(ValueError):
+    """Raised when a filter is not valid for the filtered model."""
 
-    # If the string is formatted as a datetime
-    try:
-        # We'll get the datetime on specified timezone
-        datetime_ptz = timezone.localize(datetime.strptime(object, "%Y-%m-%d %H:%M:%S"))
-        # Convert the datetime to the system timezone
-        datetime_stz = datetime_ptz.astimezone(tz)
-        # And return the formatted item
-        return datetime_stz.strftime("%Y-%m-%d %H:%M:%S")
-    except:
-        # Otherwise, we'll return the raw object
-        return object
 
+def _coerce_int(value, timezone):
+    # Booleans and floats would be silently truncated
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError(value)
+    return int(value)
 
-def get_filter_attrs(model, filter, timezone=tz):
-    """Gets filtering attributes, given a formatted filtering object."""
 
-    # If no filtering attributes were provided, we'll make it empty by default
-    if filter == '"[]"':
-        filter = '[{"property":"id","value":"","anyMatch":true,"joinOn":"and","operator":"like"}]'
+def _coerce_float(value, timezone):
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError(value)
+    return float(value)
 
-    model_relationships = get_model_relationships(model)
 
-    # Retrieving 'and' and 'or' filtering attributes
-    and_filter_attrs = []
-    or_filter_attrs = []
+def _coerce_bool(value, timezone):
+    if str(value).lower() in ("1", "true"):
+        return True
+    if str(value).lower() in ("0", "false"):
+        return False
+    raise ValueError(value)
 
-    for f in json.loads(filter):
-        # Initizaling the filter model as the query model and the property name
-        filter_model = model
-        property = f["property"]
 
-        # Checking if the join will be on 'and' or 'or' (by default, it will be on 'and')
-        join_on = f.get("joinOn", "and").lower()
-        # Verifying if 'joinOn' option is valid
-        if join_on not in ("or", "and"):
-            raise Exception(f"Invalid '{join_on}' as 'joinOn' option ('or', 'and').")
+def _coerce_str(value, timezone):
+    if isinstance(value, (list, dict)):
+        raise ValueError(value)
+    return str(value)
 
-        # First of all, we check if the property is from the model or a relationship
-        if "." in f["property"]:
-            # If it refers to a relationship property, we need to select the model where to get the attrs from
-            input_relationship = f["property"].split(".")[0]
 
-            # For a one-to-many relationship
-            if model_relationships[input_relationship]["kind"] == "one":
-                filter_model = model_relationships[input_relationship]["model"]
+def _coerce_date(value, timezone):
+    return date.fromisoformat(value)
+
+
+def _coerce_datetime(value, timezone):
+    value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    # Datetimes without an offset are on the query timezone
+    if value.tzinfo is None:
+        value = timezone.localize(value)
+    # Datetimes are stored on the system timezone
+    return value.astimezone(tz).replace(tzinfo=None)
+
+
+# Filter values coercers by the Python type of the filtered column
+VALUE_COERCERS = {
+    int: _coerce_int,
+    float: _coerce_float,
+    Decimal: _coerce_float,
+    bool: _coerce_bool,
+    str: _coerce_str,
+    date: _coerce_date,
+    datetime: _coerce_datetime,
+}
+
+# Filtering operators, given the filtered column and the (coerced) value
+FILTER_OPERATORS = {
+    "==": lambda column, value: column == value,
+    "!=": lambda column, value: column != value,
+    "<": lambda column, value: column < value,
+    "<=": lambda column, value: column <= value,
+    ">": lambda column, value: column > value,
+    ">=": lambda column, value: column >= value,
+    "like": lambda column, value: column.like(value),
+    "ilike": lambda column, value: column.ilike(value),
+    "notlike": lambda column, value: column.notlike(value),
+    "notilike": lambda column, value: column.notilike(value),
+    "in": lambda column, value: column.in_(value),
+    "not_in": lambda column, value: column.not_in(value),
+    "between": lambda column, value: column.between(*value),
+}
+# Operators whose values are strings patterns, and operators whose values are lists
+LIKE_OPERATORS = ("like", "ilike", "notlike", "notilike")
+LIST_OPERATORS = ("in", "not_in", "between")
+
+
+def get_value_coercer(column):
+    """Gets the function to coerce the filter values to the Python type of a column (None values are kept)."""
+
+    try:
+        coercer = VALUE_COERCERS.get(column.type.python_type)
+    except NotImplementedError:
+        coercer = None
+
+    def coerce(value, timezone):
+        if value is None or coercer is None:
+            return value
+        return coercer(value, timezone)
+
+    return coerce
 
-            # For a many-to-many relationship
-            elif model_relationships[input_relationship]["kind"] == "many":
-                filter_model = model_relationships[input_relationship]["model"].c
 
-            # Correcting the property name (removing the 'relationship.' from the beggining)
-            property = f["property"].split(".")[1]
+def get_filter_column(model, property):
+    """Gets the column to be filtered, given the property name ('relationship.property' for related ones)."""
 
-        # Now we create the filters
-        # 'Like'/'Ilike'/'Not Like'/'Not Ilike' operator
-        if f["operator"].lower() in ["like", "ilike", "notlike", "notilike"]:
-            # Getting the value for the property
-            value = f.get("value", "")
-            # Formatting to localize datetime
-            value = format_filter_parameter(value, timezone)
+    filter_model = model
+    # First of all, we check if the property is from the model or a relationship
+    if "." in property:
+        # If it refers to a relationship property, we need to select the model where to get the attrs from
+        input_relationship, property = property.split(".", 1)
+        relationship = model_registry.get(model).relationships.get(input_relationship)
+        if relationship is None:
+            raise FilterError(f"Invalid '{input_relationship}' relationship.")
+        # Getting the related model (or the association table columns, for many-to-many relationships)
+        filter_model = relationship.attrs
 
-            # If it was set to anyMatch (it could be in the middle of a string)
+    column = getattr(filter_model, property, None)
+    if column is None or not hasattr(column, "type"):
+        raise FilterError(f"Invalid '{property}' property.")
+    return column
+
+
+def get_filter_value(column, operator, f, timezone=tz):
+    """
+    Gets the value of a filtering object, coerced to the type of the filtered column.
+
+    Raises:
+        FilterError: If the value is not valid for the column or operator.
+    """
+
+    value = f.get("value")
+    try:
+        if operator in LIKE_OPERATORS:
+            # Patterns are always strings and, if set to anyMatch, they could be in the middle of a string
+            value = "" if value is None else _coerce_str(value, timezone)
             if f.get("anyMatch", True):
-                value = f"%{f['value']}%"
-
-            # Appending the item to the filters
-            if join_on == "and":
-                and_filter_attrs.append(
-                    getattr(getattr(filter_model, property), f["operator"].lower())(
-                        value
-                    )
-                )
-            elif join_on == "or":
-                or_filter_attrs.append(
-                    getattr(getattr(filter_model, property), f["operator"].lower())(
-                        value
-                    )
-                )
+                value = f"%{value}%"
+        elif operator in LIST_OPERATORS:
+            # Lists may also be sent as strings (like "[1, 2]")
+            if isinstance(value, str):
+                value = ast.literal_eval(value)
+            if not isinstance(value, (list, tuple)) or (
+                operator == "between" and len(value) != 2
+            ):
+                raise ValueError(value)
+            coerce = get_value_coercer(column)
+            value = [coerce(v, timezone) for v in value]
+        else:
+            value = get_value_coercer(column)(value, timezone)
+    except (ValueError, TypeError, SyntaxError, AttributeError):
+        raise FilterError(
+            f"Invalid value {f.get('value')!r} for the '{f['property']}' property."
+        )
+    return value
 
-        # Logical operators
-        if f["operator"].lower() == "==":
-            if join_on == "and":
-                and_filter_attrs.append(
-                    getattr(filter_model, property)
-                    == format_filter_parameter(f["value"], timezone)
-                )
-            elif join_on == "or":
-                or_filter_attrs.append(
-                    getattr(filter_model, property)
-                    == format_filter_parameter(f["value"], timezone)
-                )
-        if f["operator"].lower() == "!=":
-            if join_on == "and":
-                and_filter_attrs.append(
-                    getattr(filter_model, property)
-                    != format_filter_parameter(f["value"], timezone)
-                )
-            elif join_on == "or":
-                or_filter_attrs.append(
-                    getattr(filter_model, property)
-                    != format_filter_parameter(f["value"], timezone)
-                )
-        if f["operator"].lower() == "<":
-            if join_on == "and":
-                and_filter_attrs.append(
-                    getattr(filter_model, property)
-                    < format_filter_parameter(f["value"], timezone)
-                )
-            elif join_on == "or":
-                or_filter_attrs.append(
-                    getattr(filter_model, property)
-                    < format_filter_parameter(f["value"], timezone)
-                )
-        if f["operator"].lower() == "<=":
-            if join_on == "and":
-                and_filter_attrs.append(
-                    getattr(filter_model, property)
-                    <= format_filter_parameter(f["value"], timezone)
-                )
-            elif join_on == "or":
-                or_filter_attrs.append(
-                    getattr(filter_model, property)
-                    <= format_filter_parameter(f["value"], timezone)
-                )
-        if f["operator"].lower() == ">":
-            if join_on == "and":
-                and_filter_attrs.append(
-                    getattr(filter_model, property)
-                    > format_filter_parameter(f["value"], timezone)
-                )
-            elif join_on == "or":
-                or_filter_attrs.append(
-                    getattr(filter_model, property)
-                    > format_filter_parameter(f["value"], timezone)
-                )
-        if f["operator"].lower() == ">=":
-            if join_on == "and":
-                and_filter_attrs.append(
-                    getattr(filter_model, property)
-                    >= format_filter_parameter(f["value"], timezone)
-                )
-            elif join_on == "or":
-                or_filter_attrs.append(
-                    getattr(filter_model, property)
-                    >= format_filter_parameter(f["value"], timezone)
-                )
 
-        # 'In' operator
-        if f["operator"].lower() == "in":
-            # Getting the list of values and checking for datetime items
-            raw_value = ast.literal_eval(f["value"])
-            value = [format_filter_parameter(v, timezone) for v in raw_value]
-            if join_on == "and":
-                and_filter_attrs.append(
-                    getattr(getattr(filter_model, property), "in_")(value)
-                )
-            elif join_on == "or":
-                or_filter_attrs.append(
-                    getattr(getattr(filter_model, property), "in_")(value)
-                )
+def get_filter_attrs(model, filter, timezone=tz):
+    """
+    Gets filtering attributes, given the parsed filtering objects.
 
-        # 'Not In' operator
-        if f["operator"].lower() == "not_in":
-            # Getting the list of values and checking for datetime items
-            raw_value = ast.literal_eval(f["value"])
-            value = [format_filter_parameter(v, timezone) for v in raw_value]
-            if join_on == "and":
-                and_filter_attrs.append(
-                    getattr(getattr(filter_model, property), "not_in")(value)
-                )
-            elif join_on == "or":
-                or_filter_attrs.append(
-                    getattr(getattr(filter_model, property), "not_in")(value)
-                )
+    Each value is coerced once to the type of the filtered column, so invalid values are rejected before the
+    query is run.
 
-        # 'Between' dates operator
-        if f["operator"].lower() == "between":
-            value = ast.literal_eval(f["value"])
-            if join_on == "and":
-                and_filter_attrs.append(
-                    getattr(getattr(filter_model, property), "between")(
-                        format_filter_parameter(value[0], timezone),
-                        format_filter_parameter(value[1], timezone),
-                    )
-                )
-            elif join_on == "or":
-                or_filter_attrs.append(
-                    getattr(getattr(filter_model, property), "between")(
-                        format_filter_parameter(value[0], timezone),
-                        format_filter_parameter(value[1], timezone),
-                    )
-                )
+    Raises:
+        FilterError: If a filter has an invalid operator, property or value.
+    """
+
+    # Retrieving 'and' and 'or' filtering attributes
+    and_filter_attrs = []
+    or_filter_attrs = []
+
+    for f in filter:
+        # Checking if the join will be on 'and' or 'or' (by default, it will be on 'and')
+        join_on = str(f.get("joinOn", "and")).lower()
+        # Verifying if 'joinOn' option is valid
+        if join_on not in ("or", "and"):
+            raise FilterError(f"Invalid '{join_on}' as 'joinOn' option ('or', 'and').")
+
+        operator = str(f.get("operator", "")).lower()
+        if operator not in FILTER_OPERATORS:
+            raise FilterError(f"Invalid '{operator}' operator.")
+
+        column = get_filter_column(model, f["property"])
+        value = get_filter_value(column, operator, f, timezone)
+
+        # Appending the item to the filters
+        if join_on == "and":
+            and_filter_attrs.append(FILTER_OPERATORS[operator](column, value))
+        elif join_on == "or":
+            or_filter_attrs.append(FILTER_OPERATORS[operator](column, value))
 
     # Concatenating the filtering attributes lists (for 'and' and 'or')
     filter_attrs = []
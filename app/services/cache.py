@@ -0,0 +1,183 @@
+"""Services to handle in-process caching."""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Hashable, Iterable, Optional, Set
+
+# Every cache created is registered here by its name, so their stats can be inspected
+caches: Dict[str, "TTLCache"] = {}
+
+
+class TTLCache(object):
+    """
+    Bounded, thread-safe LRU cache whose entries expire after a time to live.
+
+    When the cache is full, the least recently used entry is discarded. Hits and misses are
+    counted, so the cache effectiveness can be checked in production.
+    """
+
+    def __init__(self, name: str, max_size: int = 1024, ttl: float = 60):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = Lock()
+        caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Gets a cached value.
+
+        Args:
+            key (Hashable): The key the value was stored with.
+            default (Any): The value to be returned when the key is missing or expired.
+
+        Returns:
+            Any: The cached value, or the default one.
+        """
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Stores a value on the cache.
+
+        Args:
+            key (Hashable): The key to store the value with.
+            value (Any): The value to be stored.
+            ttl (Optional[float]): Custom time to live (in seconds) for the entry; if None, uses the cache's.
+        """
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def evict(self, key: Hashable) -> None:
+        """Removes an entry from the cache, if present."""
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """Removes all entries from the cache."""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Gets the cache usage statistics.
+
+        Returns:
+            Dict[str, Any]: A dictionary with the cache size, limits and hit/miss counters.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups > 0 else None,
+            "evictions": self.evictions,
+        }
+
+
+class TaggedCache(TTLCache):
+    """
+    TTL cache whose entries are tagged (e.g. by the tables they were read from), so they can be invalidated by tag.
+
+    Every invalidation bumps the cache generation, so values computed while their tags were invalidated can be
+    detected (and not stored), given the generation from before computing them.
+    """
+
+    def __init__(self, name: str, max_size: int = 1024, ttl: float = 60):
+        super().__init__(name, max_size=max_size, ttl=ttl)
+        self.generation = 0
+        self.invalidations = 0
+        self._tags: Dict[str, Set[Hashable]] = {}
+        # The generation of the last invalidation of each tag (and of the last clearing)
+        self._invalidated_at: Dict[str, int] = {}
+        self._cleared_at = 0
+
+    def set(
+        self,
+        key: Hashable,
+        value: Any,
+        ttl: Optional[float] = None,
+        tags: Iterable[str] = (),
+        since: Optional[int] = None,
+    ) -> None:
+        """
+        Stores a value on the cache, with its tags.
+
+        Args:
+            key (Hashable): The key to store the value with.
+            value (Any): The value to be stored.
+            ttl (Optional[float]): Custom time to live (in seconds) for the entry; if None, uses the cache's.
+            tags (Iterable[str]): The tags of the entry.
+            since (Optional[int]): The generation from before the value was computed; if any of its tags was
+                invalidated since then, the value isn't stored.
+        """
+        tags = tuple(tags)
+        if since is not None:
+            with self._lock:
+                if self._cleared_at > since or any(
+                    self._invalidated_at.get(tag, 0) > since for tag in tags
+                ):
+                    return
+        super().set(key, value, ttl)
+        with self._lock:
+            for tag in tags:
+                keys = self._tags.setdefault(tag, set())
+                keys.add(key)
+                # Dropping the keys of the evicted and expired entries
+                if len(keys) > self.max_size:
+                    self._tags[tag] = {k for k in keys if k in self._data}
+
+    def invalidate(self, tags: Iterable[str]) -> None:
+        """Removes the entries with any of the tags."""
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                self._invalidated_at[tag] = self.generation
+                for key in self._tags.pop(tag, ()):
+                    if self._data.pop(key, None) is not None:
+                        self.invalidations += 1
+
+    def clear(self) -> None:
+        """Removes all entries from the cache."""
+        with self._lock:
+            self.generation += 1
+            self._cleared_at = self.generation
+            self._data.clear()
+            self._tags.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Gets the cache usage statistics.
+
+        Returns:
+            Dict[str, Any]: The TTL cache statistics, plus the tags and invalidations counts.
+        """
+        return {
+            **super().stats(),
+            "tags": len(self._tags),
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,109 @@
+"""Services to extract the text content of files."""
+
+import csv
+import io
+import os
+from typing import Optional
+
+# Libraries for PDF processing
+import fitz
+
+
+def get_pdf_text(file: str, max_pages: int, max_size: int) -> Optional[str]:
+    """
+    Extracts the text of a PDF file.
+
+    Args:
+        file (str): The path to the PDF file.
+        max_pages (int): How many pages (from the first one) are read.
+        max_size (int): The maximum length of the extracted text.
+
+    Returns:
+        Optional[str]: The extracted text, or None if an error occurred.
+    """
+    try:
+        with fitz.open(file) as document:
+            texts, size = [], 0
+            for page in document.pages(0, min(max_pages, document.page_count)):
+                text = page.get_text()
+                texts.append(text)
+                size += len(text)
+                # Big pages are only read until the limit is reached
+                if size >= max_size:
+                    break
+            return "\n".join(texts)[:max_size]
+
+    except Exception as e:
+        print("Error while trying to extract the PDF text", e)
+        return None
+
+
+def get_plain_text(file: str, max_size: int) -> Optional[str]:
+    """
+    Extracts the text of a plain text file (decoded as UTF-8, ignoring invalid bytes).
+
+    Args:
+        file (str): The path to the text file.
+        max_size (int): How many bytes (from the start of the file) are read.
+
+    Returns:
+        Optional[str]: The extracted text, or None if an error occurred.
+    """
+    try:
+        with open(file, "rb") as f:
+            return f.read(max_size).decode("utf-8", errors="ignore")
+
+    except Exception as e:
+        print("Error while trying to extract the file text", e)
+        return None
+
+
+def get_csv_text(file: str, max_size: int) -> Optional[str]:
+    """
+    Extracts the text of a CSV file, as its values separated by spaces (one line per row).
+
+    Args:
+        file (str): The path to the CSV file.
+        max_size (int): How many bytes (from the start of the file) are read.
+
+    Returns:
+        Optional[str]: The extracted text, or None if an error occurred.
+    """
+    text = get_plain_text(file, max_size)
+    if text is None:
+        return None
+
+    try:
+        dialect = csv.Sniffer().sniff(text[:4096])
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        return "\n".join(
+            " ".join(value for value in row if value)
+            for row in csv.reader(io.StringIO(text), dialect)
+        )
+    # Malformed files are searched as plain text
+    except csv.Error:
+        return text
+
+
+def get_file_text(file: str, max_pages: int, max_size: int) -> Optional[str]:
+    """
+    Extracts the text content of a file, according to its format (PDF, CSV or plain text).
+
+    Args:
+        file (str): The path to the file.
+        max_pages (int): How many pages (from the first one) of PDF files are read.
+        max_size (int): How many bytes of text files are read, and the maximum length of the extracted text.
+
+    Returns:
+        Optional[str]: The extracted text, or None if the format isn't supported or an error occurred.
+    """
+    file_extension = os.path.splitext(file)[1].lower()
+    if file_extension == ".pdf":
+        return get_pdf_text(file, max_pages, max_size)
+    elif file_extension == ".csv":
+        return get_csv_text(file, max_size)
+    elif file_extension == ".txt":
+        return get_plain_text(file, max_size)
+    return None
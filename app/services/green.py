@@ -0,0 +1,56 @@
+"""
+Services to run blocking code alongside green threads.
+
+The workers run on eventlet (see the Dockerfile), which monkey-patches the 'threading' and 'time' modules, so
+threads started by the application are green threads sharing the worker's hub: any blocking native call (like
+a SQLite write or a CPU-bound extraction) made on them stalls every request of the worker. Without eventlet
+(like on the tests), these services fall back to the standard modules.
+"""
+
+import importlib
+from types import ModuleType
+from typing import Any, Callable
+
+try:
+    from eventlet import patcher, tpool
+except ImportError:  # pragma: no cover (optional dependency)
+    patcher = tpool = None
+
+
+def is_green() -> bool:
+    """Checks if the threads are green (the 'threading' module was monkey-patched by eventlet)."""
+    return patcher is not None and patcher.is_monkey_patched("thread")
+
+
+def native_module(name: str) -> ModuleType:
+    """
+    Gets a module as it was before being monkey-patched by eventlet, like 'threading' (for native threads) or
+    'time' (to sleep on them).
+
+    Args:
+        name (str): The module name.
+
+    Returns:
+        ModuleType: The original module (the module itself, if it wasn't monkey-patched).
+    """
+    if is_green():
+        return patcher.original(name)
+    return importlib.import_module(name)
+
+
+def run_blocking(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """
+    Runs a blocking call (like a CPU-bound extraction) without stalling the other green threads, on eventlet's
+    pool of native threads. The call must not use green sockets (like the database connections).
+
+    Args:
+        func (Callable[..., Any]): The function to be called.
+        *args (Any): The positional arguments of the call.
+        **kwargs (Any): The keyword arguments of the call.
+
+    Returns:
+        Any: The result of the call.
+    """
+    if is_green():
+        return tpool.execute(func, *args, **kwargs)
+    return func(*args, **kwargs)
@@ -0,0 +1,455 @@
+"""
+Rate limit storages shared by all workers on the same host.
+
+The default in-memory storage keeps separate counters on each worker, so the effective limits grow with the
+number of workers. The storages below are registered on the 'limits' package (used by Flask-Limiter), so they
+can be selected with the 'RATELIMIT_STORAGE_URL' setting:
+
+- 'mmap:///path/to/file': fixed-window counters on a memory mapped file;
+- 'sqlite:///path/to/file.db': counters periodically synchronized through a SQLite database.
+
+Both of them split counters in lanes: each worker process only writes to its own lane, and the counters of a
+key are summed over all lanes. This way, no lock is taken when checking a limit.
+"""
+
+import os
+import time
+import mmap
+import struct
+import sqlite3
+import hashlib
+import uuid
+from collections import deque
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from limits.storage import Storage
+
+from app.services.green import native_module
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover (not available on Windows)
+    fcntl = None
+
+
+def _get_storage_path(uri: str) -> str:
+    """
+    Gets the file path from a storage URI, like 'mmap:///tmp/ratelimit' or 'sqlite:///tmp/ratelimit.db'.
+
+    Args:
+        uri (str): The storage URI.
+
+    Returns:
+        str: The path of the storage file.
+    """
+    parsed = urlparse(uri)
+    return parsed.netloc + parsed.path
+
+
+class MMapStorage(Storage):
+    """
+    Fixed-window rate limit counters on a memory mapped file, shared by all processes on the host.
+
+    The file holds a table of slots, each one with a cell per lane: (key hash, window expiration, count). A
+    key is stored on one of a few slots starting from its hash, and each worker only writes its own lane's
+    cells, so counters are updated without locks. Workers must be single-threaded (like eventlet or sync
+    workers), since concurrent threads of the same worker might lose updates on their shared lane.
+    """
+
+    STORAGE_SCHEME = ["mmap"]
+
+    # File layout: header, lanes table (owner process IDs) and then the slots, each with a cell per lane
+    MAGIC = b"RLMT"
+    VERSION = 1
+    HEADER = struct.Struct("<4sIII")
+    LANE = struct.Struct("<q")
+    CELL_FIELDS = "Qdq"
+    # How many slots are checked for a key, before replacing the one closest to expiration
+    PROBES = 2
+
+    def __init__(self, uri: str, slots: int = 4096, lanes: int = 16, **options):
+        self.path = _get_storage_path(uri)
+        self.slots = int(slots)
+        self.lanes = int(lanes)
+        self._row = struct.Struct("<" + self.CELL_FIELDS * self.lanes)
+        self._cell = struct.Struct("<" + self.CELL_FIELDS)
+        self._lanes_offset = self.HEADER.size
+        self._slots_offset = self._lanes_offset + self.LANE.size * self.lanes
+        self._size = self._slots_offset + self._row.size * self.slots
+        self._map: Optional[mmap.mmap] = None
+        self._lane: Optional[int] = None
+        self._pid: Optional[int] = None
+        super().__init__(uri, **options)
+
+    @property
+    def base_exceptions(self):
+        return (OSError, ValueError, struct.error)
+
+    def _attach(self) -> None:
+        """Maps the counters file and claims a lane for the current process (once per process)."""
+        with os.fdopen(os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600), "r+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                header = f.read(self.HEADER.size)
+                expected = self.HEADER.pack(
+                    self.MAGIC, self.VERSION, self.lanes, self.slots
+                )
+                # Creating (or recreating, if the layout changed) the counters file
+                if header != expected or os.fstat(f.fileno()).st_size != self._size:
+                    f.truncate(0)
+                    f.truncate(self._size)
+                    f.seek(0)
+                    f.write(expected)
+                    f.flush()
+                self._map = mmap.mmap(f.fileno(), self._size)
+                self._lane = self._claim_lane()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+        self._pid = os.getpid()
+
+    def _claim_lane(self) -> int:
+        """Gets the lane owned by the current process, or claims a free one (or one from a dead process)."""
+        pid = os.getpid()
+        owners = [
+            self.LANE.unpack_from(
+                self._map, self._lanes_offset + lane * self.LANE.size
+            )[0]
+            for lane in range(self.lanes)
+        ]
+        if pid in owners:
+            return owners.index(pid)
+        for lane, owner in enumerate(owners):
+            if owner == 0 or not _is_process_alive(owner):
+                # Counters left by a dead process still count until their windows expire
+                self.LANE.pack_into(
+                    self._map, self._lanes_offset + lane * self.LANE.size, pid
+                )
+                return lane
+        # If there are more processes than lanes, some of them will share lanes
+        return pid % self.lanes
+
+    def _get_map(self) -> mmap.mmap:
+        # Forked workers must claim their own lanes
+        if self._pid != os.getpid():
+            self._attach()
+        return self._map
+
+    @staticmethod
+    @lru_cache(maxsize=65536)
+    def _hash(key: str) -> int:
+        # Zero is reserved for empty cells
+        return (
+            int.from_bytes(
+                hashlib.blake2b(key.encode(), digest_size=8).digest(), "little"
+            )
+            or 1
+        )
+
+    def _rows(self, key_hash: int) -> List[Tuple[int, tuple]]:
+        """Gets the slots (offset and cells) where a key might be stored."""
+        data = self._get_map()
+        offsets = [
+            self._slots_offset + ((key_hash + probe) % self.slots) * self._row.size
+            for probe in range(self.PROBES)
+        ]
+        return [(offset, self._row.unpack_from(data, offset)) for offset in offsets]
+
+    def _window(self, key: str) -> Tuple[int, float]:
+        """Gets the current count and window expiration of a key, over all lanes."""
+        key_hash = self._hash(key)
+        now = time.time()
+        count, expiry = 0, None
+        for _, cells in self._rows(key_hash):
+            for i in range(0, len(cells), 3):
+                if cells[i] == key_hash and cells[i + 1] > now:
+                    count += cells[i + 2]
+                    expiry = max(expiry or 0, cells[i + 1])
+        return count, expiry
+
+    def incr(
+        self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1
+    ) -> int:
+        """Increments the counter of a key on this process lane, returning the count over all lanes."""
+        key_hash = self._hash(key)
+        rows = self._rows(key_hash)
+        now = time.time()
+        lane = self._lane * 3
+
+        own, free, others, window = None, None, 0, None
+        for offset, cells in rows:
+            for i in range(0, len(cells), 3):
+                if cells[i] == key_hash and cells[i + 1] > now:
+                    if i == lane:
+                        own = (offset, cells[i + 1], cells[i + 2])
+                    else:
+                        others += cells[i + 2]
+                        window = max(window or 0, cells[i + 1])
+            # Preferring the key's own (expired) cell, then an empty or expired one, then the closest to expiration
+            cell = (cells[lane] != key_hash, cells[lane + 1] > now, cells[lane + 1])
+            if free is None or cell < free[0]:
+                free = (cell, offset)
+
+        if own is not None:
+            offset, window, count = own
+            count += amount
+            if elastic_expiry:
+                window = now + expiry
+        else:
+            # Joining the window already started by other workers, if any
+            offset, window, count = free[1], window or now + expiry, amount
+
+        self._cell.pack_into(
+            self._map, offset + self._cell.size * self._lane, key_hash, window, count
+        )
+        return count + others
+
+    def get(self, key: str) -> int:
+        """Gets the current count of a key, over all lanes."""
+        return self._window(key)[0]
+
+    def get_expiry(self, key: str) -> float:
+        """Gets the expiration time of the current window of a key."""
+        expiry = self._window(key)[1]
+        return expiry if expiry is not None else time.time()
+
+    def check(self) -> bool:
+        """Checks if the counters file is available."""
+        try:
+            self._get_map()
+            return True
+        except Exception:
+            return False
+
+    def reset(self) -> Optional[int]:
+        """Removes all counters, returning how many were active."""
+        data = self._get_map()
+        now = time.time()
+        count = 0
+        for slot in range(self.slots):
+            cells = self._row.unpack_from(
+                data, self._slots_offset + slot * self._row.size
+            )
+            count += sum(
+                1
+                for i in range(0, len(cells), 3)
+                if cells[i] != 0 and cells[i + 1] > now
+            )
+        data[self._slots_offset : self._size] = bytes(self._size - self._slots_offset)
+        return count
+
+    def clear(self, key: str) -> None:
+        """Removes the counters of a key, on all lanes."""
+        key_hash = self._hash(key)
+        for offset, cells in self._rows(key_hash):
+            for lane in range(self.lanes):
+                if cells[lane * 3] == key_hash:
+                    self._cell.pack_into(
+                        self._map, offset + self._cell.size * lane, 0, 0, 0
+                    )
+
+
+class SQLiteStorage(Storage):
+    """
+    Rate limit counters shared by all processes through a SQLite database.
+
+    Each worker counts hits in memory (on its own lane) and a background thread periodically saves them on the
+    database and loads the counts from the other workers. Checking a limit never waits for the database, and
+    the counts from other workers are at most 'sync_interval' seconds old.
+
+    The synchronization thread is a native one (even on eventlet workers), so waiting for the database lock
+    doesn't stall the requests of the worker. Both sides share no lock: the local counters are only written by
+    the requests, which queue the changed ones for the thread to save, and the thread only replaces the remote
+    counters as a whole.
+    """
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    # Expired counters are removed from the database after this many synchronizations (and from the process
+    # after this many increments)
+    CLEANUP_EVERY = 100
+
+    def __init__(self, uri: str, sync_interval: float = 0.1, **options):
+        self.path = _get_storage_path(uri)
+        self.sync_interval = float(sync_interval)
+        # Counters from this process, by key: [window expiration, count]
+        self._local: Dict[str, List] = {}
+        # Counters from the other processes, by key: (window expiration, count)
+        self._remote: Dict[str, Tuple[float, int]] = {}
+        # Changed local counters, as (key, counter), to be saved by the synchronization thread
+        self._changes = deque()
+        self._lane: Optional[str] = None
+        self._pid: Optional[int] = None
+        self._syncs = 0
+        self._incrs = 0
+        super().__init__(uri, **options)
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ratelimit ("
+            "key TEXT NOT NULL, lane TEXT NOT NULL, expiry REAL NOT NULL, count INTEGER NOT NULL, "
+            "PRIMARY KEY (key, lane))"
+        )
+        return conn
+
+    def _ensure_sync(self) -> None:
+        # Each process (including forked workers) has its own lane and synchronization thread
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._lane = uuid.uuid4().hex
+        self._local, self._remote, self._changes = {}, {}, deque()
+        native_module("threading").Thread(
+            target=self._sync_forever, args=(self._pid,), daemon=True
+        ).start()
+
+    def _sync_forever(self, pid: int) -> None:
+        sleep = native_module("time").sleep
+        conn = None
+        while self._pid == pid:
+            try:
+                if conn is None:
+                    conn = self._connect()
+                self.sync(conn)
+            except sqlite3.Error as e:
+                print("Error while synchronizing rate limits:", e)
+                conn = None
+            sleep(self.sync_interval)
+
+    def sync(self, conn: sqlite3.Connection) -> None:
+        """
+        Saves the counters changed on this process, and loads the counters from the other ones.
+
+        Args:
+            conn (sqlite3.Connection): The connection to the counters database.
+        """
+        now = time.time()
+        # Taking the queued changes one by one, as the requests may keep queuing them meanwhile
+        changed = {}
+        try:
+            while True:
+                key, entry = self._changes.popleft()
+                changed[key] = entry
+        except IndexError:
+            pass
+        rows = [(key, self._lane, entry[0], entry[1]) for key, entry in changed.items()]
+        if rows:
+            conn.executemany(
+                "INSERT OR REPLACE INTO ratelimit (key, lane, expiry, count) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+        self._remote = {
+            key: (expiry, count)
+            for key, expiry, count in conn.execute(
+                "SELECT key, MAX(expiry), SUM(count) FROM ratelimit WHERE lane != ? AND expiry > ? GROUP BY key",
+                (self._lane, now),
+            )
+        }
+
+        # Removing expired counters from time to time
+        self._syncs += 1
+        if self._syncs % self.CLEANUP_EVERY == 0:
+            conn.execute("DELETE FROM ratelimit WHERE expiry <= ?", (now,))
+
+    def _remote_count(self, key: str, now: float) -> Tuple[int, Optional[float]]:
+        remote = self._remote.get(key)
+        if remote is None or remote[0] <= now:
+            return 0, None
+        return remote[1], remote[0]
+
+    def incr(
+        self, key: str, expiry: int, elastic_expiry: bool = False, amount: int = 1
+    ) -> int:
+        """Increments the counter of a key on this process, returning the count over all processes."""
+        self._ensure_sync()
+        now = time.time()
+        others, window = self._remote_count(key, now)
+        entry = self._local.get(key)
+        if entry is not None and entry[0] > now:
+            entry[1] += amount
+            if elastic_expiry:
+                entry[0] = now + expiry
+        else:
+            # Joining the window already started by other workers, if any
+            entry = [window or now + expiry, amount]
+            self._local[key] = entry
+        self._changes.append((key, entry))
+
+        # Removing expired local counters from time to time (only the requests write them)
+        self._incrs += 1
+        if self._incrs % self.CLEANUP_EVERY == 0:
+            for expired in [k for k, e in self._local.items() if e[0] <= now]:
+                del self._local[expired]
+        return entry[1] + others
+
+    def get(self, key: str) -> int:
+        """Gets the current count of a key, over all processes."""
+        self._ensure_sync()
+        now = time.time()
+        entry = self._local.get(key)
+        count = entry[1] if entry is not None and entry[0] > now else 0
+        return count + self._remote_count(key, now)[0]
+
+    def get_expiry(self, key: str) -> float:
+        """Gets the expiration time of the current window of a key."""
+        self._ensure_sync()
+        now = time.time()
+        entry = self._local.get(key)
+        expiries = [
+            expiry
+            for expiry in (
+                entry[0] if entry is not None else None,
+                self._remote_count(key, now)[1],
+            )
+            if expiry is not None and expiry > now
+        ]
+        return max(expiries) if expiries else now
+
+    def check(self) -> bool:
+        """Checks if the counters database is available."""
+        try:
+            self._connect().close()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self) -> Optional[int]:
+        """Removes all counters, returning how many were stored."""
+        conn = self._connect()
+        try:
+            count = conn.execute("DELETE FROM ratelimit").rowcount
+        finally:
+            conn.close()
+        self._local.clear()
+        self._remote = {}
+        return count
+
+    def clear(self, key: str) -> None:
+        """Removes the counters of a key, from all processes."""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM ratelimit WHERE key = ?", (key,))
+        finally:
+            conn.close()
+        self._local.pop(key, None)
+        self._remote.pop(key, None)
+
+
+def _is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
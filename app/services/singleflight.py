@@ -0,0 +1,97 @@
+"""Services to coalesce identical concurrent calls into a single execution."""
+
+from threading import Event, Lock
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+# Every single flight group created is registered here by its name, so their stats can be inspected
+single_flights: Dict[str, "SingleFlight"] = {}
+
+
+class _Call(object):
+    """An in-flight call, whose result (or error) is shared with the callers waiting for it."""
+
+    def __init__(self):
+        self.done = Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls with the same key: the first caller runs the function, and the other ones wait
+    for its result instead of running it again.
+
+    Only concurrent calls are coalesced; once the call finishes, the next caller runs the function again.
+    Waiting uses the threading primitives, so it works with threads and with (monkey patched) green threads.
+    """
+
+    def __init__(self, name: str, timeout: Optional[float] = None):
+        self.name = name
+        self.timeout = timeout
+        self.calls = 0
+        self.shared = 0
+        self.timeouts = 0
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = Lock()
+        single_flights[name] = self
+
+    def do(
+        self, key: Hashable, func: Callable[..., Any], *args, **kwargs
+    ) -> Tuple[Any, bool]:
+        """
+        Runs a function, unless a call with the same key is in flight, whose result is shared instead.
+
+        If the in-flight call takes longer than the timeout, the waiting caller runs the function itself.
+
+        Args:
+            key (Hashable): The key identifying identical calls.
+            func (Callable[..., Any]): The function to be run, with the remaining arguments.
+
+        Returns:
+            Tuple[Any, bool]: The function result, and if it was shared from another call.
+
+        Raises:
+            BaseException: The error raised by the function (also when shared from another call).
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            if not call.done.wait(self.timeout):
+                with self._lock:
+                    self.timeouts += 1
+                return func(*args, **kwargs), False
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = func(*args, **kwargs)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Gets the coalescing statistics.
+
+        Returns:
+            Dict[str, Any]: A dictionary with the number of calls run, shared and timed out, and the ones in flight.
+        """
+        return {
+            "in_flight": len(self._calls),
+            "calls": self.calls,
+            "shared": self.shared,
+            "timeouts": self.timeouts,
+        }
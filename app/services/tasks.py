@@ -0,0 +1,96 @@
+"""Services to run tasks off the request path."""
+
+import os
+import queue
+import threading
+import traceback
+from typing import Any, Callable, Dict
+
+# Every task queue created is registered here by its name, so their stats can be inspected
+task_queues: Dict[str, "TaskQueue"] = {}
+
+
+class TaskQueue(object):
+    """
+    Bounded queue of tasks run, in order, by a background worker thread.
+
+    Each process (including forked workers) starts its own worker thread on the first submitted task. When the
+    queue is full, new tasks are dropped instead of blocking the request submitting them.
+
+    On eventlet workers, the worker thread is a green one, so the blocking parts of the tasks (like CPU-bound
+    extractions) must be run through 'run_blocking' (from the green services).
+    """
+
+    def __init__(self, name: str, max_size: int = 100):
+        self.name = name
+        self.max_size = max_size
+        self.done = 0
+        self.failed = 0
+        self.dropped = 0
+        self._pid = None
+        self._queue: "queue.Queue" = queue.Queue(max_size)
+        self._lock = threading.Lock()
+        task_queues[name] = self
+
+    def submit(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> bool:
+        """
+        Submits a task to be run by the background worker.
+
+        Args:
+            func (Callable[..., Any]): The function to be called.
+            *args (Any): The positional arguments of the call.
+            **kwargs (Any): The keyword arguments of the call.
+
+        Returns:
+            bool: Whether the task was queued (False if the queue was full).
+        """
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait((func, args, kwargs))
+            return True
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def join(self) -> None:
+        """Waits until every submitted task has been run."""
+        if self._pid == os.getpid():
+            self._queue.join()
+
+    def stats(self) -> Dict[str, Any]:
+        """Gets the queue stats (pending, done, failed and dropped tasks)."""
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "pending": self._queue.qsize(),
+                "done": self.done,
+                "failed": self.failed,
+                "dropped": self.dropped,
+            }
+
+    def _ensure_worker(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # Forked processes don't inherit the worker thread, nor should they run the parent's pending tasks
+            self._pid = os.getpid()
+            self._queue = queue.Queue(self.max_size)
+            threading.Thread(
+                target=self._work, args=(self._queue,), daemon=True
+            ).start()
+
+    def _work(self, tasks: "queue.Queue") -> None:
+        while True:
+            func, args, kwargs = tasks.get()
+            try:
+                func(*args, **kwargs)
+                with self._lock:
+                    self.done += 1
+            except Exception:
+                print(f"Error while running a '{self.name}' task")
+                traceback.print_exc()
+                with self._lock:
+                    self.failed += 1
+            finally:
+                tasks.task_done()
@@ -0,0 +1,44 @@
+"""
+Microbenchmark for the authentication tokens decoding.
+
+Compares the cost of a full verification of the token (cold) with the cost of reusing a previous
+verification from the verified tokens cache (warm). It uses the application settings from the '.env' file.
+
+Usage: python -m benchmarks.bench_auth_tokens [iterations]
+"""
+
+import sys
+import timeit
+
+from app import app
+from app.modules.users.models import User
+from app.modules.users.utils import decode_auth_token_claims, verified_token_cache
+
+
+def main(iterations=20000):
+    user = User("Benchmark User", "benchmark@email.com", None, is_active=1)
+    user.token_generation = 0
+    tokens = {
+        "regular": user.encode_auth_token(1, stateless=False),
+        "stateless": user.encode_auth_token(1, stateless=True),
+    }
+
+    print(f"Decoding authentication tokens ({iterations} iterations)")
+    for kind, token in tokens.items():
+        cold = timeit.timeit(
+            lambda: User.decode_auth_token_claims(token), number=iterations
+        )
+
+        verified_token_cache.clear()
+        decode_auth_token_claims(token)
+        warm = timeit.timeit(lambda: decode_auth_token_claims(token), number=iterations)
+
+        print(
+            f"  {kind:<10} cold: {cold / iterations * 1e6:8.2f} us/token"
+            f" | warm: {warm / iterations * 1e6:8.2f} us/token"
+            f" | speedup: {cold / warm:6.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:2]])
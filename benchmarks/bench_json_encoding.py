@@ -0,0 +1,51 @@
+"""
+Microbenchmark for the JSON encoding of the responses.
+
+Compares the standard library encoder with the native one (orjson, when it's installed) on the serialized
+pages of documents with their loaded user and category, as the listings send them (with their keys sorted
+and compact separators). It uses the application settings from the '.env' file.
+
+Usage: python -m benchmarks.bench_json_encoding [iterations] [page size]
+"""
+
+import sys
+import timeit
+
+import pytz
+
+from app import app
+from app.modules.json_encoding import FastJSONEncoder, orjson
+from benchmarks.bench_serialization import get_page
+
+
+def main(iterations=200, page_size=250):
+    timezone = pytz.timezone("America/Sao_Paulo")
+    with app.app_context():
+        data = {
+            "data": [d.as_dict(timezone) for d in get_page(page_size)],
+            "meta": {"success": True, "count": page_size},
+        }
+        encoders = {
+            "stdlib": type("StdlibEncoder", (FastJSONEncoder,), {"native": False}),
+        }
+        if orjson is not None:
+            encoders["orjson"] = type(
+                "NativeEncoder", (FastJSONEncoder,), {"native": True}
+            )
+        else:
+            print("orjson is not installed, so only the standard library is measured")
+
+        rows = iterations * page_size
+        print(f"Encoding pages of {page_size} documents ({iterations} iterations)")
+        for name, encoder in encoders.items():
+            encode = encoder(sort_keys=True, separators=(",", ":")).encode
+            elapsed = timeit.timeit(lambda: encode(data), number=iterations)
+            print(
+                f"  {name:<10} {rows / elapsed:12,.0f} rows/s"
+                f" | {elapsed / iterations * 1e3:8.2f} ms/page"
+                f" | {len(encode(data)) / 1024:6.0f} KiB/page"
+            )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -0,0 +1,95 @@
+"""
+Throughput benchmark for the rate limit storages.
+
+Measures how many limit hits per second each storage handles on a single process, and on several processes
+sharing the same counters (as gunicorn/eventlet workers would). It uses the application settings from the
+'.env' file.
+
+Usage: python -m benchmarks.bench_ratelimit_storage [hits] [processes]
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+# The application registers the shared storages
+from app import app
+
+# Many clients, each one with a limit high enough to count all of their hits
+LIMIT = parse("1000000/hour")
+CLIENTS = 256
+
+
+def run_hits(uri, hits, results=None):
+    """Hits the limit for several clients, returning (or sending to the results queue) the elapsed time."""
+
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    identifiers = [f"10.0.{i // 256}.{i % 256}" for i in range(CLIENTS)]
+    # The first hit maps files and starts synchronization threads, so it's not measured
+    limiter.hit(LIMIT, "warm-up")
+
+    start = time.perf_counter()
+    for i in range(hits):
+        limiter.hit(LIMIT, identifiers[i % CLIENTS])
+    elapsed = time.perf_counter() - start
+
+    if results is not None:
+        # Giving the synchronization threads some time to save the counters
+        time.sleep(0.5)
+        results.put(elapsed)
+    return elapsed
+
+
+def main(hits=100000, processes=4):
+    folder = tempfile.mkdtemp()
+    uris = {
+        "memory": "memory://",
+        "mmap": f"mmap://{os.path.join(folder, 'ratelimit')}",
+        "sqlite": f"sqlite://{os.path.join(folder, 'ratelimit.db')}",
+    }
+
+    print(f"Single process ({hits} hits)")
+    for name, uri in uris.items():
+        elapsed = run_hits(uri, hits)
+        print(f"  {name:<8} {hits / elapsed:12,.0f} hits/s")
+
+    print(f"{processes} processes ({hits} hits each)")
+    context = multiprocessing.get_context("fork")
+    for name, uri in uris.items():
+        if name == "memory":
+            continue
+        storage = storage_from_string(uri)
+        storage.reset()
+        results = context.Queue()
+        workers = [
+            context.Process(target=run_hits, args=(uri, hits, results))
+            for _ in range(processes)
+        ]
+        for worker in workers:
+            worker.start()
+        elapsed = max(results.get() for _ in workers)
+        for worker in workers:
+            worker.join()
+
+        # All hits must be counted, no matter which process did them
+        if name == "sqlite":
+            storage._ensure_sync()
+            storage.sync(storage._connect())
+        counted = sum(
+            storage.get(LIMIT.key_for(f"10.0.{i // 256}.{i % 256}"))
+            for i in range(CLIENTS)
+        )
+        print(
+            f"  {name:<8} {hits * processes / elapsed:12,.0f} hits/s"
+            f" | counted: {counted}/{hits * processes}"
+        )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
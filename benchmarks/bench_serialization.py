@@ -0,0 +1,109 @@
+"""
+Microbenchmark for the models serialization.
+
+Compares the previous reflective serialization (looping over the table columns and finding the loaded
+relationships by their types names) with the compiled serializers, serializing each row or the whole page at once,
+on pages of documents with their loaded user and category. It uses the application settings from the '.env' file.
+
+Usage: python -m benchmarks.bench_serialization [iterations] [page size]
+"""
+
+import sys
+import timeit
+from datetime import datetime
+
+import pytz
+from sqlalchemy.orm.attributes import set_committed_value
+
+from config import tz
+from app import app
+from app.modules.serialization import get_serializer
+from app.modules.users.models import User
+from app.modules.document.models import Document, DocumentCategory
+
+
+def reflective_object_string(object, timezone=tz):
+    if str(type(object)) == "<class 'datetime.datetime'>":
+        try:
+            return (
+                tz.localize(object).astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
+            )
+        except:
+            return object.astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
+    elif str(type(object)) == "<class 'datetime.date'>":
+        return object.strftime("%Y-%m-%d")
+    return object
+
+
+def reflective_as_dict(item, timezone=tz, fields=None):
+    """The serialization of the models before the compiled serializers."""
+
+    args = getattr(item, "__serializer_args__", {})
+    data = {
+        c.name: reflective_object_string(getattr(item, c.name), timezone)
+        for c in item.__table__.columns
+        if c.name not in args.get("exclude", ())
+        and (fields is None or c.name in fields)
+    }
+    for name, method in args.get("computed", {}).items():
+        if fields is None or name in fields:
+            data[name] = getattr(item, method)()
+    for c in item.__dict__:
+        if fields is not None and c not in fields:
+            continue
+        if "app" in str(type(item.__dict__[c])):
+            data[c] = reflective_as_dict(item.__dict__[c], timezone)
+    return data
+
+
+def get_page(page_size):
+    now = datetime(2021, 1, 1, 12, 0, 0)
+    user = User("Benchmark User", "benchmark@email.com", "hash", is_active=1)
+    category = DocumentCategory("BENCH", "Benchmark")
+    page = []
+    for i in range(page_size):
+        document = Document(
+            f"DOC-{i}",
+            "Benchmark document",
+            1,
+            1,
+            f"documents/{i}.pdf",
+            f"{i}.pdf",
+            "application/pdf",
+            "1024",
+            now,
+            observations="Observations",
+            expires_at=now.date(),
+            days_to_alert=10,
+        )
+        document.id = i + 1
+        document.created_at = document.updated_at = now
+        # As if they were loaded along with the documents (without filling the backrefs collections)
+        set_committed_value(document, "user", user)
+        set_committed_value(document, "document_category", category)
+        page.append(document)
+    return page
+
+
+def main(iterations=200, page_size=250):
+    timezone = pytz.timezone("America/Sao_Paulo")
+    with app.app_context():
+        page = get_page(page_size)
+        rows = iterations * page_size
+
+        print(f"Serializing pages of {page_size} documents ({iterations} iterations)")
+        for name, serialize in (
+            ("reflective", lambda: [reflective_as_dict(d, timezone) for d in page]),
+            ("compiled", lambda: [d.as_dict(timezone) for d in page]),
+            ("page", lambda: get_serializer(Document).serialize_page(page, timezone)),
+        ):
+            serialize()
+            elapsed = timeit.timeit(serialize, number=iterations)
+            print(
+                f"  {name:<10} {rows / elapsed:12,.0f} rows/s"
+                f" | {elapsed / rows * 1e6:8.2f} us/row"
+            )
+
+
+if __name__ == "__main__":
+    main(*[int(arg) for arg in sys.argv[1:3]])
@@ -1,6 +1,7 @@
 """Main app config file."""
 
 import os
+import json
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 
@@ -127,6 +128,77 @@ ALLOWED_EMAIL_DOMAINS = [
     "*",  # If we want to allow every domain, we can add the wildcard
 ]
 
+# In-process caches (times in seconds)
+# How long a compiled role API routes permission matrix is trusted before being rebuilt
+PERMISSION_MATRIX_TTL = int(os.environ.get("PERMISSION_MATRIX_TTL", 60))
+# How long an authenticated user (principal) is kept in cache, and how many are kept
+PRINCIPAL_CACHE_TTL = int(os.environ.get("PRINCIPAL_CACHE_TTL", 30))
+PRINCIPAL_CACHE_SIZE = int(os.environ.get("PRINCIPAL_CACHE_SIZE", 10000))
+# How many compiled listing plans (parsed filters and sorting for a model) are kept in cache, and for how long
+LISTING_PLAN_CACHE_SIZE = int(os.environ.get("LISTING_PLAN_CACHE_SIZE", 1024))
+LISTING_PLAN_CACHE_TTL = int(os.environ.get("LISTING_PLAN_CACHE_TTL", 3600))
+# How many listing counts (used for the 'estimate' count strategy) are kept in cache, and for how long
+LISTING_COUNT_CACHE_SIZE = int(os.environ.get("LISTING_COUNT_CACHE_SIZE", 1024))
+LISTING_COUNT_CACHE_TTL = int(os.environ.get("LISTING_COUNT_CACHE_TTL", 60))
+# How often the workers check the version of the cached reference data (UF, cities and document categories)
+REFERENCE_DATA_CHECK_INTERVAL = float(
+    os.environ.get("REFERENCE_DATA_CHECK_INTERVAL", 5)
+)
+# How many serialized listing pages are kept in cache for each opted-in model, and for how long; the writes on
+# a worker invalidate its own entries right away, the other workers ones expire after the time to live
+LISTING_RESULT_CACHE_SIZE = int(os.environ.get("LISTING_RESULT_CACHE_SIZE", 256))
+LISTING_RESULT_CACHE_TTL = int(os.environ.get("LISTING_RESULT_CACHE_TTL", 10))
+# How long (in seconds) identical concurrent GET requests wait for the shared one, before running on their own
+REQUEST_COALESCING_TIMEOUT = float(os.environ.get("REQUEST_COALESCING_TIMEOUT", 30))
+# The JSON responses are encoded with orjson, if it's installed (otherwise, with the standard library encoder)
+JSON_NATIVE_ENCODER = os.environ.get("JSON_NATIVE_ENCODER", "True").lower() == "true"
+# How many verified authentication tokens are kept in cache (each one until it expires)
+AUTH_TOKEN_CACHE_SIZE = int(os.environ.get("AUTH_TOKEN_CACHE_SIZE", 10000))
+
+# Stateless authentication tokens carry the user's role and status, so most requests won't hit the database
+STATELESS_AUTH_TOKENS = (
+    os.environ.get("STATELESS_AUTH_TOKENS", "False").lower() == "true"
+)
+# How often the users' token generations are refreshed, bounding how long revoked tokens might be accepted
+TOKEN_GENERATION_REFRESH_INTERVAL = int(
+    os.environ.get("TOKEN_GENERATION_REFRESH_INTERVAL", 10)
+)
+
+# Rate limits storage (loaded by Flask-Limiter). Since 'memory://' counters are kept per worker, deployments
+# with multiple workers should use a storage they share, like 'mmap:///tmp/ratelimit' or 'sqlite:///tmp/ratelimit.db'
+RATELIMIT_STORAGE_URL = os.environ.get("RATELIMIT_STORAGE_URL", "memory://")
+# Rate limits are applied per user (or client address, for anonymous requests), and each request costs what was
+# set for its route (with the 'rate_limit_cost' decorator). The application limit is shared by all routes
+RATELIMIT_STRATEGY = os.environ.get("RATELIMIT_STRATEGY", "weighted-fixed-window")
+RATELIMIT_APPLICATION = os.environ.get("RATELIMIT_APPLICATION", "600/minute")
+# Query cost guard: the listings are classified by their user supplied filtering and sorting (and their base
+# query, like the filtering by the user), as 'cheap' (when they can use an index), 'scan' (when they can't) or
+# 'heavy' (a scan joining other tables). Each role (by its ID, or 'default') has a budget telling what to do with
+# each class: 'allow', 'cap' (the page size at the budget's 'limit'), 'timeout' (interrupting the queries after
+# the budget's 'timeout', in milliseconds) or 'reject'. By default, every listing runs as requested, only with
+# heavy ones interrupted after a while
+QUERY_BUDGETS = json.loads(
+    os.environ.get(
+        "QUERY_BUDGETS",
+        json.dumps(
+            {"default": {"scan": "allow", "heavy": "timeout", "timeout": 30000}}
+        ),
+    )
+)
+# How many requests generating thumbnails are handled at the same time by each worker
+THUMBNAIL_CONCURRENCY = int(os.environ.get("THUMBNAIL_CONCURRENCY", 2))
+# The text content of uploaded documents (of these formats) is extracted by a background worker, to be searched.
+# Only the first pages of PDF files and the first bytes of text files are read, and the extracted text is cut at
+# the same size. When more uploads than the queue size are waiting, their contents aren't extracted
+CONTENT_EXTRACTION_EXTENSIONS = ["pdf", "txt", "csv"]
+CONTENT_EXTRACTION_MAX_PAGES = int(os.environ.get("CONTENT_EXTRACTION_MAX_PAGES", 50))
+CONTENT_EXTRACTION_MAX_BYTES = int(
+    os.environ.get("CONTENT_EXTRACTION_MAX_BYTES", 1000 * 1000)
+)
+CONTENT_EXTRACTION_QUEUE_SIZE = int(
+    os.environ.get("CONTENT_EXTRACTION_QUEUE_SIZE", 100)
+)
+
 # Application threads. A common general assumption is
 # using 2 per available processor cores - to handle
 # incoming requests using one and performing background
@@ -73,3 +73,8 @@ INSERT INTO city VALUES
 (25,'2020-01-01 00:00:00','2020-01-01 00:00:00','Aracaju',25),
 (26,'2020-01-01 00:00:00','2020-01-01 00:00:00','Palmas',26),
 (27,'2020-01-01 00:00:00','2020-01-01 00:00:00','Brasília',27);
+
+INSERT INTO cache_version VALUES
+(1,'2020-01-01 00:00:00','2020-01-01 00:00:00','uf',0),
+(2,'2020-01-01 00:00:00','2020-01-01 00:00:00','city',0),
+(3,'2020-01-01 00:00:00','2020-01-01 00:00:00','document_category',0);
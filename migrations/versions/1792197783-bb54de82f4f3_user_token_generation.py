@@ -0,0 +1,32 @@
+"""user token generation
+
+Revision ID: bb54de82f4f3
+Revises: a325a80550fd
+Create Date: 2026-10-17 00:43:03.118274
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "bb54de82f4f3"
+down_revision: Union[str, None] = "a325a80550fd"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "user",
+        sa.Column("token_generation", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+
+def downgrade() -> None:
+    # Batch mode is required to drop columns on SQLite
+    with op.batch_alter_table("user") as batch_op:
+        batch_op.drop_column("token_generation")
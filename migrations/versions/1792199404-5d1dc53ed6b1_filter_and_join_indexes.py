@@ -0,0 +1,50 @@
+"""filter and join indexes
+
+Revision ID: 5d1dc53ed6b1
+Revises: bb54de82f4f3
+Create Date: 2026-10-17 01:50:04.527361
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5d1dc53ed6b1"
+down_revision: Union[str, None] = "bb54de82f4f3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Indexes for the columns the documents, notifications, logs and authorization queries filter and join on
+INDEXES = [
+    ("ix_user_email", "user", ["email"]),
+    ("ix_document_user_id", "document", ["user_id"]),
+    ("ix_document_alert_expires_at", "document", ["alert", "expires_at"]),
+    (
+        "ix_document_sharing_shared_user_id_document_id",
+        "document_sharing",
+        ["shared_user_id", "document_id"],
+    ),
+    ("ix_document_sharing_document_id", "document_sharing", ["document_id"]),
+    ("ix_notification_user_id_is_read", "notification", ["user_id", "is_read"]),
+    ("ix_log_user_id", "log", ["user_id"]),
+    ("ix_log_model_name_model_id", "log", ["model_name", "model_id"]),
+    (
+        "ix_role_api_route_role_id_method_route",
+        "role_api_route",
+        ["role_id", "method", "route"],
+    ),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,75 @@
+"""document search
+
+Revision ID: 78e11c7b12fb
+Revises: 5d1dc53ed6b1
+Create Date: 2026-10-17 01:54:52.310927
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "78e11c7b12fb"
+down_revision: Union[str, None] = "5d1dc53ed6b1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Full-text search over the documents metadata (code, description, observations and file name)
+COLUMNS = "code, description, observations, file_name"
+NEW_VALUES = "new.code, new.description, new.observations, new.file_name"
+OLD_VALUES = "old.code, old.description, old.observations, old.file_name"
+SEARCH_VECTOR = (
+    "to_tsvector('simple', coalesce(code, '') || ' ' || coalesce(description, '') || ' ' || "
+    "coalesce(observations, '') || ' ' || coalesce(file_name, ''))"
+)
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        # An external content FTS5 table, kept in sync by triggers
+        op.execute(
+            f"CREATE VIRTUAL TABLE document_fts USING fts5({COLUMNS}, content='document', content_rowid='id', "
+            "tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER document_fts_insert AFTER INSERT ON document BEGIN "
+            f"INSERT INTO document_fts (rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES}); END"
+        )
+        op.execute(
+            "CREATE TRIGGER document_fts_delete AFTER DELETE ON document BEGIN "
+            f"INSERT INTO document_fts (document_fts, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD_VALUES}); END"
+        )
+        op.execute(
+            f"CREATE TRIGGER document_fts_update AFTER UPDATE OF {COLUMNS} ON document BEGIN "
+            f"INSERT INTO document_fts (document_fts, rowid, {COLUMNS}) VALUES ('delete', old.id, {OLD_VALUES}); "
+            f"INSERT INTO document_fts (rowid, {COLUMNS}) VALUES (new.id, {NEW_VALUES}); END"
+        )
+        # Indexing the existing documents
+        op.execute("INSERT INTO document_fts (document_fts) VALUES ('rebuild')")
+    elif dialect == "mysql":
+        op.execute(f"CREATE FULLTEXT INDEX ix_document_search ON document ({COLUMNS})")
+    elif dialect == "postgresql":
+        op.execute(
+            f"CREATE INDEX ix_document_search ON document USING GIN ({SEARCH_VECTOR})"
+        )
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+
+    if dialect == "sqlite":
+        for trigger in (
+            "document_fts_insert",
+            "document_fts_delete",
+            "document_fts_update",
+        ):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS document_fts")
+    elif dialect in ("mysql", "postgresql"):
+        op.drop_index("ix_document_search", table_name="document")
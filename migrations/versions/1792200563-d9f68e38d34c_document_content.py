@@ -0,0 +1,81 @@
+"""document content
+
+Revision ID: d9f68e38d34c
+Revises: 78e11c7b12fb
+Create Date: 2026-10-17 02:09:23.418206
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d9f68e38d34c"
+down_revision: Union[str, None] = "78e11c7b12fb"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Text extracted from the documents files, to be searched
+    op.create_table(
+        "document_content",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("document_id", sa.Integer(), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["document_id"],
+            ["document.id"],
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("document_id"),
+    )
+
+    dialect = op.get_bind().dialect.name
+    if dialect == "sqlite":
+        # An external content FTS5 table, kept in sync by triggers
+        op.execute(
+            "CREATE VIRTUAL TABLE document_content_fts USING fts5(content, content='document_content', "
+            "content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+        )
+        op.execute(
+            "CREATE TRIGGER document_content_fts_insert AFTER INSERT ON document_content BEGIN "
+            "INSERT INTO document_content_fts (rowid, content) VALUES (new.id, new.content); END"
+        )
+        op.execute(
+            "CREATE TRIGGER document_content_fts_delete AFTER DELETE ON document_content BEGIN "
+            "INSERT INTO document_content_fts (document_content_fts, rowid, content) "
+            "VALUES ('delete', old.id, old.content); END"
+        )
+        op.execute(
+            "CREATE TRIGGER document_content_fts_update AFTER UPDATE OF content ON document_content BEGIN "
+            "INSERT INTO document_content_fts (document_content_fts, rowid, content) "
+            "VALUES ('delete', old.id, old.content); "
+            "INSERT INTO document_content_fts (rowid, content) VALUES (new.id, new.content); END"
+        )
+    elif dialect == "mysql":
+        op.execute(
+            "CREATE FULLTEXT INDEX ix_document_content_search ON document_content (content)"
+        )
+    elif dialect == "postgresql":
+        op.execute(
+            "CREATE INDEX ix_document_content_search ON document_content "
+            "USING GIN (to_tsvector('simple', content))"
+        )
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        for trigger in (
+            "document_content_fts_insert",
+            "document_content_fts_delete",
+            "document_content_fts_update",
+        ):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS document_content_fts")
+    op.drop_table("document_content")
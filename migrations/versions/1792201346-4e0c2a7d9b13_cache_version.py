@@ -0,0 +1,42 @@
+"""cache version
+
+Revision ID: 4e0c2a7d9b13
+Revises: d9f68e38d34c
+Create Date: 2026-10-17 02:22:26.804113
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "4e0c2a7d9b13"
+down_revision: Union[str, None] = "d9f68e38d34c"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Versions of the tables cached by the workers (like the reference data)
+    cache_version = op.create_table(
+        "cache_version",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.Column("name", sa.String(length=128), nullable=False),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("name"),
+    )
+    # The versions are only updated afterwards, so concurrent changes never insert them
+    op.bulk_insert(
+        cache_version,
+        [{"name": name, "version": 0} for name in ("uf", "city", "document_category")],
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("cache_version")
@@ -18,6 +18,17 @@ os.environ["TESTING"] = "true"
 os.environ["MAIL_DRIVER"] = "test"
 
 from app import db
+from app.modules.users.utils import (
+    permission_matrix,
+    principal_cache,
+    token_generations,
+    verified_token_cache,
+)
+from app.modules.listing import listing_counts
+from app.modules.json_encoding import FastJSONEncoder
+from app.modules.document.utils import content_extraction
+from app.modules.reference_data import reference_tables
+from app.modules.result_cache import result_caches
 
 # Blueprints
 from app.modules.users.controllers import *
@@ -33,6 +44,7 @@ def app():
     app = Flask(__name__, template_folder="../app/templates")
     app.config.from_object("config")
     app.config.update({"TESTING": True})
+    app.json_encoder = FastJSONEncoder
 
     # Tranlsation features to app
     babel = Babel(app)
@@ -57,6 +69,17 @@ def app():
         with open("default-data-test.sql", encoding="utf8") as f:
             dbapi_conn.executescript(f.read())
 
+    # Discarding in-process caches built from the previous test database
+    permission_matrix.invalidate()
+    principal_cache.clear()
+    token_generations.clear()
+    verified_token_cache.clear()
+    listing_counts.clear()
+    for reference_table in reference_tables.values():
+        reference_table.clear()
+    for result_cache in result_caches.values():
+        result_cache.clear()
+
     # Registering blueprints which will be tested
     app.register_blueprint(mod_auth)
     app.register_blueprint(mod_profile)
@@ -77,6 +100,9 @@ def app():
     # Generating the app
     yield app
 
+    # Waiting for the background tasks, so they don't run against the next test database
+    content_extraction.join()
+
 
 @pytest.fixture()
 def client(app):
@@ -1,8 +1,12 @@
 """Tests for the commons module."""
 
+import json
+
 from app import AppSession
 from app.modules.users.models import User
 from app.modules.commons.models import UF, City
+from app.modules.utils import model_registry
+from app.modules.listing import listing_plans, listing_counts
 
 # Common data to be used within tests
 USER_REGISTRATION_DATA = {
@@ -183,6 +187,107 @@ def test_cities(client):
     # Saving new item
     city2 = response.json["data"]
 
+    # Listing the created cities, sorting and filtering by their UFs
+    names_filter = {
+        "property": "name",
+        "operator": "in",
+        "value": str([city1["name"], city2["name"]]),
+    }
+    response = client.get(
+        "/cities",
+        headers=headers,
+        query_string={
+            "filter": json.dumps([names_filter]),
+            "sort": json.dumps([{"property": "uf.id", "direction": "DESC"}]),
+        },
+    )
+    assert response.status_code == 200
+    assert [c["id"] for c in response.json["data"]] == [city2["id"], city1["id"]]
+
+    # Repeating the listing must reuse its compiled plan
+    hits = listing_plans.hits
+    response = client.get(
+        "/cities",
+        headers=headers,
+        query_string={
+            "filter": json.dumps([names_filter]),
+            "sort": json.dumps([{"property": "uf.id", "direction": "DESC"}]),
+        },
+    )
+    assert response.status_code == 200
+    assert [c["id"] for c in response.json["data"]] == [city2["id"], city1["id"]]
+    assert listing_plans.hits == hits + 1
+    response = client.get(
+        "/cities",
+        headers=headers,
+        query_string={
+            "filter": json.dumps(
+                [names_filter, {"property": "uf.id", "operator": "==", "value": 1}]
+            )
+        },
+    )
+    assert response.status_code == 200
+    assert [c["id"] for c in response.json["data"]] == [city1["id"]]
+
+    # Filter values are converted to the columns types
+    for value, expected in (
+        ("2000-01-01 00:00:00", [city1["id"], city2["id"]]),
+        ("2100-01-01T00:00:00+00:00", []),
+    ):
+        response = client.get(
+            "/cities",
+            headers=headers,
+            query_string={
+                "filter": json.dumps(
+                    [
+                        names_filter,
+                        {"property": "created_at", "operator": ">=", "value": value},
+                        {"property": "uf_id", "operator": "in", "value": ["1", 2]},
+                    ]
+                ),
+                "timezone": "America/Sao_Paulo",
+            },
+        )
+        assert response.status_code == 200
+        assert [c["id"] for c in response.json["data"]] == expected
+
+    # Invalid filters are rejected before querying
+    for invalid_filter in (
+        {"property": "uf.id", "operator": "==", "value": "one"},
+        {"property": "uf_id", "operator": "==", "value": 1.5},
+        {"property": "created_at", "operator": ">=", "value": "yesterday"},
+        {"property": "uf_id", "operator": "between", "value": [1]},
+        {"property": "missing", "operator": "==", "value": 1},
+        {"property": "uf_id", "operator": "~", "value": 1},
+    ):
+        response = client.get(
+            "/cities",
+            headers=headers,
+            query_string={"filter": json.dumps([invalid_filter])},
+        )
+        assert response.status_code == 400
+        assert not response.json["meta"]["success"]
+    response = client.get("/cities", headers=headers, query_string={"filter": "[1]"})
+    assert response.status_code == 400
+
+    # As are the invalid sortings
+    for invalid_sort in (
+        "{",
+        "[1]",
+        json.dumps([{"property": "name"}]),
+        json.dumps([{"property": "name", "direction": "up"}]),
+        json.dumps([{"property": "missing", "direction": "asc"}]),
+        json.dumps([{"property": "as_dict", "direction": "asc"}]),
+        json.dumps([{"property": "missing.name", "direction": "asc"}]),
+        json.dumps([{"property": "uf.missing", "direction": "asc"}]),
+    ):
+        for route in ("/cities", "/documents"):
+            response = client.get(
+                route, headers=headers, query_string={"sort": invalid_sort}
+            )
+            assert response.status_code == 400
+            assert not response.json["meta"]["success"]
+
     # Updating the created city
     response = client.put(
         f'/cities/{city1["id"]}',
@@ -219,3 +324,145 @@ def test_cities(client):
     response = client.delete(f'/cities/{city1["id"]}', headers=headers)
     assert response.status_code == 404
     assert not response.json["meta"]["success"]
+
+
+def test_cursor_pagination(client):
+    """Tests for the keyset (cursor) pagination of the listings."""
+
+    # Creating user
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+
+    # Activate the user and setting its role as admin
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.query(User).get(1).role_id = 1
+        session.commit()
+
+    # We should be able to login now
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+
+    # Creating headers to set user authorization token
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+
+    # Paging through the cities, sorted by their UFs (so there are repeated sorting values)
+    sort = json.dumps([{"property": "uf.code", "direction": "DESC"}])
+    response = client.get(
+        "/cities", headers=headers, query_string={"sort": sort, "limit": 250}
+    )
+    assert response.status_code == 200
+    expected = [c["id"] for c in response.json["data"]]
+
+    ids = []
+    cursor = ""
+    while cursor is not None:
+        response = client.get(
+            "/cities",
+            headers=headers,
+            query_string={"sort": sort, "limit": 10, "cursor": cursor},
+        )
+        assert response.status_code == 200
+        assert "count" not in response.json["meta"]
+        assert len(response.json["data"]) <= 10
+        ids += [c["id"] for c in response.json["data"]]
+        cursor = response.json["meta"]["next_cursor"]
+    assert ids[: len(expected)] == expected
+    with AppSession() as session:
+        assert len(ids) == len(set(ids)) == session.query(City).count()
+
+    # Cursors are only valid for the listing which created them
+    response = client.get(
+        "/cities",
+        headers=headers,
+        query_string={"sort": sort, "limit": 10, "cursor": ""},
+    )
+    cursor = response.json["meta"]["next_cursor"]
+    for query_string in (
+        {"cursor": cursor},
+        {"sort": sort, "cursor": "invalid"},
+    ):
+        response = client.get("/cities", headers=headers, query_string=query_string)
+        assert response.status_code == 400
+        assert not response.json["meta"]["success"]
+
+
+def test_count_strategies(client):
+    """Tests for the total count strategies of the listings."""
+
+    # Creating user
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+
+    # Activate the user and setting its role as admin
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.query(User).get(1).role_id = 1
+        session.commit()
+        total = session.query(City).count()
+
+    # We should be able to login now
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+
+    # Creating headers to set user authorization token
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+
+    # The exact count is the default one
+    response = client.get("/cities", headers=headers, query_string={"limit": 10})
+    assert response.status_code == 200
+    assert response.json["meta"]["count"] == total
+    assert "has_more" not in response.json["meta"]
+
+    # Without a count, it's only told if there are more items
+    response = client.get(
+        "/cities", headers=headers, query_string={"limit": 10, "count": "none"}
+    )
+    assert response.status_code == 200
+    assert len(response.json["data"]) == 10
+    assert response.json["meta"]["has_more"]
+    assert "count" not in response.json["meta"]
+    response = client.get(
+        "/cities",
+        headers=headers,
+        query_string={"limit": 10, "page": total // 10 + 1, "count": "none"},
+    )
+    assert len(response.json["data"]) == total % 10
+    assert not response.json["meta"]["has_more"]
+
+    # Estimated counts are cached on SQLite (for the listings run on the database, like the ones filtering by
+    # relationships)
+    hits = listing_counts.hits
+    uf_filter = json.dumps([{"property": "uf.id", "operator": ">=", "value": 1}])
+    for page in (1, 2):
+        response = client.get(
+            "/cities",
+            headers=headers,
+            query_string={
+                "limit": 10,
+                "page": page,
+                "count": "estimate",
+                "filter": uf_filter,
+            },
+        )
+        assert response.status_code == 200
+        assert response.json["meta"]["count"] == total
+        assert response.json["meta"]["has_more"]
+    assert listing_counts.hits == hits + 1
+
+    response = client.get("/cities", headers=headers, query_string={"count": "all"})
+    assert response.status_code == 400
+    assert not response.json["meta"]["success"]
+
+
+def test_model_registry():
+    """Tests for the models metadata registry."""
+
+    # Columns, their types and relationships are taken from the models mappers
+    metadata = model_registry.get(City)
+    assert metadata.columns["name"] is City.__table__.c.name
+    assert metadata.column_types["uf_id"] is int
+    assert metadata.relationships["uf"].kind == "one"
+    assert metadata.relationships["uf"].model is UF
+    assert len(metadata.loader_options) == len(metadata.relationships)
+
+    # One-to-many relationships are joined with the related model itself
+    metadata = model_registry.get(UF)
+    assert metadata.relationships["city"].kind == "many"
+    assert metadata.relationships["city"].target is City
@@ -4,7 +4,8 @@ import os
 
 from app import AppSession
 from app.modules.users.models import User
-from app.modules.document.models import Document, DocumentCategory
+from app.modules.document.models import Document, DocumentCategory, DocumentContent
+from app.modules.document.utils import content_extraction
 
 
 # Common data to be used within tests
@@ -390,6 +391,64 @@ def test_documents(client):
     assert response.status_code == 400
     assert not response.json["meta"]["success"]
 
+    # Listing and getting documents with only some of their fields
+    response = client.get(
+        "/documents",
+        headers=headers,
+        query_string={"fields": "id,code,description"},
+    )
+    assert response.status_code == 200
+    assert all(
+        set(d.keys()) == {"id", "code", "description"} for d in response.json["data"]
+    )
+    response = client.get(
+        "/documents/1",
+        headers=headers,
+        query_string={"fields": "code,file_url,document_category"},
+    )
+    assert response.status_code == 200
+    assert set(response.json["data"].keys()) == {
+        "code",
+        "file_url",
+        "document_category",
+    }
+    assert response.json["data"]["document_category"]["id"] == (
+        test_document_categories[0]["id"]
+    )
+    response = client.get(
+        "/documents", headers=headers, query_string={"fields": "id,hidden"}
+    )
+    assert response.status_code == 400
+    assert not response.json["meta"]["success"]
+
+    # Relationships are only listed when included, even the nested ones
+    response = client.get("/documents", headers=headers)
+    assert response.status_code == 200
+    assert all("user" not in d for d in response.json["data"])
+    response = client.get(
+        "/documents",
+        headers=headers,
+        query_string={"include": "user.role,document_category.document"},
+    )
+    assert response.status_code == 200
+    for d in response.json["data"]:
+        assert d["user"]["role"]["id"] == 1
+        assert "hashpass" not in d["user"]
+        assert d["id"] in [c["id"] for c in d["document_category"]["document"]]
+        assert "document_sharing" not in d
+    response = client.get(
+        "/documents/1",
+        headers=headers,
+        query_string={"fields": "id", "include": "document_sharing"},
+    )
+    assert response.status_code == 200
+    assert response.json["data"] == {"id": 1, "document_sharing": []}
+    response = client.get(
+        "/documents", headers=headers, query_string={"include": "user.hidden"}
+    )
+    assert response.status_code == 400
+    assert not response.json["meta"]["success"]
+
     # Here, we'll try to delete a document category which has a document associated to it
     # To check if it will fail
     response = client.delete(
@@ -639,6 +698,21 @@ def test_document_sharing(client):
     assert len(shared_documents) == 1
     assert shared_documents[0]["id"] == test_documents[0]["id"]
 
+    # Listing the documents owned by or shared with each user, in a single query
+    response = client.get("/documents/accessible", headers=share_headers)
+    assert response.status_code == 200
+    assert [d["id"] for d in response.json["data"]] == [test_documents[0]["id"]]
+    response = client.get(
+        "/documents/accessible",
+        headers=headers,
+        query_string={"sort": '[{"property": "code", "direction": "DESC"}]'},
+    )
+    assert response.status_code == 200
+    assert response.json["meta"]["count"] == len(test_documents)
+    assert [d["id"] for d in response.json["data"]] == [
+        d["id"] for d in reversed(test_documents)
+    ]
+
     # Trying to share a document which does not belong to the user
     response = client.post(
         f'/documents/{test_documents[0]["id"]}/share',
@@ -682,3 +756,177 @@ def test_document_sharing(client):
     for ed in test_documents:
         response = client.delete(f'/documents/{ed["id"]}', headers=headers)
         assert response.status_code == 204
+
+
+def test_document_search(client):
+    """Tests for the documents full-text search."""
+
+    # Creating user
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+
+    # Activate the user and setting its role as admin
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.query(User).get(1).role_id = 1
+        session.commit()
+
+    # We should be able to login now
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+
+    # Creating headers to set user authorization token
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+
+    # Creating some test documents
+    test_documents = []
+    for i, (description, observations) in enumerate(
+        [
+            ("Budget report", "Budget approved"),
+            ("Budget report", "Draft version"),
+            ("Vacation photos", "Summer"),
+        ]
+    ):
+        with open("tests/assets/file.txt", "rb") as file:
+            response = client.post(
+                "/documents",
+                headers=headers,
+                data={
+                    "file": (file, f"file{i}.txt"),
+                    "code": f"SEARCH-DOC-{i}",
+                    "description": description,
+                    "observations": observations,
+                    "alert": 0,
+                },
+            )
+        assert response.status_code == 200
+        test_documents.append(response.json["data"])
+
+    def search(q, headers=headers):
+        response = client.get(
+            "/documents/search", headers=headers, query_string={"q": q}
+        )
+        assert response.status_code == 200
+        return [d["id"] for d in response.json["data"]]
+
+    # Documents are ranked by relevance, and words are matched by their prefixes
+    assert search("budget") == [test_documents[0]["id"], test_documents[1]["id"]]
+    assert search("rep draf") == [test_documents[1]["id"]]
+    assert search("search-doc-2") == [test_documents[2]["id"]]
+    assert search("file1") == [test_documents[1]["id"]]
+    assert search("missing") == []
+    response = client.get(
+        "/documents/search", headers=headers, query_string={"q": " * "}
+    )
+    assert response.status_code == 400
+
+    # The search index is kept in sync with the documents
+    response = client.put(
+        f'/documents/{test_documents[2]["id"]}',
+        headers=headers,
+        json={"description": "Holiday pictures"},
+    )
+    assert response.status_code == 200
+    assert search("vacation") == []
+    assert search("holiday") == [test_documents[2]["id"]]
+    response = client.delete(f'/documents/{test_documents[2]["id"]}', headers=headers)
+    assert response.status_code == 204
+    assert search("holiday") == []
+
+    # Other users only find the documents shared with them
+    response = client.post("/users", headers=headers, json=SHARE_USER_DATA)
+    shared_user = response.json["data"]
+    response = client.post("/auth/login", json=SHARE_USER_DATA)
+    share_headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+    assert search("budget", share_headers) == []
+    response = client.post(
+        f'/documents/{test_documents[1]["id"]}/share',
+        headers=headers,
+        json={"shared_user_id": shared_user["id"]},
+    )
+    assert response.status_code == 200
+    document_sharing = response.json["data"]
+    assert search("budget", share_headers) == [test_documents[1]["id"]]
+
+    # Removing the created documents (to remove uploaded files)
+    client.delete(f'/document-sharings/{document_sharing["id"]}', headers=headers)
+    for document in test_documents[:2]:
+        response = client.delete(f'/documents/{document["id"]}', headers=headers)
+        assert response.status_code == 204
+
+
+def test_document_content_search(client, tmp_path):
+    """Tests for the full-text search inside the documents files."""
+
+    # Creating user
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+
+    # Activate the user and setting its role as admin
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.query(User).get(1).role_id = 1
+        session.commit()
+
+    # We should be able to login now
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+
+    # Creating headers to set user authorization token
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+
+    # Creating documents with PDF, text, CSV and image files
+    csv_file = tmp_path / "cities.csv"
+    csv_file.write_text("name;state\nSpringfield;Oregon\nShelbyville;Kentucky\n")
+    test_documents = []
+    for i, file_path in enumerate(
+        [
+            "tests/assets/document.pdf",
+            "tests/assets/file.txt",
+            str(csv_file),
+            "tests/assets/sample.png",
+        ]
+    ):
+        with open(file_path, "rb") as file:
+            response = client.post(
+                "/documents",
+                headers=headers,
+                data={
+                    "file": (file, os.path.basename(file_path)),
+                    "code": f"CONTENT-DOC-{i}",
+                    "description": "Searchable file" if i < 2 else "Other file",
+                    "alert": 0,
+                },
+            )
+        assert response.status_code == 200
+        test_documents.append(response.json["data"])
+
+    # The contents are extracted in the background
+    content_extraction.join()
+    with AppSession() as session:
+        assert session.query(DocumentContent).count() == 3
+
+    def search(**query_string):
+        response = client.get(
+            "/documents/search", headers=headers, query_string=query_string
+        )
+        assert response.status_code == 200
+        return [d["id"] for d in response.json["data"]]
+
+    # Words are matched by their prefixes, inside the files only
+    assert search(content="demonstration") == [test_documents[0]["id"]]
+    assert search(content="sample text") == [test_documents[1]["id"]]
+    assert search(content="shelby kentucky") == [test_documents[2]["id"]]
+    assert search(content="searchable") == []
+    # The shorter content mentioning 'file' is the most relevant
+    assert search(content="file") == [test_documents[1]["id"], test_documents[0]["id"]]
+    # Metadata and content searches can be combined
+    assert search(q="searchable", content="sample") == [test_documents[1]["id"]]
+    assert search(q="other", content="sample") == []
+    response = client.get(
+        "/documents/search", headers=headers, query_string={"content": " * "}
+    )
+    assert response.status_code == 400
+
+    # Removing the created documents (to remove uploaded files) also removes their contents
+    for document in test_documents:
+        response = client.delete(f'/documents/{document["id"]}', headers=headers)
+        assert response.status_code == 204
+    with AppSession() as session:
+        assert session.query(DocumentContent).count() == 0
@@ -4,6 +4,12 @@ import os
 
 from app import AppSession
 from app.modules.users.models import User, Role
+from app.modules.log.models import Log
+from app.modules.users.utils import (
+    principal_cache,
+    token_generations,
+    verified_token_cache,
+)
 
 # Common data to be used within tests
 USER_REGISTRATION_DATA = {
@@ -248,3 +254,231 @@ def test_roles(client):
     response = client.delete(f'/roles/{role["id"]}', headers=headers)
     assert response.status_code == 404
     assert not response.json["meta"]["success"]
+
+
+def test_role_api_routes_authorization(client):
+    """Tests for the authorization of users according to their roles' API routes."""
+
+    # Creating admin user
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+
+    # Activate the user and setting its role as admin
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.query(User).get(1).role_id = 1
+        session.commit()
+
+    # Logging in as admin
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+    admin_headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+
+    # Creating a new role, with no API routes
+    response = client.post("/roles", headers=admin_headers, json={"name": "Auditor"})
+    role = response.json["data"]
+
+    # Creating an user with the new role and logging in
+    response = client.post(
+        "/users",
+        headers=admin_headers,
+        json={
+            "name": "Jane Doe",
+            "username": "jane.doe",
+            "password": "123456",
+            "password_confirmation": "123456",
+            "role_id": role["id"],
+            "is_active": 1,
+        },
+    )
+    assert response.status_code == 200
+    response = client.post(
+        "/auth/login", json={"username": "jane.doe", "password": "123456"}
+    )
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+
+    # The user shouldn't be able to list users yet
+    response = client.get("/users", headers=headers)
+    assert response.status_code == 403
+
+    # After allowing the route, the user must be authorized right away
+    response = client.post(
+        "/role-api-routes",
+        headers=admin_headers,
+        json={"route": "/users", "method": "GET", "role_id": role["id"]},
+    )
+    api_route = response.json["data"]
+    response = client.get("/users", headers=headers)
+    assert response.status_code == 200
+
+    # Routes with path parameters are matched by their templates
+    response = client.get("/users/1", headers=headers)
+    assert response.status_code == 403
+    client.post(
+        "/role-api-routes",
+        headers=admin_headers,
+        json={"route": "/users/:id", "method": "GET", "role_id": role["id"]},
+    )
+    response = client.get("/users/1", headers=headers)
+    assert response.status_code == 200
+    # Other methods on the same route are still not allowed
+    response = client.delete("/users/1", headers=headers)
+    assert response.status_code == 403
+
+    # Removing the route must revoke the access
+    response = client.delete(
+        f'/role-api-routes/{api_route["id"]}', headers=admin_headers
+    )
+    assert response.status_code == 204
+    response = client.get("/users", headers=headers)
+    assert response.status_code == 403
+
+
+def test_principal_cache(client):
+    """Tests for the authenticated users (principals) cache."""
+
+    # Creating user
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+
+    # Activate the user and setting its role as admin
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.query(User).get(1).role_id = 1
+        session.commit()
+
+    # Logging in and getting the user's profile
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+    response = client.get("/profile", headers=headers)
+    assert response.status_code == 200
+
+    # Further requests must use the cached user
+    hits = principal_cache.hits
+    response = client.get("/profile", headers=headers)
+    assert response.status_code == 200
+    assert principal_cache.hits == hits + 1
+    assert principal_cache.get(1).role_id == 1
+
+    # Changing the user's role must evict the cached user
+    response = client.put("/users/1/role", headers=headers, json={"role_id": 2})
+    assert response.status_code == 200
+    assert principal_cache.get(1) is None
+
+    # So the next requests are authorized according to the new role
+    response = client.post("/roles", headers=headers, json={"name": "Test Role"})
+    assert response.status_code == 403
+    assert principal_cache.get(1).role_id == 2
+
+
+def test_stateless_auth_tokens(client, monkeypatch):
+    """Tests for the stateless authentication tokens and their revocation."""
+
+    monkeypatch.setattr("app.modules.users.models.STATELESS_AUTH_TOKENS", True)
+
+    # Creating the users
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+    client.post(
+        "/auth/register",
+        json={
+            "name": "Jane Doe",
+            "email": "jane.doe@email.com",
+            "password": "654321",
+            "password_confirmation": "654321",
+        },
+    )
+
+    # Activate the users and setting the first one as admin
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.query(User).get(1).role_id = 1
+        session.query(User).get(2).is_active = 1
+        session.query(User).get(2).role_id = 2
+        session.commit()
+
+    # Logging in with both users
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+    admin_headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+    response = client.post(
+        "/auth/login", json={"username": "jane.doe@email.com", "password": "654321"}
+    )
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+
+    # Once the token generations are loaded, stateless tokens don't need the users data
+    response = client.get("/ufs", headers=headers)
+    assert response.status_code == 200
+    assert token_generations.get(2) == 0
+    hits, misses = principal_cache.hits, principal_cache.misses
+    response = client.get("/ufs", headers=headers)
+    assert response.status_code == 200
+    assert (principal_cache.hits, principal_cache.misses) == (hits, misses)
+
+    # Deactivating the user must revoke its tokens
+    response = client.put(
+        "/users/2/is-active", headers=admin_headers, json={"is_active": "0"}
+    )
+    assert response.status_code == 200
+    assert token_generations.get(2) == 1
+    response = client.get("/ufs", headers=headers)
+    assert response.status_code == 401
+
+    # Tokens issued before the user was deactivated can't be used even after reactivating it
+    response = client.put(
+        "/users/2/is-active", headers=admin_headers, json={"is_active": "1"}
+    )
+    assert response.status_code == 200
+    response = client.get("/ufs", headers=headers)
+    assert response.status_code == 401
+
+    # But new tokens can
+    response = client.post(
+        "/auth/login", json={"username": "jane.doe@email.com", "password": "654321"}
+    )
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+    response = client.get("/ufs", headers=headers)
+    assert response.status_code == 200
+
+    # The token generation is never serialized
+    response = client.get("/users/2", headers=admin_headers)
+    assert "token_generation" not in response.json["data"]
+
+    # Users deleted by other workers must be dropped from the table on its next refresh
+    with AppSession() as session:
+        session.execute(Log.__table__.delete().where(Log.user_id == 2))
+        session.execute(User.__table__.delete().where(User.id == 2))
+        session.commit()
+    assert token_generations.get(2) is not None
+    token_generations._refreshed_at = 0
+    response = client.get("/ufs", headers=headers)
+    assert response.status_code == 401
+    assert token_generations.get(2) is None
+
+
+def test_verified_token_cache(client):
+    """Tests for the verified authentication tokens cache."""
+
+    # Creating user
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+
+    # Activate the user
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.commit()
+
+    # Logging in and getting the user's profile
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+    token = response.json["data"]["token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    response = client.get("/profile", headers=headers)
+    assert response.status_code == 200
+
+    # Further requests with the same token must reuse its verification
+    hits = verified_token_cache.hits
+    response = client.get("/profile", headers=headers)
+    assert response.status_code == 200
+    assert verified_token_cache.hits == hits + 1
+
+    # Invalid tokens must never be cached
+    headers = {"Authorization": f"Bearer {token[:-2]}xx"}
+    size = verified_token_cache.stats()["size"]
+    for _ in range(2):
+        response = client.get("/profile", headers=headers)
+        assert response.status_code == 401
+    assert verified_token_cache.stats()["size"] == size
@@ -0,0 +1,173 @@
+"""Tests for the conditional requests (ETag / Last-Modified validators) on the listings and items."""
+
+from datetime import datetime, timedelta
+
+import pytz
+
+from app import AppSession
+from app.modules.conditional import get_validator, get_database_timezone
+from app.modules.users.models import User, Role
+from app.modules.notification.models import Notification
+from app.modules.log.models import Log
+from app.modules.document.models import DocumentModel
+
+# Common data to be used within tests
+USER_REGISTRATION_DATA = {
+    "name": "John Doe",
+    "email": "john.doe@email.com",
+    "password": "123456",
+    "password_confirmation": "123456",
+}
+USER_LOGIN_DATA = {
+    "username": "john.doe@email.com",
+    "password": "123456",
+}
+
+
+def test_conditional_requests(client):
+    """Tests for the 304 responses of unchanged listings and items."""
+
+    # Creating user
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+
+    # Activate the user and setting its role as admin
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.query(User).get(1).role_id = 1
+        session.commit()
+
+    # We should be able to login now
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+
+    # Creating headers to set user authorization token
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+
+    # As if the user (and its logs) hadn't changed just now
+    with AppSession() as session:
+        session.query(User).get(1).updated_at = datetime(2021, 1, 1)
+        session.query(Log).update({"updated_at": datetime(2021, 1, 1)})
+        session.commit()
+
+    def get(url, query_string=None, **conditional_headers):
+        return client.get(
+            url,
+            headers={**headers, **conditional_headers},
+            query_string=query_string,
+        )
+
+    # Listings and items are sent with their validators
+    response = get("/roles")
+    assert response.status_code == 200
+    etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+    assert etag.startswith('W/"')
+    response = get("/users/1")
+    assert response.status_code == 200
+    item_etag = response.headers["ETag"]
+
+    # While they don't change, they are not sent again
+    response = get("/roles", **{"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == etag
+    response = get("/roles", **{"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    response = get("/users/1", **{"If-None-Match": item_etag})
+    assert response.status_code == 304
+
+    # Other pages (or parameters) have other validators
+    response = get("/roles", {"limit": 1}, **{"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    # Rows changed within the last second get no validators, since they might change again on the same second
+    response = client.put("/roles/2", headers=headers, json={"name": "Updated Name"})
+    assert response.status_code == 200
+    response = get("/roles", **{"If-None-Match": etag})
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+
+    # Then, the changed rows have new validators
+    with AppSession() as session:
+        session.query(Role).get(2).updated_at = datetime(2021, 1, 1)
+        session.commit()
+    response = get("/roles", **{"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+    # Items are also changed by their serialized relationships
+    with AppSession() as session:
+        session.query(Role).get(1).updated_at = datetime(2022, 1, 1)
+        session.commit()
+    response = get("/users/1", **{"If-None-Match": item_etag})
+    assert response.status_code == 200
+    assert response.json["data"]["role"]["id"] == 1
+    item_etag = response.headers["ETag"]
+    response = get("/users/1", {"fields": "name"}, **{"If-None-Match": item_etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != item_etag
+
+    # Listings including relationships have no validators
+    response = get("/users", {"include": "role"})
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+
+    # Items are also changed by the collections whose IDs they send
+    response = get("/users/1")
+    item_etag = response.headers["ETag"]
+    assert response.json["data"]["notification_ids"] == []
+    with AppSession() as session:
+        notification = Notification("Title", "Description", 1)
+        session.add(notification)
+        session.flush()
+        notification.updated_at = datetime(2021, 1, 1)
+        session.commit()
+    response = get("/users/1", **{"If-None-Match": item_etag})
+    assert response.status_code == 200
+    assert len(response.json["data"]["notification_ids"]) == 1
+
+    # And by the rows of other tables sent along with them
+    with AppSession() as session:
+        document_model = DocumentModel("User", 1, 1)
+        session.add(document_model)
+        session.flush()
+        document_model.updated_at = datetime(2021, 1, 1)
+        session.commit()
+        url = f"/document-models/{document_model.id}"
+    response = get(url)
+    assert response.status_code == 200
+    assert response.json["data"]["model"]["name"] == "John Doe"
+    item_etag = response.headers["ETag"]
+    assert get(url, **{"If-None-Match": item_etag}).status_code == 304
+    with AppSession() as session:
+        user = session.query(User).get(1)
+        user.name = "Mr. John Doe"
+        user.updated_at = datetime(2022, 6, 1)
+        session.commit()
+    response = get(url, **{"If-None-Match": item_etag})
+    assert response.status_code == 200
+    assert response.json["data"]["model"]["name"] == "Mr. John Doe"
+
+
+def test_get_validator(app):
+    """Tests for the validators given the state of the rows, on the database clock."""
+
+    sao_paulo = pytz.timezone("America/Sao_Paulo")
+    last_modified = datetime(2021, 1, 1, 12)
+
+    # The current time may be aware (like on PostgreSQL) or naive
+    naive_now = last_modified + timedelta(hours=1)
+    aware_now = sao_paulo.localize(naive_now)
+    validator = get_validator("fingerprint", last_modified, 2, aware_now, sao_paulo)
+    assert validator == get_validator(
+        "fingerprint", last_modified, 2, naive_now, sao_paulo
+    )
+    assert validator.last_modified == pytz.utc.localize(datetime(2021, 1, 1, 15))
+
+    # Rows changed within the freshness window (on the database clock) have no validators
+    recent_now = pytz.utc.localize(datetime(2021, 1, 1, 15, 0, 0, 500000))
+    assert get_validator("fingerprint", last_modified, 2, recent_now, sao_paulo) is None
+    assert get_validator("fingerprint", None, 0, recent_now, sao_paulo).etag
+
+    # SQLite's clock is on UTC
+    with app.app_context():
+        assert get_database_timezone() is pytz.utc
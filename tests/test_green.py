@@ -0,0 +1,42 @@
+"""Tests for the services running blocking code alongside green threads."""
+
+import subprocess
+import sys
+
+from app.services.green import is_green, native_module, run_blocking
+
+# Runs a blocking call on an eventlet process, while a green thread measures how long its sleeps take
+GREEN_BLOCKING_SCRIPT = """
+import eventlet
+eventlet.monkey_patch()
+import time
+from app.services.green import run_blocking
+
+blocking_sleep = eventlet.patcher.original("time").sleep
+call = eventlet.spawn(run_blocking, lambda: blocking_sleep(0.5) or "done")
+start = time.monotonic()
+for _ in range(10):
+    eventlet.sleep(0.01)
+print(time.monotonic() - start, call.wait())
+"""
+
+
+def test_run_blocking():
+    """Tests for the blocking calls, with and without eventlet."""
+
+    # Without eventlet, the calls are made as they are
+    assert not is_green()
+    assert native_module("time").sleep is __import__("time").sleep
+    assert run_blocking(sum, [1, 2], start=3) == 6
+
+    # With eventlet, they don't stall the other green threads
+    result = subprocess.run(
+        [sys.executable, "-c", GREEN_BLOCKING_SCRIPT],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    elapsed, value = result.stdout.strip().splitlines()[-1].split()
+    assert float(elapsed) < 0.4
+    assert value == "done"
@@ -0,0 +1,48 @@
+"""Tests for the JSON encoding of the responses."""
+
+import json
+from datetime import date, datetime
+
+import pytest
+import pytz
+from flask import jsonify
+
+from config import tz
+from app.modules.json_encoding import FastJSONEncoder
+
+DATA = {
+    "id": 1,
+    "name": "São Paulo",
+    "created_at": datetime(2021, 1, 2, 3, 4, 5),
+    "updated_at": pytz.utc.localize(datetime(2021, 1, 2, 3, 4, 5)),
+    "expires_at": date(2021, 1, 2),
+    "tags": [{"b": None, "a": 1.5}],
+}
+
+
+def test_json_encoding(app, monkeypatch):
+    """Tests for the datetimes and dates encoded by the responses encoder."""
+
+    monkeypatch.setattr(FastJSONEncoder, "native", False)
+    with app.test_request_context():
+        data = jsonify(DATA).json
+
+    assert data["created_at"] == tz.localize(DATA["created_at"]).strftime(
+        "%Y-%m-%dT%H:%M:%S%z"
+    )
+    assert data["updated_at"] == "2021-01-02T03:04:05+0000"
+    assert data["expires_at"] == "2021-01-02"
+    assert data["name"] == "São Paulo"
+    assert data["tags"] == [{"a": 1.5, "b": None}]
+
+
+def test_native_json_encoding(app, monkeypatch):
+    """Tests for the native encoder, which must encode as the standard library one."""
+
+    pytest.importorskip("orjson")
+    encoder = FastJSONEncoder(sort_keys=True, separators=(",", ":"))
+    monkeypatch.setattr(FastJSONEncoder, "native", False)
+    expected = encoder.encode(DATA)
+    monkeypatch.setattr(FastJSONEncoder, "native", True)
+    assert json.loads(encoder.encode(DATA)) == json.loads(expected)
+    assert encoder.encode({"big": 2**70}) == '{"big":1180591620717411303424}'
@@ -0,0 +1,212 @@
+"""Tests for the listings query cost guard."""
+
+import json
+
+import pytest
+from sqlalchemy import text
+
+from app import AppSession, db
+from app.modules.users.models import User
+from app.modules.commons.models import City, UF
+from app.modules.document.models import Document, DocumentCategory
+from app.modules.document.utils import accessible_by
+from app.modules import query_guard
+from app.modules.query_guard import (
+    get_listing_cost,
+    get_base_query_cost,
+    get_budget,
+    statement_timeout,
+    QueryTimeout,
+)
+
+# Common data to be used within tests
+USER_REGISTRATION_DATA = {
+    "name": "John Doe",
+    "email": "john.doe@email.com",
+    "password": "123456",
+    "password_confirmation": "123456",
+}
+USER_LOGIN_DATA = {
+    "username": "john.doe@email.com",
+    "password": "123456",
+}
+NAME_FILTER = {"property": "name", "operator": "like", "value": "a"}
+UF_SORT = {"property": "uf.name", "direction": "ASC"}
+# The cities are listed from memory, so the guard is tested on the API routes
+ROUTE_FILTER = {"property": "route", "operator": "like", "value": "*"}
+ROLE_SORT = {"property": "role.name", "direction": "ASC"}
+
+
+def test_listing_costs():
+    """Tests for the listings classification by their filtering and sorting."""
+
+    by_id = [(City.id, "asc")]
+
+    # Listings filtered (or only sorted) by indexed columns are cheap
+    assert get_listing_cost(City, [], by_id, ()).cost_class == "cheap"
+    assert (
+        get_listing_cost(
+            City, [{"property": "id", "operator": ">", "value": 1}], by_id, ()
+        ).cost_class
+        == "cheap"
+    )
+    cost = get_listing_cost(
+        City,
+        [{"property": "uf.code", "operator": "==", "value": "SP"}, NAME_FILTER],
+        by_id,
+        (UF,),
+    )
+    assert cost == ("cheap", 1, 1, 1)
+
+    # Otherwise, they scan the table, and joins make them heavy
+    assert get_listing_cost(City, [], [(City.name, "asc")], ()).cost_class == "scan"
+    assert get_listing_cost(City, [NAME_FILTER], by_id, ()) == ("scan", 1, 1, 0)
+    prefix_filter = dict(NAME_FILTER, anyMatch=False)
+    assert get_listing_cost(City, [prefix_filter], by_id, ()) == ("scan", 1, 0, 0)
+    assert get_listing_cost(City, [NAME_FILTER], [(UF.name, "asc")], (UF,)) == (
+        "heavy",
+        1,
+        1,
+        1,
+    )
+
+    # 'Or' filters only use indexes if all of them can
+    id_filter = {"property": "id", "operator": "==", "value": 1, "joinOn": "or"}
+    assert get_listing_cost(City, [id_filter, id_filter], by_id, ()).cost_class == (
+        "cheap"
+    )
+    assert (
+        get_listing_cost(
+            City, [id_filter, dict(NAME_FILTER, joinOn="or")], by_id, ()
+        ).cost_class
+        == "scan"
+    )
+
+
+def test_base_query_costs(app):
+    """Tests for the listings classification by their base queries."""
+
+    heavy = get_listing_cost(
+        Document,
+        [NAME_FILTER],
+        [(DocumentCategory.name, "asc")],
+        (DocumentCategory,),
+    )
+    assert heavy.cost_class == "heavy"
+    with app.app_context():
+        # Base queries narrowing the rows through an index (like the filtering by the owner) make them cheap
+        for query in (
+            Document.query.filter_by(user_id=1),
+            Document.query.filter(accessible_by(1)),
+            Document.query.filter(Document.user_id == 1, Document.alert == 1),
+        ):
+            assert get_base_query_cost(heavy, query) == heavy._replace(
+                cost_class="cheap"
+            )
+
+        # Other base queries keep the listing cost
+        for query in (
+            Document.query,
+            Document.query.filter(Document.description == "Document"),
+            Document.query.filter(
+                (Document.user_id == 1) | (Document.description == "Document")
+            ),
+        ):
+            assert get_base_query_cost(heavy, query) == heavy
+
+    # By default, no listing is rejected
+    assert "reject" not in get_budget(2).values()
+
+
+def test_query_guard(client, monkeypatch):
+    """Tests for the query cost guard budgets on the listings."""
+
+    monkeypatch.setattr(
+        query_guard,
+        "QUERY_BUDGETS",
+        {
+            "default": {"scan": "reject", "heavy": "reject"},
+            "1": {"scan": "cap", "heavy": "reject", "limit": 2},
+        },
+    )
+
+    # Creating user
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+
+    # Activate the user and setting its role as admin
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.query(User).get(1).role_id = 1
+        session.commit()
+
+    # We should be able to login now
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+
+    # Creating headers to set user authorization token
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+
+    def list_routes(filter=(), sort=()):
+        return client.get(
+            "/role-api-routes",
+            headers=headers,
+            query_string={
+                "filter": json.dumps(list(filter)),
+                "sort": json.dumps(list(sort)),
+                "limit": 20,
+            },
+        )
+
+    # Cheap listings are run as requested
+    response = list_routes()
+    assert response.status_code == 200
+    assert len(response.json["data"]) == 6
+
+    # Scans are capped at the budget limit
+    response = list_routes([ROUTE_FILTER])
+    assert response.status_code == 200
+    assert len(response.json["data"]) == 2
+
+    # And heavy listings are rejected
+    response = list_routes([ROUTE_FILTER], [ROLE_SORT])
+    assert response.status_code == 400
+    assert not response.json["meta"]["success"]
+
+    # Unless the role budget runs them with a statement timeout
+    monkeypatch.setitem(
+        query_guard.QUERY_BUDGETS, "1", {"heavy": "timeout", "timeout": 5000}
+    )
+    response = list_routes([ROUTE_FILTER], [ROLE_SORT])
+    assert response.status_code == 200
+    assert len(response.json["data"]) == 6
+
+    # Listings whose base query uses an index are cheap, even if their filtering and sorting aren't
+    monkeypatch.setitem(query_guard.QUERY_BUDGETS, "1", {"heavy": "reject"})
+    response = client.get(
+        "/documents/my",
+        headers=headers,
+        query_string={
+            "filter": json.dumps([dict(NAME_FILTER, property="description")]),
+            "sort": json.dumps(
+                [{"property": "document_category.name", "direction": "ASC"}]
+            ),
+        },
+    )
+    assert response.status_code == 200
+
+
+def test_statement_timeout(app):
+    """Tests for the statement timeout of the guarded listings."""
+
+    endless_query = text(
+        "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n) "
+        "SELECT count(*) FROM n"
+    )
+    with app.app_context():
+        with pytest.raises(QueryTimeout):
+            with statement_timeout(50):
+                db.session.execute(endless_query)
+
+        # Other queries aren't interrupted
+        with statement_timeout(5000):
+            assert db.session.execute(text("SELECT 1")).scalar() == 1
+        assert db.session.query(City).count() > 0
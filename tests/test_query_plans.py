@@ -0,0 +1,87 @@
+"""Query plan regression tests: the hot queries must use indexes instead of scanning whole tables."""
+
+import re
+from datetime import date
+
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite
+
+from app import AppSession
+from app.modules.users.models import User, RoleAPIRoute
+from app.modules.document.models import Document, DocumentSharing
+from app.modules.notification.models import Notification
+from app.modules.log.models import Log
+from app.modules.document.utils import shared_with, accessible_by
+from app.modules.document.search import search_documents, search_document_contents
+
+# The queries run on logins, authorizations, listings and background jobs, by name
+HOT_QUERIES = {
+    "login by email": lambda s: s.query(User).filter(User.email == "john@email.com"),
+    "login by username": lambda s: s.query(User).filter(User.username == "john"),
+    "my documents": lambda s: s.query(Document)
+    .filter(Document.user_id == 1)
+    .order_by(Document.id)
+    .limit(25),
+    "expiring documents": lambda s: s.query(Document).filter(
+        Document.alert == 1, Document.expires_at >= date(2023, 12, 1)
+    ),
+    "shared documents": lambda s: s.query(Document)
+    .filter(shared_with(1))
+    .order_by(Document.id)
+    .limit(25),
+    "accessible documents": lambda s: s.query(Document)
+    .filter(accessible_by(1))
+    .order_by(Document.id)
+    .limit(25),
+    "document search": lambda s: search_documents(
+        s.query(Document).filter(accessible_by(1)), "budget rep"
+    )[0].limit(25),
+    "document content search": lambda s: search_document_contents(
+        s.query(Document).filter(accessible_by(1)), "demonstration"
+    )[0].limit(25),
+    "document sharings": lambda s: s.query(DocumentSharing).filter(
+        DocumentSharing.document_id == 1
+    ),
+    "unread notifications count": lambda s: s.query(Notification)
+    .filter_by(user_id=1, is_read=0)
+    .statement.with_only_columns([Notification.id]),
+    "my notifications": lambda s: s.query(Notification)
+    .filter(Notification.user_id == 1)
+    .order_by(Notification.id)
+    .limit(25),
+    "user logs": lambda s: s.query(Log).filter(Log.user_id == 1),
+    "item logs": lambda s: s.query(Log).filter(
+        Log.model_name == "User", Log.model_id == 1
+    ),
+    "role API route": lambda s: s.query(RoleAPIRoute).filter_by(
+        role_id=1, method="GET", route="/documents"
+    ),
+}
+
+
+def explain(session, query):
+    """Gets the SQLite query plan details of a query."""
+
+    statement = getattr(query, "statement", query)
+    compiled = statement.compile(
+        dialect=sqlite.dialect(paramstyle="named"),
+        compile_kwargs={"render_postcompile": True},
+    )
+    rows = session.execute(text(f"EXPLAIN QUERY PLAN {compiled}"), compiled.params)
+    return [row[-1] for row in rows]
+
+
+def test_hot_queries_use_indexes(app):
+    """Tests that none of the hot queries falls back to a table scan."""
+
+    with AppSession() as session:
+        for name, build_query in HOT_QUERIES.items():
+            details = explain(session, build_query(session))
+            # Full-text searches scan the FTS5 table through its index (as a MATCH constraint)
+            scans = [
+                d
+                for d in details
+                if d.startswith("SCAN")
+                and not re.search(r"VIRTUAL TABLE INDEX \d+:M", d)
+            ]
+            assert scans == [], f"'{name}' scans a table: {details}"
@@ -0,0 +1,248 @@
+"""Tests for the rate limit storages shared by the workers."""
+
+import multiprocessing
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from flask_limiter import Limiter
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+from app import AppSession
+from app.middleware import get_rate_limit_key, limit_concurrency
+from app.modules.users.models import User
+from app.services.ratelimit import MMapStorage, SQLiteStorage
+
+# Common data to be used within tests
+USER_REGISTRATION_DATA = {
+    "name": "John Doe",
+    "email": "john.doe@email.com",
+    "password": "123456",
+    "password_confirmation": "123456",
+}
+OTHER_USER_REGISTRATION_DATA = {
+    "name": "Jane Doe",
+    "email": "jane.doe@email.com",
+    "password": "654321",
+    "password_confirmation": "654321",
+}
+
+
+def hit_limit(uri, times):
+    """Hits a limit on a new process, as another worker would."""
+
+    limiter = FixedWindowRateLimiter(storage_from_string(uri))
+    for _ in range(times):
+        limiter.hit(parse("100/minute"), "127.0.0.1")
+
+
+def test_mmap_storage(tmp_path):
+    """Tests for the memory mapped file rate limit storage."""
+
+    uri = f"mmap://{tmp_path / 'ratelimit'}"
+    storage = storage_from_string(uri)
+    assert isinstance(storage, MMapStorage)
+    limiter = FixedWindowRateLimiter(storage)
+    limit = parse("10/minute")
+
+    # Hits are counted until the limit is reached
+    for _ in range(10):
+        assert limiter.hit(limit, "127.0.0.1")
+    assert not limiter.hit(limit, "127.0.0.1")
+    assert limiter.hit(limit, "127.0.0.2")
+
+    # Hits from other processes count for the same limits
+    process = multiprocessing.get_context("fork").Process(
+        target=hit_limit, args=(uri, 5)
+    )
+    process.start()
+    process.join()
+    assert storage.get(parse("100/minute").key_for("127.0.0.1")) == 5
+    assert limiter.get_window_stats(parse("100/minute"), "127.0.0.1")[1] == 95
+
+    # Clearing a limit removes its hits from all processes
+    storage.clear(parse("100/minute").key_for("127.0.0.1"))
+    assert storage.get(parse("100/minute").key_for("127.0.0.1")) == 0
+    assert storage.reset() == 2
+    assert storage.get(limit.key_for("127.0.0.1")) == 0
+    assert limiter.hit(limit, "127.0.0.1")
+
+
+def test_sqlite_storage(tmp_path):
+    """Tests for the SQLite rate limit storage."""
+
+    uri = f"sqlite://{tmp_path / 'ratelimit.db'}"
+    storage = storage_from_string(uri)
+    assert isinstance(storage, SQLiteStorage)
+    # Synchronizations are done explicitly, as if the storages were from different processes
+    storage._pid, storage._lane = os.getpid(), "this"
+    limiter = FixedWindowRateLimiter(storage)
+    limit = parse("10/minute")
+
+    # Hits are counted on memory until the limit is reached
+    for _ in range(10):
+        assert limiter.hit(limit, "127.0.0.1")
+    assert not limiter.hit(limit, "127.0.0.1")
+
+    # Hits from other processes are loaded when synchronizing
+    other = SQLiteStorage(uri)
+    other._pid, other._lane = os.getpid(), "other"
+    for _ in range(5):
+        other.incr(limit.key_for("127.0.0.2"), limit.get_expiry())
+    other.sync(other._connect())
+    storage.sync(storage._connect())
+    assert storage.get(limit.key_for("127.0.0.2")) == 5
+    assert other.get(limit.key_for("127.0.0.2")) == 5
+
+    # Then the hits from this process are counted along with them
+    assert limiter.hit(limit, "127.0.0.2")
+    assert storage.get(limit.key_for("127.0.0.2")) == 6
+
+    assert storage.reset() == 2
+    assert storage.get(limit.key_for("127.0.0.1")) == 0
+
+
+class BlockingConnection(object):
+    """Connection to the counters database whose writes wait to be released."""
+
+    def __init__(self, connect):
+        self.connect = connect
+        self.conn = None
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def executemany(self, *args):
+        # Connecting on the synchronization thread itself
+        self.conn = self.connect()
+        self.writing.set()
+        assert self.release.wait(10)
+        return self.conn.executemany(*args)
+
+    def execute(self, *args):
+        return self.conn.execute(*args)
+
+
+def test_sqlite_storage_sync_in_progress(tmp_path):
+    """Tests that the SQLite rate limit storage counts hits while a synchronization holds the database."""
+
+    storage = SQLiteStorage(f"sqlite://{tmp_path / 'ratelimit.db'}")
+    storage._pid, storage._lane = os.getpid(), "this"
+    storage.incr("key", 60)
+    conn = BlockingConnection(storage._connect)
+    sync = threading.Thread(target=storage.sync, args=(conn,))
+    sync.start()
+    assert conn.writing.wait(10)
+
+    # The hits are counted right away, while the synchronization waits for the database
+    start = time.monotonic()
+    for i in range(1000):
+        assert storage.incr("key", 60) == i + 2
+    assert time.monotonic() - start < 0.5
+    conn.release.set()
+    sync.join(10)
+    assert not sync.is_alive()
+
+    # The hits counted meanwhile are saved on the next synchronization
+    other = SQLiteStorage(f"sqlite://{tmp_path / 'ratelimit.db'}")
+    other._pid, other._lane = os.getpid(), "other"
+    other.sync(other._connect())
+    assert other.get("key") == 1
+    storage.sync(storage._connect())
+    other.sync(other._connect())
+    assert other.get("key") == 1001
+
+
+# Checks that a blocking synchronization doesn't stall the green threads of an eventlet worker
+GREEN_SYNC_SCRIPT = """
+import eventlet
+eventlet.monkey_patch()
+import sys, time
+from app.services.ratelimit import SQLiteStorage
+
+storage = SQLiteStorage(f"sqlite://{sys.argv[1]}", sync_interval=0.01)
+storage.sync = lambda conn: eventlet.patcher.original("time").sleep(0.5)
+storage.incr("key", 60)
+start = time.monotonic()
+for _ in range(10):
+    eventlet.sleep(0.01)
+print(time.monotonic() - start)
+"""
+
+
+def test_sqlite_storage_green_threads(tmp_path):
+    """Tests for the SQLite rate limit storage on eventlet workers."""
+
+    result = subprocess.run(
+        [sys.executable, "-c", GREEN_SYNC_SCRIPT, str(tmp_path / "ratelimit.db")],
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    assert float(result.stdout.strip().splitlines()[-1]) < 0.4
+
+
+def test_weighted_rate_limits(app, client):
+    """Tests for the per user and cost weighted rate limits."""
+
+    app.config.update(
+        {
+            "RATELIMIT_STRATEGY": "weighted-fixed-window",
+            "RATELIMIT_APPLICATION": "20/minute",
+        }
+    )
+    Limiter(app, key_func=get_rate_limit_key)
+
+    # Creating and activating users
+    for data in (USER_REGISTRATION_DATA, OTHER_USER_REGISTRATION_DATA):
+        client.post("/auth/register", json=data)
+    with AppSession() as session:
+        for user in session.query(User).all():
+            user.is_active = 1
+        session.commit()
+
+    # Logging in with both users
+    headers = []
+    for data in (USER_REGISTRATION_DATA, OTHER_USER_REGISTRATION_DATA):
+        response = client.post(
+            "/auth/login",
+            json={"username": data["email"], "password": data["password"]},
+        )
+        headers.append({"Authorization": f"Bearer {response.json['data']['token']}"})
+
+    # Expiration notifications are more expensive than other requests
+    for _ in range(3):
+        response = client.post("/documents/1/notify_expiration", headers=headers[0])
+        assert response.status_code != 429
+    response = client.get("/ufs", headers=headers[0])
+    assert response.status_code == 200
+    response = client.post("/documents/1/notify_expiration", headers=headers[0])
+    assert response.status_code == 429
+    response = client.get("/ufs", headers=headers[0])
+    assert response.status_code == 429
+
+    # Other users (even from the same address) have their own limits
+    response = client.get("/ufs", headers=headers[1])
+    assert response.status_code == 200
+
+    # Routes generating thumbnails cost as much, wherever they are
+    for endpoint in ("documents.create_document", "profile.update_avatar"):
+        assert app.view_functions[endpoint].rate_limit_cost == 10
+
+
+def test_limit_concurrency(app):
+    """Tests for the concurrent requests limits."""
+
+    @limit_concurrency(1)
+    def handle(nested):
+        return handle(False) if nested else "OK"
+
+    with app.test_request_context():
+        response, status, headers = handle(True)
+        assert status == 429
+        assert headers["Retry-After"] == "1"
+        assert handle(False) == "OK"
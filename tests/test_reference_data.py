@@ -0,0 +1,216 @@
+"""Tests for the reference data listings, served from the in-process cache."""
+
+import json
+
+import pytz
+from sqlalchemy import create_engine
+
+from app import AppSession
+from app.modules.users.models import User
+from app.modules.commons.models import UF, City
+from app.modules.document.models import DocumentCategory
+from app.modules.reference_data import (
+    get_like_matcher,
+    get_row_filter,
+    sort_rows,
+    reference_tables,
+    bump_reference_version,
+    STRING_COLLATIONS,
+)
+
+# Common data to be used within tests
+USER_REGISTRATION_DATA = {
+    "name": "John Doe",
+    "email": "john.doe@email.com",
+    "password": "123456",
+    "password_confirmation": "123456",
+}
+USER_LOGIN_DATA = {
+    "username": "john.doe@email.com",
+    "password": "123456",
+}
+
+
+def test_row_matching():
+    """Tests for the filtering and sorting of the cached rows."""
+
+    assert get_like_matcher("%ão_", False)("São Paulo") is None
+    assert get_like_matcher("%ão%", False)("SÃO PAULO") is not None
+    assert get_like_matcher("s%o", True)("São") is None
+    assert get_like_matcher("a.b%", True)("axb") is None
+    assert get_like_matcher("%ão%", False, True)("SÃO PAULO") is None
+    assert get_like_matcher("%ão%", False, True)("são paulo") is not None
+
+    rows = [City("B", 1), City(None, 1), City("A", 2)]
+    assert [r.name for r in sort_rows(rows, [(City.name, "asc")])] == [
+        None,
+        "A",
+        "B",
+    ]
+    assert [r.name for r in sort_rows(rows, [(City.name, "desc")], False)] == [
+        None,
+        "B",
+        "A",
+    ]
+
+    # Strings are compared as the databases collations do
+    sqlite, mysql = STRING_COLLATIONS["sqlite"], STRING_COLLATIONS["mysql"]
+    rows = [City("Ébano", 1), City("Espírito Santo", 1), City("acre", 1)]
+    assert [r.name for r in sort_rows(rows, [(City.name, "asc")])] == [
+        "Espírito Santo",
+        "acre",
+        "Ébano",
+    ]
+    assert [r.name for r in sort_rows(rows, [(City.name, "asc")], collation=mysql)] == [
+        "acre",
+        "Ébano",
+        "Espírito Santo",
+    ]
+    for filter, sqlite_names, mysql_names in (
+        ({"operator": "==", "value": "ebano"}, [], ["Ébano"]),
+        ({"operator": "in", "value": ["ACRE"]}, [], ["acre"]),
+        ({"operator": "like", "value": "ESPIRITO"}, [], ["Espírito Santo"]),
+        ({"operator": "like", "value": "AC"}, ["acre"], ["acre"]),
+        ({"operator": "ilike", "value": "Éb"}, ["Ébano"], ["Ébano"]),
+        ({"operator": "ilike", "value": "éB"}, [], ["Ébano"]),
+    ):
+        filter = [dict(filter, property="name")]
+        for collation, names in ((sqlite, sqlite_names), (mysql, mysql_names)):
+            matches = get_row_filter(City, filter, pytz.utc, collation)
+            assert [r.name for r in rows if matches(r)] == names
+
+
+def test_reference_data(client):
+    """Tests for the listings of the cached reference data."""
+
+    # Creating user
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+
+    # Activate the user and setting its role as admin
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.query(User).get(1).role_id = 1
+        session.commit()
+
+    # We should be able to login now
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+
+    # Creating headers to set user authorization token
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+
+    def list_cities(filter=(), sort=(), **kwargs):
+        return client.get(
+            "/cities",
+            headers=headers,
+            query_string={
+                "filter": json.dumps(list(filter)),
+                "sort": json.dumps(list(sort)),
+                **kwargs,
+            },
+        )
+
+    # The cached listings have the same results as the database ones
+    filter = [
+        {"property": "name", "operator": "like", "value": "a"},
+        {"property": "uf_id", "operator": "not_in", "value": [1, 2, 3]},
+    ]
+    sort = [{"property": "name", "direction": "DESC"}]
+    response = list_cities(filter, sort, limit=5, page=2)
+    assert response.status_code == 200
+    with AppSession() as session:
+        cities = (
+            session.query(City)
+            .filter(City.name.like("%a%"), City.uf_id.notin_([1, 2, 3]))
+            .order_by(City.name.desc())
+            .all()
+        )
+    assert response.json["meta"]["count"] == len(cities)
+    assert [c["id"] for c in response.json["data"]] == [c.id for c in cities[5:10]]
+
+    # Including the accented names
+    for filter, condition in (
+        ({"operator": "ilike", "value": "SÃO"}, City.name.ilike("%SÃO%")),
+        ({"operator": "like", "value": "ão"}, City.name.like("%ão%")),
+        ({"operator": "==", "value": "Goiânia"}, City.name == "Goiânia"),
+        ({"operator": ">", "value": "Maceió"}, City.name > "Maceió"),
+    ):
+        response = list_cities([dict(filter, property="name")], sort, limit=100)
+        with AppSession() as session:
+            cities = (
+                session.query(City).filter(condition).order_by(City.name.desc()).all()
+            )
+        assert [c["id"] for c in response.json["data"]] == [c.id for c in cities]
+
+    # Including the relationships ones, which are run on the database
+    response = list_cities([{"property": "uf.code", "operator": "==", "value": "SP"}])
+    assert response.status_code == 200
+    assert [c["uf_id"] for c in response.json["data"]] == [24]
+
+    # Invalid filters are rejected
+    response = list_cities([{"property": "name", "operator": "~", "value": "a"}])
+    assert response.status_code == 400
+
+    # The listings have exact validators, changed along with the table
+    response = client.get("/cities", headers=headers)
+    etag = response.headers["ETag"]
+    response = client.get("/cities", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    # The changes are seen right away
+    response = client.put(
+        "/cities/1", headers=headers, json={"name": "Updated Name", "uf_id": 1}
+    )
+    assert response.status_code == 200
+    response = client.get("/cities", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+    assert response.json["data"][0]["name"] == "Updated Name"
+    response = client.delete("/cities/2", headers=headers)
+    assert response.status_code == 204
+    response = list_cities([{"property": "id", "operator": "==", "value": 2}])
+    assert response.json["meta"]["count"] == 0
+
+    # And the cache usage is reported
+    stats = reference_tables[City].stats()
+    assert stats["version"] == 2
+    assert stats["size"] == 26
+    assert stats["hits"] > 0
+
+    # The changes made by other workers are seen once their versions are checked
+    response = client.get("/document-categories", headers=headers)
+    assert response.json["data"] == []
+    engine = create_engine(client.application.config["SQLALCHEMY_DATABASE_URI"])
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO document_category (code, name) VALUES ('category', 'Category')"
+        )
+        conn.exec_driver_sql(
+            "UPDATE cache_version SET version = version + 1 WHERE name = 'document_category'"
+        )
+    reference_tables[DocumentCategory].invalidate()
+    response = client.get("/document-categories", headers=headers)
+    assert [c["code"] for c in response.json["data"]] == ["category"]
+
+
+def test_reference_versions(app):
+    """Tests for the versions of the reference data tables, bumped along with their changes."""
+
+    reference_table = reference_tables[UF]
+    assert reference_table.get_state()[0] == 0
+    checked_at = reference_table._checked_at
+
+    # Versions bumped by transactions which were rolled back don't invalidate the rows (not even on later commits)
+    with AppSession() as session:
+        bump_reference_version(session, UF)
+        session.rollback()
+        session.query(City).get(1).name = "Updated Name"
+        session.commit()
+    assert reference_table._checked_at == checked_at
+
+    # The committed ones invalidate them once, however many times they were bumped
+    with AppSession() as session:
+        bump_reference_version(session, UF)
+        bump_reference_version(session, UF)
+        session.commit()
+    assert reference_table._checked_at == 0
+    assert reference_table.get_state()[0] == 2
@@ -0,0 +1,145 @@
+"""Tests for the listing results cache and its invalidation by the writes."""
+
+import json
+from datetime import datetime
+
+from app import AppSession
+from app.services.cache import TaggedCache
+from app.modules.users.models import User
+from app.modules.document.models import Document
+from app.modules.result_cache import result_caches
+
+# Common data to be used within tests
+USER_REGISTRATION_DATA = {
+    "name": "John Doe",
+    "email": "john.doe@email.com",
+    "password": "123456",
+    "password_confirmation": "123456",
+}
+USER_LOGIN_DATA = {
+    "username": "john.doe@email.com",
+    "password": "123456",
+}
+
+
+def test_tagged_cache():
+    """Tests for the invalidation of the cache entries by their tags."""
+
+    cache = TaggedCache("test_tagged_cache", max_size=10, ttl=60)
+    cache.set("a", 1, tags=("document",))
+    cache.set("b", 2, tags=("document", "user"))
+    cache.set("c", 3, tags=("user",))
+
+    cache.invalidate(("document",))
+    assert cache.get("a") is None
+    assert cache.get("b") is None
+    assert cache.get("c") == 3
+    assert cache.stats()["invalidations"] == 2
+
+    # Values computed while their tags were invalidated aren't stored
+    generation = cache.generation
+    cache.invalidate(("user",))
+    cache.set("c", 3, tags=("user",), since=generation)
+    assert cache.get("c") is None
+    cache.set("a", 1, tags=("document",), since=generation)
+    assert cache.get("a") == 1
+
+
+def test_result_cache(client):
+    """Tests for the cached listings of the documents."""
+
+    # Creating user
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+
+    # Activate the user and setting its role as admin
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.query(User).get(1).role_id = 1
+        session.add(
+            Document(
+                "DOC-1",
+                "First document",
+                0,
+                1,
+                "/doc-1.txt",
+                "doc-1.txt",
+                "text/plain",
+                "10",
+                datetime.now(),
+            )
+        )
+        session.commit()
+
+    # We should be able to login now
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+
+    # Creating headers to set user authorization token
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+
+    def list_documents(url="/documents", filter=()):
+        return client.get(
+            url, headers=headers, query_string={"filter": json.dumps(list(filter))}
+        )
+
+    # Repeated listings are answered from the cache
+    response = list_documents()
+    assert response.status_code == 200
+    assert response.json["meta"]["count"] == 1
+    stats = result_caches["document"].stats()
+    response = list_documents()
+    assert response.status_code == 200
+    assert response.json["meta"]["count"] == 1
+    assert result_caches["document"].stats()["hits"] == stats["hits"] + 1
+
+    # Even with the same filtering written in other ways
+    filter = {"property": "code", "operator": "==", "value": "DOC-1"}
+    response = list_documents(filter=[filter])
+    assert response.json["meta"]["count"] == 1
+    hits = result_caches["document"].stats()["hits"]
+    response = client.get(
+        "/documents",
+        headers=headers,
+        query_string={"filter": json.dumps([filter], indent=2, sort_keys=True)},
+    )
+    assert response.json["meta"]["count"] == 1
+    assert result_caches["document"].stats()["hits"] == hits + 1
+
+    # The users own listings are cached for each one of them
+    response = list_documents("/documents/my")
+    assert response.json["meta"]["count"] == 1
+
+    # Writes on the listed tables invalidate their entries, including the bulk ones
+    with AppSession() as session:
+        session.query(Document).filter_by(id=1).update(
+            {Document.description: "Updated document"}, synchronize_session=False
+        )
+        session.commit()
+    response = list_documents()
+    assert response.json["data"][0]["description"] == "Updated document"
+    response = list_documents("/documents/my")
+    assert response.json["data"][0]["description"] == "Updated document"
+
+    with AppSession() as session:
+        session.delete(session.query(Document).get(1))
+        session.commit()
+    response = list_documents()
+    assert response.json["meta"]["count"] == 0
+
+    # Rolled back writes don't
+    invalidations = result_caches["document"].stats()["invalidations"]
+    with AppSession() as session:
+        session.query(Document).update(
+            {Document.description: "Rolled back"}, synchronize_session=False
+        )
+        session.rollback()
+    response = list_documents()
+    assert response.json["meta"]["count"] == 0
+    assert result_caches["document"].stats()["invalidations"] == invalidations
+
+    # And the writes made by the routes are seen right away
+    response = client.post(
+        "/document-categories", headers=headers, json={"code": "CAT-1", "name": "Cat"}
+    )
+    assert response.status_code == 200
+    response = client.get("/document-categories", headers=headers)
+    assert response.json["meta"]["count"] == 1
@@ -0,0 +1,71 @@
+"""Tests for the compiled serializers of the models."""
+
+from datetime import date, datetime
+
+import pytz
+
+from app import AppSession
+from app.modules.users.models import User, Role
+from app.modules.commons.models import City
+from app.modules.document.models import Document
+from app.modules.serialization import default_object_string, get_serializer
+
+
+def test_default_object_string():
+    """Tests for the formatting of the datetimes and dates."""
+
+    utc = pytz.utc
+    naive = datetime(2021, 1, 2, 3, 4, 5)
+    assert default_object_string(naive, utc) == "2021-01-02T03:04:05+0000"
+    assert default_object_string(utc.localize(naive), utc) == "2021-01-02T03:04:05+0000"
+    assert (
+        default_object_string(naive, pytz.timezone("America/Sao_Paulo"))
+        == "2021-01-02T00:04:05-0300"
+    )
+    assert default_object_string(date(2021, 1, 2)) == "2021-01-02"
+    assert default_object_string("2021-01-02") == "2021-01-02"
+
+
+def test_model_serializers(app):
+    """Tests for the serialized columns and relationships of the models."""
+
+    utc = pytz.utc
+    with app.app_context():
+        with AppSession() as session:
+            # Columns are formatted by their types
+            city = session.query(City).get(1)
+            data = city.as_dict(utc)
+            assert set(data) == {"id", "created_at", "updated_at", "name", "uf_id"}
+            assert data["created_at"] == "2020-01-01T00:00:00+0000"
+
+            # Loaded to-one relationships are serialized as well (while the other ones aren't loaded)
+            assert "uf" not in data
+            city.uf
+            data = city.as_dict(utc)
+            assert data["uf"]["code"] == "AC"
+            assert city.as_dict(utc, frozenset(["name"])) == {"name": "Rio Branco"}
+
+            # Models customize their serialization
+            user = User("John Doe", "john.doe@email.com", "hash", role_id=1)
+            user.avatar_url = "avatar.png"
+            user.role = session.query(Role).get(1)
+            user.document = []
+            data = user.as_dict(utc)
+            assert "hashpass" not in data
+            assert data["avatar_url"].endswith("/files/avatar.png")
+            assert data["role"]["id"] == 1
+            assert data["document_ids"] == []
+            assert user.as_dict(utc, ["hashpass", "avatar_url"]) == {
+                "avatar_url": data["avatar_url"]
+            }
+
+            document = Document(
+                "DOC-1", "Document", 0, 1, None, "doc.txt", "text/plain", "10", None
+            )
+            data = document.as_dict(utc)
+            assert data["file_url"] is None
+            assert data["file_updated_at"] is None
+            assert "document_sharing_ids" not in data
+
+    # Serializers are compiled once for each model
+    assert get_serializer(City) is get_serializer(City)
@@ -0,0 +1,133 @@
+"""Tests for the coalescing of identical concurrent calls and GET requests."""
+
+import time
+from threading import Event, Thread
+
+import pytest
+
+from app import AppSession
+from app.services.singleflight import SingleFlight, single_flights
+from app.modules.users.models import User
+
+# Common data to be used within tests
+USER_REGISTRATION_DATA = {
+    "name": "John Doe",
+    "email": "john.doe@email.com",
+    "password": "123456",
+    "password_confirmation": "123456",
+}
+USER_LOGIN_DATA = {
+    "username": "john.doe@email.com",
+    "password": "123456",
+}
+
+
+def run_concurrently(flight, key, func, callers):
+    """Runs the calls on threads, only letting the first one finish after the other ones are waiting for it."""
+
+    results = [None] * callers
+    errors = [None] * callers
+
+    def call(i):
+        try:
+            results[i] = flight.do(key, func)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [Thread(target=call, args=(i,)) for i in range(callers)]
+    threads[0].start()
+    while flight.stats()["in_flight"] == 0:
+        time.sleep(0.001)
+    for thread in threads[1:]:
+        thread.start()
+    while flight.shared < callers - 1:
+        time.sleep(0.001)
+    return threads, results, errors
+
+
+def test_single_flight():
+    """Tests for the results and errors shared among identical concurrent calls."""
+
+    flight = SingleFlight("test_single_flight")
+    release = Event()
+    runs = []
+
+    def query():
+        runs.append(1)
+        release.wait()
+        return {"data": len(runs)}
+
+    # Concurrent calls share the first one result
+    threads, results, _ = run_concurrently(flight, "key", query, 5)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert len(runs) == 1
+    assert [r[0] for r in results] == [{"data": 1}] * 5
+    assert sorted(r[1] for r in results) == [False, True, True, True, True]
+
+    # Once it's finished, the next call runs again
+    assert flight.do("key", query) == ({"data": 2}, False)
+    assert flight.stats() == {"in_flight": 0, "calls": 2, "shared": 4, "timeouts": 0}
+
+    # Errors are shared as well
+    release.clear()
+
+    def failing_query():
+        release.wait()
+        raise ValueError("Failed query")
+
+    threads, _, errors = run_concurrently(flight, "key", failing_query, 3)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert all(isinstance(e, ValueError) for e in errors)
+    with pytest.raises(ValueError):
+        flight.do("key", failing_query)
+
+
+def test_single_flight_timeout():
+    """Tests for the callers which stop waiting for a slow call."""
+
+    flight = SingleFlight("test_single_flight_timeout", timeout=0.01)
+    release = Event()
+    thread = Thread(target=flight.do, args=("key", release.wait))
+    thread.start()
+    while flight.stats()["in_flight"] == 0:
+        time.sleep(0.001)
+
+    assert flight.do("key", lambda: "own result") == ("own result", False)
+    assert flight.timeouts == 1
+    release.set()
+    thread.join()
+
+
+def test_coalesced_requests(client):
+    """Tests for the responses of the coalesced routes."""
+
+    # Creating user
+    client.post("/auth/register", json=USER_REGISTRATION_DATA)
+
+    # Activate the user
+    with AppSession() as session:
+        session.query(User).get(1).is_active = 1
+        session.commit()
+
+    # We should be able to login now
+    response = client.post("/auth/login", json=USER_LOGIN_DATA)
+
+    # Creating headers to set user authorization token
+    headers = {"Authorization": f"Bearer {response.json['data']['token']}"}
+
+    # Each request gets the whole response, with its own headers
+    calls = single_flights["index_my_notification"].calls
+    for _ in range(2):
+        response = client.get("/notifications/my", headers=headers)
+        assert response.status_code == 200
+        assert response.json["meta"]["count"] == 0
+        assert response.headers["Content-Type"] == "application/json"
+    assert single_flights["index_my_notification"].calls == calls + 2
+
+    response = client.get("/profile", headers=headers)
+    assert response.status_code == 200
+    assert response.json["data"]["email"] == USER_REGISTRATION_DATA["email"]
@@ -0,0 +1,89 @@
+"""Tests for the timezones resolution and the datetimes formatters."""
+
+from datetime import datetime, timedelta
+
+import pytz
+
+from app.modules.timezones import (
+    get_timezone,
+    get_datetime_formatter,
+    DatetimeFormatter,
+)
+from app.modules.serialization import get_serializer
+from app.modules.commons.models import City
+
+
+def format_with_pytz(value, timezone, source):
+    """The conversion through pytz, which the formatters must match."""
+
+    if value.tzinfo is None:
+        value = source.localize(value)
+    return value.astimezone(timezone).strftime("%Y-%m-%dT%H:%M:%S%z")
+
+
+def test_get_timezone():
+    """Tests for the cached timezones resolver."""
+
+    assert get_timezone("America/Sao_Paulo") is pytz.timezone("America/Sao_Paulo")
+    assert get_timezone("UTC") is pytz.utc
+    assert get_timezone("Invalid/Timezone") is None
+    assert get_timezone("Ação") is None
+
+
+def test_datetime_formatter():
+    """Tests for the formatting of the datetimes, around the offset changes of the timezones."""
+
+    utc = pytz.utc
+    new_york = pytz.timezone("America/New_York")
+    sao_paulo = pytz.timezone("America/Sao_Paulo")
+    kolkata = pytz.timezone("Asia/Kolkata")
+
+    formatter = get_datetime_formatter(sao_paulo)
+    assert formatter is get_datetime_formatter(sao_paulo)
+    assert formatter(datetime(2021, 1, 2, 3, 4, 5)) == "2021-01-02T00:04:05-0300"
+    assert formatter(datetime(2018, 12, 1, 12, 0, 0, 999)) == "2018-12-01T10:00:00-0200"
+    assert formatter(utc.localize(datetime(2021, 1, 2))) == "2021-01-01T21:00:00-0300"
+
+    # Naive datetimes on the source timezone, including the ambiguous and non-existent ones (when the clocks change)
+    values = [
+        datetime(2017, 10, 14) + timedelta(minutes=30 * i) for i in range(24 * 365 * 2)
+    ] + [
+        datetime(2021, 3, 14, 2, 30),
+        datetime(2021, 11, 7, 1, 30),
+        datetime(1900, 1, 1),
+        datetime(2050, 7, 1),
+    ]
+    for source in (utc, new_york, sao_paulo):
+        for timezone in (utc, new_york, sao_paulo, kolkata):
+            formatter = DatetimeFormatter(timezone, source)
+            expected = [format_with_pytz(v, timezone, source) for v in values]
+            assert [formatter(v) for v in values] == expected
+            assert (
+                formatter.format_many(values + values[:10]) == expected + expected[:10]
+            )
+
+    # Aware datetimes are converted as they are
+    aware = new_york.localize(datetime(2021, 11, 7, 1, 30), is_dst=True)
+    assert DatetimeFormatter(sao_paulo, new_york)(aware) == format_with_pytz(
+        aware, sao_paulo, new_york
+    )
+
+
+def test_serialize_page(app):
+    """Tests for the serialization of the pages, with their datetimes formatted at once."""
+
+    timezone = pytz.timezone("America/Sao_Paulo")
+    cities = [City("City", 1) for _ in range(3)]
+    for i, city in enumerate(cities):
+        city.id = i + 1
+        city.created_at = datetime(2021, 1, 1, i)
+    cities[1].updated_at = cities[0].created_at
+
+    page = get_serializer(City).serialize_page(cities, timezone)
+    assert page == [c.as_dict(timezone) for c in cities]
+    assert page[1]["updated_at"] == "2020-12-31T21:00:00-0300"
+    assert page[2]["updated_at"] is None
+    assert (
+        get_serializer(City).serialize_page(cities, timezone, ["name"])
+        == [{"name": "City"}] * 3
+    )